@@ -7,7 +7,7 @@ class HookInfo:
     version = "0.1.0"
 
 
-def push_notification(self, message, title="hcclient"):
+def push_notification(self, message, title="hcclient", sender=None, kind="mention"):
     if self.args["no_notify"]:
         return
 
@@ -0,0 +1,40 @@
+# Sample event hook showing all available events
+# Every handler receives the client and a value, and may return a
+# replacement value, None to leave it unchanged, or False to drop it
+# Handlers are timed, run `/hooks` to see how long they take
+
+
+class HookInfo:
+    name = "Events"
+    description = "Shows all available events"
+    version = "0.1.0"
+    compat = ">=1.19.7"
+
+
+# Every packet received from the server, before it's handled
+def on_packet(client, packet):
+    if packet["cmd"] == "chat" and packet["text"].startswith("!ping"):
+        client.send({"cmd": "chat", "text": "pong"})
+
+
+# Formatted message text, text_type is 'message', 'whisper' or 'emote'
+# Returning False keeps the text as it is
+def on_render(client, text, text_type):
+    return text.replace(":)", "☺")
+
+
+# Every line before it's printed
+def on_print(client, message):
+    return None
+
+
+# Every packet before it's sent to the server
+def on_send(client, packet):
+    if packet["cmd"] == "chat" and packet["text"] == "":
+        return False
+
+
+# Client and moderator commands before they run, returning False cancels
+def on_command(client, command, args_string):
+    if command == "/quit" and args_string != "really":
+        return False
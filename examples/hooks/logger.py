@@ -1,5 +1,5 @@
-# Functional hook to log stdout messages to a file
-# Cannot be used with prepend_sample.py as they both modify the same function
+# Asynchronous event hook to log stdout messages to a file
+# File I/O runs on the hook's own worker thread, off the receive thread
 
 import re
 
@@ -7,27 +7,18 @@
 class HookInfo:
     name = "Logger"
     description = "Logs stdout messages to a file"
-    version = "0.1.0"
-    compat = ">=1.19.3"
+    version = "0.2.0"
+    compat = ">=1.19.7"
+    asynchronous = True
+    queue_size = 1000          # optional, defaults to 1000
+    overflow = "drop_oldest"   # optional, 'drop_newest' (default) or 'drop_oldest'
 
 
 ansi_remover = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
 
-def print_msg(self, message, hist=True):
-    print(message)
 
-    if hist:
-        self.stdout_history.append(message)
-        if len(self.stdout_history) > 100:
-            self.stdout_history.pop(0)
-
-    with open(f"{self.args['channel']}.log", "a") as f:
-        f.write(self.ansi_remover.sub("", message) + "\n")
-
-
-def hook(client):
-    client.ansi_remover = ansi_remover
-    funcType = type(client.print_msg)
-    client.print_msg = funcType(print_msg, client)
-
-    return client
+# Called on the worker thread with a copy of every message
+# Return values of asynchronous hooks are ignored
+def on_print(client, message):
+    with open(f"{client.args['channel']}.log", "a") as f:
+        f.write(ansi_remover.sub("", message) + "\n")
@@ -1,28 +1,17 @@
-# Sample functional hook to prepend a string to stdout messages
-# Cannot be used with logger_sample.py as they both modify the same function
+# Event hook to prepend a string to stdout messages
 
 
 class HookInfo:
     name = "Prepend"
     description = "Prepends a string to stdout messages"
-    version = "0.1.0"
-    compat = ">=1.19.3"
+    version = "0.2.0"
+    compat = ">=1.19.7"
 
 
 STRING_TO_PREPEND = "Hello World! "
 
-def print_msg(self, message, hist=True):
-    message = STRING_TO_PREPEND + message
-    print(message)
 
-    if hist:
-        self.stdout_history.append(message)
-        if len(self.stdout_history) > 100:
-            self.stdout_history.pop(0)
-
-
-def hook(client):
-    funcType = type(client.print_msg)
-    client.print_msg = funcType(print_msg, client)
-
-    return client
+# Called with every message before it's printed
+# The returned string replaces the message, returning False drops it
+def on_print(client, message):
+    return STRING_TO_PREPEND + message
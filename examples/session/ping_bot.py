@@ -0,0 +1,38 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+# Runs several bots in one process using the Session API
+# Each bot replies to !ping and reports how many users are online on !users
+
+import asyncio
+
+from hcclient.client.session import Session
+
+
+async def bot(channel: str, nick: str) -> None:
+    """
+    Joins a channel and answers commands until disconnected
+    """
+    async with Session(channel, nick) as session:
+        await session.join()
+        async for packet in session:
+            if packet["cmd"] != "chat" or packet.get("nick") == session.nick:
+                continue
+
+            match packet.get("text"):
+                case "!ping":
+                    await session.send_chat("pong")
+
+                case "!users":
+                    await session.send_chat(f"{len(session.users)} users online")
+
+
+async def main() -> None:
+    """
+    Starts one bot per channel
+    """
+    await asyncio.gather(*(bot(channel, "pingbot") for channel in ("botDev", "test", "programming")))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
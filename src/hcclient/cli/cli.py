@@ -8,7 +8,6 @@
 import pygments.styles
 
 from hcclient import meta
-from hcclient.client.client import Client
 from hcclient.utils.hook import load_hooks
 from hcclient.utils.config import default_config, initialize_config
 
@@ -39,28 +38,40 @@ def main():
 
     optional_group.add_argument("-p", "--password", help="specify tripcode password", dest="trip_password", metavar="PASSWORD", default=argparse.SUPPRESS)
     optional_group.add_argument("-t", "--trip-password", help=argparse.SUPPRESS, dest="trip_password", default=argparse.SUPPRESS)  # deprecated
-    optional_group.add_argument("-w", "--websocket", help="specify alternate websocket", dest="websocket_address", metavar="ADDRESS", default=argparse.SUPPRESS)
+    optional_group.add_argument("-w", "--websocket", help="specify alternate websocket, comma separated to race several", dest="websocket_address", metavar="ADDRESS", default=argparse.SUPPRESS)
     optional_group.add_argument("--websocket-address", help=argparse.SUPPRESS, dest="websocket_address", default=argparse.SUPPRESS)  # deprecated
     optional_group.add_argument("-l", "--load-config", help="specify config file to load", dest="config_file", metavar="FILE", default=None)
     optional_group.add_argument("--no-config", help="ignore global config file", action="store_true", default=False)
     optional_group.add_argument("--no-hooks", help="ignore global hooks", action="store_true", default=False)
+    optional_group.add_argument("--headless", help="run without a prompt, for bots/loggers", action="store_true", default=False)
+    optional_group.add_argument("--output", help="headless output: -, FILE or unix:PATH", metavar="TARGET", default="-")
+    optional_group.add_argument("--output-format", help="headless output format", choices=("text", "jsonl"), default="text")
+    optional_group.add_argument("--input", help="headless input: - or unix:PATH", metavar="SOURCE", default="-")
     optional_group.add_argument("--no-parse", help="log received packets as JSON", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--clear", help="clear console before joining", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--is-mod", help="enable moderator commands", action="store_true", default=argparse.SUPPRESS)
+    optional_group.add_argument("--bulk-rate", help="set bulk moderation commands sent per second", type=int, metavar="COMMANDS", default=argparse.SUPPRESS)
     optional_group.add_argument("--no-unicode", help="disable unicode UI elements", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--sheriff-badges", help="show stars beside mods/admins", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--no-highlight", help=argparse.SUPPRESS, action="store_true", default=False)  # deprecated, doesn't do anything
     optional_group.add_argument("--highlight-theme", help="set highlight theme", metavar="THEME", default=argparse.SUPPRESS)
     optional_group.add_argument("--no-markdown", help="disable markdown formatting", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--no-linkify", help="disable linkifying of urls", action="store_true", default=argparse.SUPPRESS)
+    optional_group.add_argument("--no-wrap", help="leave wrapping long lines to the terminal", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--backticks-bg", help="set backticks background color", type=int, metavar="0-255", default=argparse.SUPPRESS)
     optional_group.add_argument("--latex", help="enable LaTeX simplifying", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--no-notify", help="disable desktop notifications", action="store_true", default=argparse.SUPPRESS)
     optional_group.add_argument("--prompt-string", help="set custom prompt string", metavar="STRING", default=argparse.SUPPRESS)
     optional_group.add_argument("--timestamp-format", help="set timestamp format", metavar="FORMAT", default=argparse.SUPPRESS)
     optional_group.add_argument("--suggest-aggr", help="set suggestion aggressiveness", type=int, metavar="0-3", default=argparse.SUPPRESS)
-    optional_group.add_argument("--proxy", help="specify proxy to use", metavar="TYPE:HOST:PORT", default=argparse.SUPPRESS)
+    optional_group.add_argument("--hook-budget", help="set per-hook time budget", type=int, metavar="MS", default=argparse.SUPPRESS)
+    optional_group.add_argument("--scrollback-lines", help="set number of messages kept", type=int, metavar="LINES", default=argparse.SUPPRESS)
+    optional_group.add_argument("--persist-state", help="keep scrollback and input history across restarts", action="store_true", default=argparse.SUPPRESS)
+    optional_group.add_argument("--proxy", help="specify proxy to use, comma separated to race several", metavar="TYPE:HOST:PORT", default=argparse.SUPPRESS)
     optional_group.add_argument("--ssl-no-verify", help="disable SSL cert verification", action="store_true", default=argparse.SUPPRESS)
+    optional_group.add_argument("--no-compression", help="disable websocket compression", action="store_true", default=argparse.SUPPRESS)
+    optional_group.add_argument("--connect-timeout", help="set connection attempt timeout", type=int, metavar="SECONDS", default=argparse.SUPPRESS)
+    optional_group.add_argument("--dns-cache-ttl", help="set how long DNS results are reused, 0 to disable", type=int, metavar="SECONDS", default=argparse.SUPPRESS)
 
     args = parser.parse_args()
 
@@ -79,9 +90,19 @@ def main():
         sys.exit(0)
 
     hook = not args.no_hooks
-    del args.no_hooks  # we dont want to pass this to the client
-
-    client = Client(initialize_config(args, parser))
+    headless = args.headless
+    headless_opts = {"output_format": args.output_format, "output": args.output, "input_source": args.input}
+    for arg in ("no_hooks", "headless", "output_format", "output", "input"):
+        delattr(args, arg)  # we dont want to pass these to the client
+
+    # imported here so headless mode never loads prompt_toolkit or notifypy
+    if headless:
+        from hcclient.client.headless import HeadlessClient
+        client = HeadlessClient(initialize_config(args, parser), **headless_opts)
+
+    else:
+        from hcclient.client.client import Client
+        client = Client(initialize_config(args, parser))
 
     if hook:
         client = load_hooks(client)
@@ -0,0 +1,687 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import os
+import abc
+import sys
+import json
+import time
+import random
+import datetime
+import threading
+import contextlib
+import collections
+
+import colorama
+import termcolor
+
+from hcclient.utils.hook import HookBus
+from hcclient.render.formatter import TextFormatter
+from hcclient.client.commands import ClientCommands
+from hcclient.client.highlighter import Highlighter
+from hcclient.client.moderation import BulkModerator
+from hcclient.client.history import History
+from hcclient.client.records import Message
+from hcclient.client.protocol import ChannelState
+from hcclient.client.transport import create_transport, connect_first
+from hcclient.client.state import SessionState, state_path
+from hcclient.client.packets import validate_packet
+
+
+class BaseClient(abc.ABC):
+    """
+    Terminal independent client base, handles the connection,
+    protocol state and commands
+    Subclasses provide the input loop
+    """
+    ping_interval = 5  # seconds between websocket pings
+    stale_timeout = 12  # seconds without receiving anything before reconnecting
+    keepalive_interval = 60  # seconds between ping packets
+    connect_stagger = 0.25  # seconds before racing the next endpoint
+    drop_report_interval = 5  # seconds between reports of dropped packets
+    packet_cmd_pattern = re.compile(r'"cmd"\s*:\s*"([^"]{1,32})"')
+
+    def __init__(self, args: dict) -> None:
+        """
+        Initializes the client and environment, sets up variables and threads
+        """
+        self.args = args
+        self.hooks = []
+        self.hook_bus = HookBus(self)
+
+        colorama.init()
+
+        self.nick = self.args["nickname"]
+        self.channel = None
+        self.protocol = ChannelState()
+
+        self.auto_complete_list = []
+        self.manage_complete_list()
+
+        self.formatter = TextFormatter()
+        self.highlighter = Highlighter()
+        self.moderator = BulkModerator(self)
+        self.highlighter.compile(self.nick, self.args["highlights"])
+        self.history = History(self.args["scrollback_lines"], self.render_record)
+        self.restore_state()
+
+        self.def_config_dir = os.path.join(os.getenv("APPDATA"), "hcclient") if os.name == "nt" else os.path.join(os.getenv("HOME"), ".config", "hcclient")
+
+        self.ws = create_transport(self.args)
+        self.delivery_latency = collections.deque(maxlen=100)
+        self.dropped_packets = collections.Counter()
+        self.dropped_packets_lock = threading.Lock()
+        self.last_dropped = None
+        self.last_drop_report = -self.drop_report_interval
+        self.unreported_drops = 0
+        self.connect_started = None
+        self.join_time = None
+        self.reconnecting = False
+        self.timed_reconnect = threading.Timer(0, None)
+
+        self.whisper_lock = False
+
+        self.thread_ping = threading.Thread(target=self.ping_thread, daemon=True)
+        self.thread_recv = threading.Thread(target=self.recv_thread, daemon=True)
+        self.thread_cleanup = threading.Thread(target=self.cleanup_thread, daemon=True)
+
+    def restore_state(self) -> None:
+        """
+        Loads the session state kept from the last run if persist_state is enabled,
+        and stores changes to it from now on
+        Persisted ignores and aliases are dropped once the config file is modified
+        """
+        self.state = None
+        self.input_history = []
+        self.restored_messages = 0
+        if not self.args["persist_state"]:
+            return
+
+        self.state = SessionState(state_path(self.args["websocket_address"], self.args["channel"]))
+        messages, self.input_history, ignored, aliases = self.state.load(self.args["scrollback_lines"], self.config_mtime())
+
+        for record in messages:
+            self.history.append(record)
+
+        if ignored is not None:
+            self.args["ignored"] = ignored
+
+        if aliases is not None:
+            self.args["aliases"] = aliases
+
+        self.restored_messages = len(messages)
+        self.history.on_append = self.state.add_message
+
+    def persist_settings(self) -> None:
+        """
+        Stores ignores and aliases in the session state, so changes that
+        weren't saved to the config file survive a restart
+        """
+        if self.state is not None:
+            self.state.set_settings(self.args["ignored"], self.args["aliases"], self.config_mtime())
+
+    def config_mtime(self) -> float | None:
+        """
+        Returns the modification time of the config file, None without one
+        """
+        if not self.args["config_file"]:
+            return None
+
+        try:
+            return os.path.getmtime(self.args["config_file"])
+
+        except OSError:
+            return None
+
+    def formatted_datetime(self) -> str:
+        """
+        Returns the current datetime as a string formatted with timestamp_format
+        """
+        return datetime.datetime.now().strftime(self.args["timestamp_format"])
+
+    def connect_to_server(self) -> None:
+        """
+        Connects to the websocket server and send the join packet
+        Uses a proxy if specified, every connection gets a new transport
+        If several addresses or proxies are specified they're raced,
+        and the first to complete its handshake is used
+        """
+        connect_status = (f"Connecting to {self.args['websocket_address']}..." if not self.args["proxy"]
+                          else f"Connecting to {self.args['websocket_address']} through proxy {self.args['proxy']}...")
+
+        self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                          termcolor.colored("CLIENT", self.args["client_color"]),
+                                          termcolor.colored(connect_status, self.args["client_color"])))
+
+        self.connect_started = time.perf_counter()
+        self.ws = connect_first(self.args, self.args["connect_timeout"], self.connect_stagger)
+
+        self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                          termcolor.colored("CLIENT", self.args["client_color"]),
+                                          termcolor.colored(f"Connected to {self.ws.address} {self.ws.connect_summary()}", self.args["client_color"])))
+
+        self.send({
+            "cmd": "join",
+            "channel": self.args["channel"],
+            "nick": f"{self.nick}#{self.args['trip_password']}"
+        })
+
+    def reconnect_to_server(self) -> None:
+        """
+        Reconnects to the websocket server
+        Runs in a separate temporary thread
+        """
+        self.reconnecting = True
+
+        self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                          termcolor.colored("CLIENT", self.args["client_color"]),
+                                          termcolor.colored("Initiating reconnect...", self.args["client_color"])))
+
+        self.ws.close()
+        self.thread_recv.join()
+
+        self.reconnecting = False
+
+        self.thread_recv = threading.Thread(target=self.recv_thread, daemon=True)
+        self.thread_recv.start()
+
+    def print_msg(self, message: str, hist: bool = True, record: Message | None = None) -> None:
+        """
+        Prints a message to the terminal and adds it to the history,
+        record is the raw message the line was rendered from, if any
+        """
+        message = self.hook_bus.emit("on_print", message)
+        if message is False:
+            return
+
+        self.write_line(message)
+
+        if hist:
+            self.history.append(record or History.text_record(message))
+
+    def write_line(self, message: str) -> None:
+        """
+        Writes a printed message to the terminal
+        """
+        print(message)
+
+    def print_record(self, record: Message) -> None:
+        """
+        Renders a message record with the current configuration and prints it
+        """
+        self.print_msg(self.render_record(record), record=record)
+
+    def render_record(self, record: Message) -> str:
+        """
+        Renders a history record as a line, using the current configuration
+        Records that were stored already rendered are returned as is
+        """
+        timestamp = termcolor.colored(datetime.datetime.fromtimestamp(record.time).strftime(self.args["timestamp_format"]), self.args["timestamp_color"])
+        tripcode = record.trip if len(record.trip or "") >= 6 else "NOTRIP"
+
+        match record.kind:
+            case "chat":
+                level = ChannelState.level_to_utype(record.level)
+                nick = record.nick
+                if level in ("Mod", "Admin") and self.args["sheriff_badges"] and not self.args["no_unicode"]:
+                    nick = f"{chr(11088)} {nick}"
+
+                if level == "Admin":
+                    tripcode = "Admin"
+
+                color_to_use = self.args[{"Mod": "mod_nickname_color", "Admin": "admin_nickname_color"}.get(level, "nickname_color")
+                                         if not record.own else "self_nickname_color"]
+                text = termcolor.colored(self.format(record.text, highlighted=record.highlighted), self.args["message_color"])
+
+                if record.status is None:
+                    return "{}|{}| [{}] {}".format(timestamp, termcolor.colored(tripcode, color_to_use), termcolor.colored(nick, color_to_use), text)
+
+                status, symbol = {"updatable": ("Updatable", 10711), "expired": ("Expired", 10007), "completed": ("Completed", 10003)}[record.status]
+                return "{}|{}| [{}] [{}] {}".format(timestamp, termcolor.colored(tripcode, color_to_use),
+                                                    f"{status}.ID: {record.unique_id}" if self.args["no_unicode"] else f"{chr(symbol)} {record.unique_id}",
+                                                    termcolor.colored(nick, color_to_use), text)
+
+            case "whisper" | "emote":
+                color_to_use = self.args[f"{record.kind}_color"]
+                return "{}|{}| {}".format(timestamp, termcolor.colored(tripcode, color_to_use),
+                                          termcolor.colored(self.format(record.text, record.kind), color_to_use))
+
+            case "server":
+                return "{}|{}| {}".format(timestamp, termcolor.colored("SERVER", self.args["server_color"]), termcolor.colored(record.text, self.args["server_color"]))
+
+            case "warn":
+                return "{}|{}| {}".format(timestamp, termcolor.colored("!WARN!", self.args["warning_color"]), termcolor.colored(record.text, self.args["warning_color"]))
+
+            case _:
+                return record.text
+
+    def dump_packet(self, packet: dict, packet_time: str) -> None:
+        """
+        Prints a received packet as JSON, used when parsing is disabled
+        """
+        self.print_msg("\n{}|{}".format(packet_time, json.dumps(packet)))
+
+    def format(self, text: str, text_type: str = "message", highlighted: bool = False) -> str:
+        """
+        Formats a string with the TextFormatter class,
+        providing syntax highlighting and markdown
+        Emphasizes highlight rule matches if the text was highlighted
+        """
+        if not self.args["no_markdown"]:
+            text = self.formatter.markdown(text, self.args["highlight_theme"], self.args["client_color"], self.args[f"{text_type}_color"],
+                                           self.args["latex"], not self.args["no_linkify"], self.args["backticks_bg"])
+
+        if highlighted:
+            text = self.highlighter.emphasize(text)
+
+        rendered = self.hook_bus.emit("on_render", text, text_type)
+        return text if rendered is False else rendered
+
+    def send(self, packet: dict) -> None:
+        """
+        Sends a packet to the server if connected, otherwise prints an error
+        """
+        packet = self.hook_bus.emit("on_send", packet)
+        if packet is False:
+            return
+
+        if self.ws.connected:
+            self.ws.send(json.dumps(packet))
+
+        else:
+            self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                              termcolor.colored("CLIENT", self.args["client_color"]),
+                                              termcolor.colored("Can't send packet, not connected to server. Run `/reconnect`", self.args["client_color"])))
+
+    def manage_complete_list(self) -> None:
+        """
+        Adds commands to the auto-complete list based on the user's permissions
+        """
+        self.auto_complete_list.clear()
+
+        self.auto_complete_list.extend(ClientCommands.client_command_map.keys())
+        self.auto_complete_list.extend(ClientCommands.server_commands)
+        if self.args["is_mod"]:
+            self.auto_complete_list.extend(ClientCommands.mod_command_map.keys())
+
+        for prefix in ("", "/whisper ", "/profile ", "/ignore "):
+            for user in self.protocol.users:
+                self.auto_complete_list.append(f"{prefix}@{user}")
+
+    def update_complete_list(self, joined: list, left: list) -> None:
+        """
+        Adds and removes users in the auto-complete list without rebuilding it
+        """
+        for prefix in ("", "/whisper ", "/profile ", "/ignore "):
+            for user in left:
+                with contextlib.suppress(ValueError):
+                    self.auto_complete_list.remove(f"{prefix}@{user}")
+
+            for user in joined:
+                self.auto_complete_list.append(f"{prefix}@{user}")
+
+    def refresh_completer(self) -> None:
+        """
+        Applies changes to the auto-complete list or suggestion options,
+        overridden by clients that have a prompt
+        """
+
+    def cleanup_updatables(self) -> None:
+        """
+        Prints updatable messages that expired without being completed
+        """
+        for message in self.protocol.expire_updatables():
+            self.print_record(message.record("expired", time.time()))
+
+    def cleanup_thread(self) -> None:
+        """
+        Thread that runs cleanup tasks every 30 seconds
+        """
+        while True:
+            self.cleanup_updatables()
+            # future cleanup tasks here
+            threading.Event().wait(30)
+
+    def open_viewer(self, history: History, title: str, nick_filter: str | None = None, follow: bool = True) -> bool:
+        """
+        Opens a full-screen viewer for a history, overridden by clients that have one
+        Returns False if the viewer isn't available
+        """
+        return False
+
+    def push_notification(self, message: str, title: str = "hcclient", sender: str | None = None, kind: str = "mention") -> None:
+        """
+        Sends a notification, overridden by clients that can display them
+        """
+
+    def recv_thread(self) -> None:
+        """
+        Receives packets from the server and handles them
+        """
+        try:
+            if not self.ws.connected:
+                self.connect_to_server()
+
+            while self.ws.connected:
+                data = self.ws.recv()
+                try:
+                    self.handle_packet(data)
+
+                except Exception as e:
+                    self.drop_packet(data, f"{type(e).__name__}: {e}")
+
+        except Exception as e:
+            self.channel = None
+
+            if self.reconnecting:
+                self.close()
+
+            else:
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored(f"Disconnected from server: {e}", self.args["client_color"])))
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored("Reconnecting in 60 seconds, run `/reconnect` to do it immediately", self.args["client_color"])))
+                self.timed_reconnect = threading.Timer(60, self.reconnect_to_server)
+                self.timed_reconnect.start()
+                self.close()
+
+    def handle_packet(self, data: str) -> None:
+        """
+        Handles a received packet, raw packets are dumped as is
+        Packets that don't match the schema of their cmd are dropped, so a malformed
+        or malicious packet can't take the connection down
+        """
+        received = self.hook_bus.emit("on_packet", json.loads(data))
+        if received is False:
+            return
+
+        problem = validate_packet(received)
+        if problem is None and received.get("time") is not None:
+            packet_timestamp = received["time"] / 1000
+            self.delivery_latency.append(time.time() - packet_timestamp)
+
+        else:
+            packet_timestamp = time.time()
+
+        packet_time = datetime.datetime.fromtimestamp(packet_timestamp).strftime(self.args["timestamp_format"])
+
+        if self.args["no_parse"]:
+            self.dump_packet(received, packet_time)
+            return
+
+        if problem is not None:
+            self.drop_packet(data, problem)
+            return
+
+        self.moderator.observe(received)
+
+        match received["cmd"]:
+            case "onlineSet":
+                first_join = not self.protocol.users
+                joined, left = self.protocol.set_users(received, self.args["ignored"])
+                self.update_complete_list(joined, left)
+                self.channel = received["users"][0]["channel"]
+                if self.connect_started is not None:
+                    self.join_time = time.perf_counter() - self.connect_started
+
+                if first_join:
+                    self.print_record(Message("server", packet_timestamp, f"Connected to channel: {self.channel} - Users: {', '.join(self.protocol.users)}"))
+
+                else:
+                    changes = "".join((f" - Joined while away: {', '.join(joined)}" if joined else "", f" - Left while away: {', '.join(left)}" if left else ""))
+                    self.print_record(Message("server", packet_timestamp, f"Rejoined channel: {self.channel}{changes or ' - No changes while away'}"))
+
+            case "chat":
+                if self.protocol.is_ignored(received):
+                    return
+
+                highlighted = self.highlighter.search(received["text"])
+                if highlighted:
+                    self.push_notification(f"[{received['nick']}] {received['text']}", sender=received["nick"])
+
+                record = Message("chat", packet_timestamp, received["text"], received["nick"], received.get("trip", ""), received["level"],
+                                 self.nick == received["nick"], highlighted)
+
+                if "customId" in received:
+                    record.status = "updatable"
+                    record.unique_id = "".join(random.choice("123456789") for _ in range(5))
+                    self.protocol.track_updatable(received, record)
+
+                self.print_record(record)
+
+            case "updateMessage":
+                completed = self.protocol.update_message(received)
+                if completed is not None:
+                    self.print_record(completed.record("completed", packet_timestamp))
+
+            case "info":
+                if received.get("type") is not None and received.get("type") == "whisper":
+                    sender = received["from"]
+                    if self.protocol.is_ignored(received):
+                        return
+
+                    if sender in self.protocol.users:
+                        self.push_notification(received["text"], sender=sender, kind="whisper")
+
+                    self.print_record(Message("whisper", packet_timestamp, received["text"], sender, received.get("trip", "")))
+
+                else:
+                    self.print_record(Message("server", packet_timestamp, received["text"]))
+
+            case "onlineAdd":
+                if self.protocol.add_user(received, self.args["ignored"]):
+                    self.update_complete_list([received["nick"]], [])
+
+                self.print_record(Message("server", packet_timestamp, received["nick"] + " joined"))
+
+            case "onlineRemove":
+                if self.protocol.remove_user(received["nick"]):
+                    self.update_complete_list([], [received["nick"]])
+
+                self.print_record(Message("server", packet_timestamp, received["nick"] + " left"))
+
+            case "emote":
+                if self.protocol.is_ignored(received):
+                    return
+
+                self.print_record(Message("emote", packet_timestamp, received["text"], received["nick"], received.get("trip", "")))
+
+            case "warn":
+                self.print_record(Message("warn", packet_timestamp, received["text"]))
+
+                if received["text"].startswith("Nickname"):
+                    self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                      termcolor.colored("CLIENT", self.args["client_color"]),
+                                                      termcolor.colored("Try running `/nick <newnick>` and `/reconnect`", self.args["client_color"])))
+
+            case "captcha":
+                with open(f"captcha_{received['channel']}.txt", "w") as captcha_dump:
+                    captcha_dump.write(received["text"])
+
+                self.print_msg("{}|{}| {}".format(termcolor.colored(packet_time, self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored(f"Captcha encountered, saved to captcha_{received['channel']}.txt", self.args["client_color"])))
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored(f"Run `/cat captcha_{received['channel']}.txt` to print the captcha here", self.args["client_color"])))
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored("Send the solution as a message", self.args["client_color"])))
+
+    def drop_packet(self, data: str, problem: str) -> None:
+        """
+        Counts a packet that was dropped and reports it, reports are limited to one
+        every drop_report_interval seconds so a flood of bad packets can't flood the output
+        """
+        match = self.packet_cmd_pattern.search(data)
+        cmd = match.group(1) if match else "unknown"
+        now = time.monotonic()
+
+        with self.dropped_packets_lock:
+            self.dropped_packets[cmd] += 1
+            self.last_dropped = f"{cmd} packet, {problem}"
+            if now - self.last_drop_report < self.drop_report_interval:
+                self.unreported_drops += 1
+                return
+
+            unreported = self.unreported_drops
+            self.unreported_drops = 0
+            self.last_drop_report = now
+
+        more = f" ({unreported} more dropped since the last report, see `/status`)" if unreported else ""
+        self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                          termcolor.colored("CLIENT", self.args["client_color"]),
+                                          termcolor.colored(f"Dropped malformed {cmd} packet: {problem}{more}", self.args["client_color"])))
+
+    def packet_report(self) -> str:
+        """
+        Returns the number of dropped packets by cmd, and the last problem
+        """
+        with self.dropped_packets_lock:
+            if not self.dropped_packets:
+                return "Dropped packets: none"
+
+            counts = ", ".join(f"{cmd}: {count}" for cmd, count in self.dropped_packets.most_common())
+            return f"Dropped packets: {sum(self.dropped_packets.values())} ({counts}), last: {self.last_dropped}"
+
+    def ping_thread(self) -> None:
+        """
+        Sends a websocket ping every few seconds to measure the round trip time,
+        and a ping packet every 60 seconds as a keepalive
+        Reconnects if nothing, not even a pong, was received for stale_timeout seconds,
+        which catches half-open connections that still look connected
+        """
+        last_ping = last_keepalive = 0
+        while True:
+            if self.ws.connected and not self.reconnecting:
+                now = time.monotonic()
+                silence = self.ws.silence()
+                if silence > self.stale_timeout:
+                    self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                      termcolor.colored("CLIENT", self.args["client_color"]),
+                                                      termcolor.colored(f"Connection stale, nothing received for {silence:.0f} seconds", self.args["client_color"])))
+                    self.timed_reconnect.cancel()
+                    threading.Thread(target=self.reconnect_to_server, daemon=True).start()
+
+                elif now - last_ping >= self.ping_interval:
+                    with contextlib.suppress(Exception):
+                        self.ws.ping()
+                        last_ping = now
+                        if now - last_keepalive >= self.keepalive_interval:
+                            self.ws.send(json.dumps({"cmd": "ping"}))
+                            last_keepalive = now
+
+            threading.Event().wait(1)
+
+    def latency_report(self) -> str:
+        """
+        Returns the time from connecting to receiving the user list,
+        and the delivery latency of recent packets, taken from their time field
+        """
+        join = f"Joined in {self.join_time * 1000:.0f}ms from connecting to receiving the user list\n" if self.join_time is not None else ""
+        if not self.delivery_latency:
+            return join + "Delivery latency: no timestamped packets yet"
+
+        samples = self.delivery_latency
+        return join + (f"Delivery latency: {samples[-1] * 1000:.0f}ms, avg {sum(samples) / len(samples) * 1000:.0f}ms, max {max(samples) * 1000:.0f}ms "
+                       f"over {len(samples)} packets (includes clock offset to the server)")
+
+    @abc.abstractmethod
+    def input_manager(self) -> None:
+        """
+        Handles input until the client exits
+        """
+
+    def expand_aliases(self, message: str) -> str:
+        """
+        Replaces $alias words with their values in a single pass,
+        values aren't expanded again
+        """
+        if "$" not in message:
+            return message
+
+        aliases = self.args["aliases"]
+        return " ".join(aliases.get(word[1:], word) if word.startswith("$") else word for word in message.split(" "))
+
+    def send_input(self, message: str) -> None:
+        """
+        Handles input received from the prompt
+        """
+        if len(message) > 0:
+            message = self.expand_aliases(message)
+
+            parsed_message = message.partition(" ")
+            if parsed_message[0] in ClientCommands.client_command_map or parsed_message[0] in ClientCommands.mod_command_map:
+                if self.hook_bus.emit("on_command", parsed_message[0], parsed_message[2]) is False:
+                    return
+
+            if parsed_message[0] in ClientCommands.client_command_map:
+                ClientCommands.client_command_map[parsed_message[0]](self, parsed_message[2])
+
+            elif parsed_message[0] in ClientCommands.mod_command_map and self.args["is_mod"]:
+                ClientCommands.mod_command_map[parsed_message[0]](self, parsed_message[2])
+
+            elif self.whisper_lock and (message.split(" ")[0] not in ("/whisper", "/w", "/reply", "/r") or message.startswith(" ")):
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored("Whisper lock active, toggle it off to send messages", self.args["client_color"])))
+
+            else:
+                self.send({"cmd": "chat", "text": message})
+
+    def close(self, error: bool | Exception = False, thread: bool = True) -> None:
+        """
+        Exits the client or thread
+        """
+        if not thread:
+            colorama.deinit()
+
+        if error:
+            print(f"{type(error).__name__}: {error}")
+            sys.exit(1)
+
+        else:
+            sys.exit(0)
+
+    def run(self, version: str) -> None:
+        """
+        Start threads and run the input manager
+        """
+        if self.args["clear"]:
+            os.system("cls" if os.name == "nt" else "clear")
+
+        self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                          termcolor.colored("CLIENT", self.args["client_color"]),
+                                          termcolor.colored(f"hcclient {version}", self.args["client_color"])))
+
+        if self.restored_messages:
+            self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                              termcolor.colored("CLIENT", self.args["client_color"]),
+                                              termcolor.colored(f"Restored {self.restored_messages} messages from the last session, run `/reprint` or `/scrollback` to see them",
+                                                                self.args["client_color"])))
+
+        if len(self.hooks) > 0:
+            self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                              termcolor.colored("CLIENT", self.args["client_color"]),
+                                              termcolor.colored(f"Loaded hooks: {', '.join(self.hooks)}", self.args["client_color"])))
+        if self.args["latex"]:
+            if self.formatter.latex_worker.available():
+                self.formatter.latex_worker.start()
+
+            else:
+                self.args["latex"] = False
+
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored("Error enabling LaTeX simplifying, optional dependencies not installed", self.args["client_color"])))
+                self.print_msg("{}|{}| {}".format(termcolor.colored(self.formatted_datetime(), self.args["timestamp_color"]),
+                                                  termcolor.colored("CLIENT", self.args["client_color"]),
+                                                  termcolor.colored("Packages that provide missing dependencies: PyPI: hcclient[latex], AUR: hcclient-latex", self.args["client_color"])))
+
+        for thread in (self.thread_ping, self.thread_recv, self.thread_cleanup):
+            thread.start()
+
+        self.input_manager()
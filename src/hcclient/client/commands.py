@@ -15,6 +15,7 @@
 import termcolor
 
 from hcclient.utils.config import validate_config
+from hcclient.client.history import History
 
 
 class ClientCommands:
@@ -30,6 +31,7 @@ def show_help(client: object, args_string: str) -> None:
   ctrl+u    clear line
   ctrl+l    clear buffer
   ctrl+c    clear buffer, exit on second press
+  pageup    open scrollback viewer
 
 Client commands:
   /help [server-based command]
@@ -58,11 +60,22 @@ def show_help(client: object, args_string: str) -> None:
   /reconnect
     Disconnects forcefully and reconnects to
     the server.
+  /status
+    Prints the connection status, compression,
+    bytes sent/received on the wire, round trip
+    time and delivery latency.
   /set <alias> <value>
     Sets an alias. $alias will be replaced with
     the value in your messages.
   /unset <alias>
     Unsets an alias.
+  /highlight [keyword|re:regex]
+    Adds a highlight rule, or lists them if none
+    is specified. Messages matching @nick or any
+    rule trigger a notification and are
+    emphasized.
+  /unhighlight <keyword|re:regex>
+    Removes a highlight rule.
   /configset <option> <value>
     Sets a configuration option to a value.
     Changed values will be in effect immediately.
@@ -70,11 +83,21 @@ def show_help(client: object, args_string: str) -> None:
     Prints the current configuration.
   /save
     Saves the current configuration to the loaded
-    configuration file. Will save aliases and
-    ignored trips/hashes.
+    configuration file. Will save aliases,
+    highlights and ignored trips/hashes.
   /reprint
     Prints the last 100 lines of output, even if
-    they have been cleared with /clear.
+    they have been cleared with /clear. Messages
+    are rendered again with the current settings.
+  /scrollback [nick]
+    Opens the full-screen scrollback viewer, only
+    showing messages from nick if specified.
+    Supports searching, jumping to a time and
+    filtering by nick.
+  /hooks
+    Prints how long each hook's event handlers
+    take, and which hooks were disabled for going
+    over the time budget.
   /exec <code>
     Executes python code in the context of the
     client, similar to a browser's dev console.
@@ -102,15 +125,32 @@ def show_help(client: object, args_string: str) -> None:
   /unlockroom
   /forcecolor <nick> <color>
   /anticmd
-  /uwuify <nick> [nick2] [nick3]..."""
+  /uwuify <nick> [nick2] [nick3]...
+  /bulk <action> <nick|trip|hash>:<regex>...
+    Selects online users matching every regex
+    and previews the selection. The action is
+    ban, kick, dumb, speak, overflow, uwuify,
+    authtrip or deauthtrip.
+  /bulk confirm|cancel|status
+    Runs the selected action at bulk_rate
+    commands per second and prints a summary
+    of the server's responses, stops it, or
+    shows its progress."""
             footer_text = "\n\nRun `/help server` to read the server help text."
             display = help_text + mod_help_text + footer_text if client.args["is_mod"] else help_text + footer_text
 
-            if shutil.which("less") and os.name != "nt":
-                display = display.replace("Keybindings", termcolor.colored("Keybindings", attrs=["bold"]))
-                display = display.replace("Client commands", termcolor.colored("Client commands", attrs=["bold"]))
-                display = display.replace("Moderator commands", termcolor.colored("Moderator commands", attrs=["bold"]))
+            display = display.replace("Keybindings", termcolor.colored("Keybindings", attrs=["bold"]))
+            display = display.replace("Client commands", termcolor.colored("Client commands", attrs=["bold"]))
+            display = display.replace("Moderator commands", termcolor.colored("Moderator commands", attrs=["bold"]))
 
+            help_history = History(1000)
+            for line in display.split("\n"):
+                help_history.append(History.text_record(line))
+
+            if client.open_viewer(help_history, "Help", follow=False):
+                return
+
+            if shutil.which("less") and os.name != "nt" and sys.stdout.isatty():
                 with subprocess.Popen(["less", "-R"], stdin=subprocess.PIPE, errors="backslashreplace") as pager_proc:
                     try:
                         with pager_proc.stdin as pipe:
@@ -145,13 +185,13 @@ def raw(client: object, args_string: str) -> None:
     def list_users(client: object, args_string: str) -> None:
         client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                             termcolor.colored("CLIENT", client.args["client_color"]),
-                                            termcolor.colored(f"Channel: {client.channel} - Users: {', '.join(client.online_users)}", client.args["client_color"])))
+                                            termcolor.colored(f"Channel: {client.channel} - Users: {', '.join(client.protocol.users)}", client.args["client_color"])))
 
     def profile(client: object, args_string: str) -> None:
         target = args_string.lstrip("@")
-        if target in client.online_users:
-            ignored = "Yes" if target in client.online_ignored_users else "No"
-            profile = f"{target}'s profile:\n" + "\n".join(f"{option}: {value}" for option, value in client.online_users_details[target].items()) + f"\nIgnored: {ignored}"
+        if target in client.protocol.users:
+            ignored = "Yes" if target in client.protocol.ignored_users else "No"
+            profile = f"{target}'s profile:\n" + "\n".join(f"{option}: {value}" for option, value in client.protocol.details[target].items()) + f"\nIgnored: {ignored}"
             client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                                 termcolor.colored("CLIENT", client.args["client_color"]),
                                                 termcolor.colored(profile, client.args["client_color"])))
@@ -168,6 +208,7 @@ def nick(client: object, args_string: str) -> None:
 
             client.nick = args_string
             client.args["nickname"] = args_string
+            client.highlighter.compile(client.nick, client.args["highlights"])
 
         else:
             client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
@@ -188,16 +229,11 @@ def wlock(client: object, args_string: str) -> None:
 
     def ignore(client: object, args_string: str) -> None:
         target = args_string.lstrip("@")
-        if target in client.online_users:
-            client.online_ignored_users.append(target)
-            target_trip = client.online_users_details[target]["Trip"]
-            target_hash = client.online_users_details[target]["Hash"]
-
-            if target_trip not in client.args["ignored"]["trips"] and target_trip is not None:
-                client.args["ignored"]["trips"].append(target_trip)
-
-            if target_hash not in client.args["ignored"]["hashes"]:
-                client.args["ignored"]["hashes"].append(target_hash)
+        if target in client.protocol.users:
+            client.protocol.ignore(target, client.args["ignored"])
+            target_trip = client.protocol.details[target].trip
+            target_hash = client.protocol.details[target].hash
+            client.persist_settings()
 
             return_msg = f"Ignoring trip '{target_trip}' and hash '{target_hash}'" if target_trip is not None else f"Ignoring hash '{target_hash}'"
             return_msg += ", run `/save` to persist"
@@ -212,8 +248,9 @@ def ignore(client: object, args_string: str) -> None:
                                                 termcolor.colored(f"No such user: '{target}'", client.args["client_color"])))
 
     def unignoreall(client: object, args_string: str) -> None:
-        client.online_ignored_users = []
+        client.protocol.ignored_users.clear()
         client.args["ignored"] = {"trips": [], "hashes": []}
+        client.persist_settings()
         client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                             termcolor.colored("CLIENT", client.args["client_color"]),
                                             termcolor.colored("Unignored all trips/hashes, run `/save` to persist", client.args["client_color"])))
@@ -222,6 +259,12 @@ def reconnect(client: object, args_string: str) -> None:
         client.timed_reconnect.cancel()
         threading.Thread(target=client.reconnect_to_server, daemon=True).start()
 
+    def status(client: object, args_string: str) -> None:
+        state = f"Connected to {client.ws.address}" if client.ws.connected else "Not connected"
+        client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                            termcolor.colored("CLIENT", client.args["client_color"]),
+                                            termcolor.colored(f"Status:\n{state}\n{client.ws.report()}\n{client.latency_report()}\n{client.packet_report()}", client.args["client_color"])))
+
     def set_alias(client: object, args_string: str) -> None:
         args = args_string.split(" ")
         if len(args) < 2:
@@ -231,6 +274,7 @@ def set_alias(client: object, args_string: str) -> None:
 
         else:
             client.args["aliases"][args[0]] = " ".join(args[1:])
+            client.persist_settings()
             client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                                 termcolor.colored("CLIENT", client.args["client_color"]),
                                                 termcolor.colored(f"Set alias '{args[0]}' = '{client.args['aliases'][args[0]]}'", client.args["client_color"])))
@@ -238,6 +282,7 @@ def set_alias(client: object, args_string: str) -> None:
     def unset_alias(client: object, args_string: str) -> None:
         try:
             client.args["aliases"].pop(args_string)
+            client.persist_settings()
             client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                                 termcolor.colored("CLIENT", client.args["client_color"]),
                                                 termcolor.colored(f"Unset alias '{args_string}'", client.args["client_color"])))
@@ -247,11 +292,52 @@ def unset_alias(client: object, args_string: str) -> None:
                                                 termcolor.colored("CLIENT", client.args["client_color"]),
                                                 termcolor.colored(f"Alias '{args_string}' isn't defined", client.args["client_color"])))
 
+    def highlight(client: object, args_string: str) -> None:
+        if args_string == "":
+            client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                termcolor.colored("CLIENT", client.args["client_color"]),
+                                                termcolor.colored("Highlights: " + (", ".join(f"'{rule}'" for rule in client.args["highlights"]) or "None"), client.args["client_color"])))
+
+        elif args_string not in client.args["highlights"] and validate_config("highlights", [args_string]):
+            try:
+                client.highlighter.compile(client.nick, client.args["highlights"] + [args_string])
+
+            except re.error as e:
+                client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                    termcolor.colored("CLIENT", client.args["client_color"]),
+                                                    termcolor.colored(f"Invalid highlight '{args_string}': {e}", client.args["client_color"])))
+                return
+
+            client.args["highlights"].append(args_string)
+            client.history.invalidate()
+            client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                termcolor.colored("CLIENT", client.args["client_color"]),
+                                                termcolor.colored(f"Added highlight '{args_string}', run `/save` to persist", client.args["client_color"])))
+
+        else:
+            client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                termcolor.colored("CLIENT", client.args["client_color"]),
+                                                termcolor.colored(f"Invalid or duplicate highlight '{args_string}'", client.args["client_color"])))
+
+    def unhighlight(client: object, args_string: str) -> None:
+        try:
+            client.args["highlights"].remove(args_string)
+            client.highlighter.compile(client.nick, client.args["highlights"])
+            client.history.invalidate()
+            client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                termcolor.colored("CLIENT", client.args["client_color"]),
+                                                termcolor.colored(f"Removed highlight '{args_string}', run `/save` to persist", client.args["client_color"])))
+
+        except ValueError:
+            client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                termcolor.colored("CLIENT", client.args["client_color"]),
+                                                termcolor.colored(f"Highlight '{args_string}' isn't defined", client.args["client_color"])))
+
     def configset(client: object, args_string: str) -> None:
         args = args_string.split(" ")
         value, option = " ".join(args[1:]), args[0].lower()
 
-        if option in client.args and option not in ("config_file", "channel", "nickname", "aliases", "ignored"):
+        if option in client.args and option not in ("config_file", "channel", "nickname", "aliases", "ignored", "highlights", "persist_state"):
             match value.lower():
                 case "false":
                     value = False
@@ -262,30 +348,29 @@ def configset(client: object, args_string: str) -> None:
                 case "none" | "null":
                     value = None
 
-            if option in ("suggest_aggr", "backticks_bg"):
+            if option in ("suggest_aggr", "backticks_bg", "hook_budget", "scrollback_lines", "connect_timeout", "dns_cache_ttl", "bulk_rate"):
                 with contextlib.suppress(ValueError):
                     value = int(value)
 
             if validate_config(option, value):
                 client.args[option] = value
-                client.manage_complete_list()
-                client.prompt_session.completer = client.create_completer()
+                client.refresh_completer()
+                client.history.invalidate()
                 client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                                     termcolor.colored("CLIENT", client.args["client_color"]),
                                                     termcolor.colored(f"Set configuration option '{option}' to '{value}'", client.args["client_color"])))
 
-                if option == "latex" and value and "latex2sympy2" not in sys.modules:
-                    try:
-                        import latex2sympy2
-                        client.formatter.latex2sympy = latex2sympy2
-                        client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
-                                                            termcolor.colored("CLIENT", client.args["client_color"]),
-                                                            termcolor.colored("Warning: You have enabled LaTeX simplifying", client.args["client_color"])))
-                        client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
-                                                            termcolor.colored("CLIENT", client.args["client_color"]),
-                                                            termcolor.colored("Idle memory usage will increase significantly", client.args["client_color"])))
+                if option == "scrollback_lines":
+                    client.history.max_entries = value
+
+                elif option == "latex" and not value:
+                    client.formatter.latex_worker.stop()
 
-                    except ImportError:
+                elif option == "latex":
+                    if client.formatter.latex_worker.available():
+                        client.formatter.latex_worker.start()
+
+                    else:
                         client.args["latex"] = False
                         client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                                             termcolor.colored("CLIENT", client.args["client_color"]),
@@ -341,11 +426,23 @@ def save(client: object, args_string: str) -> None:
                                                 termcolor.colored("CLIENT", client.args["client_color"]),
                                                 termcolor.colored(f"Load a config file with `--load-config` or place `config.yml` in {client.def_config_dir}", client.args["client_color"])))
 
+    def hook_stats(client: object, args_string: str) -> None:
+        client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                            termcolor.colored("CLIENT", client.args["client_color"]),
+                                            termcolor.colored("Hook stats:\n" + client.hook_bus.report(), client.args["client_color"])))
+
     def reprint(client: object, args_string: str) -> None:
+        messages = client.history.tail_text(100)
         client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
                                             termcolor.colored("CLIENT", client.args["client_color"]),
-                                            termcolor.colored(f"Re-printing {len(client.stdout_history)} messages...", client.args["client_color"])), hist=False)
-        print("\n".join(client.stdout_history))
+                                            termcolor.colored(f"Re-printing {len(messages)} messages...", client.args["client_color"])), hist=False)
+        print("\n".join(messages))
+
+    def scrollback(client: object, args_string: str) -> None:
+        if not client.open_viewer(client.history, "Scrollback", args_string.strip() or None):
+            client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                                termcolor.colored("CLIENT", client.args["client_color"]),
+                                                termcolor.colored("The scrollback viewer needs the interactive client", client.args["client_color"])))
 
     def dev_exec(client: object, args_string: str) -> None:
         try:
@@ -440,6 +537,39 @@ def anticmd(client: object, args_string: str) -> None:
     def uwuify(client: object, args_string: str) -> None:
         [client.send({"cmd": "uwuify", "nick": user.lstrip("@")}) for user in args_string.split(" ")]
 
+    def bulk(client: object, args_string: str) -> None:
+        args = args_string.split()
+        match args:
+            case ["confirm"]:
+                if client.moderator.start():
+                    message = f"Running bulk {client.moderator.action} on {len(client.moderator.targets)} targets, run `/bulk cancel` to stop"
+
+                else:
+                    message = "Nothing to run, select targets with `/bulk <action> <nick|trip|hash>:<regex>...` first"
+
+            case ["cancel"]:
+                message = "Cancelling bulk action" if client.moderator.cancel() else "Nothing to cancel"
+
+            case ["status"]:
+                message = client.moderator.status()
+
+            case [action, *selectors]:
+                try:
+                    targets, excluded = client.moderator.select(action, selectors)
+                    excluded_text = f"\nExcluded {excluded} users that are you, mods or admins" if excluded else ""
+                    confirm_text = "\nRun `/bulk confirm` to proceed or `/bulk cancel` to discard" if targets else ""
+                    message = client.moderator.preview() + excluded_text + confirm_text
+
+                except ValueError as e:
+                    message = f"Error selecting targets: {e}"
+
+            case _:
+                message = "Usage: /bulk <action> <nick|trip|hash>:<regex>... or /bulk confirm|cancel|status"
+
+        client.print_msg("{}|{}| {}".format(termcolor.colored(client.formatted_datetime(), client.args["timestamp_color"]),
+                                            termcolor.colored("CLIENT", client.args["client_color"]),
+                                            termcolor.colored(message, client.args["client_color"])))
+
     client_command_map = {
         "/help": show_help,
         "/raw": raw,
@@ -451,12 +581,17 @@ def uwuify(client: object, args_string: str) -> None:
         "/ignore": ignore,
         "/unignoreall": unignoreall,
         "/reconnect": reconnect,
+        "/status": status,
         "/set": set_alias,
         "/unset": unset_alias,
+        "/highlight": highlight,
+        "/unhighlight": unhighlight,
         "/configset": configset,
         "/configdump": configdump,
         "/save": save,
         "/reprint": reprint,
+        "/scrollback": scrollback,
+        "/hooks": hook_stats,
         "/exec": dev_exec,
         "/cat": cat,
         "/quit": quit_client
@@ -480,7 +615,8 @@ def uwuify(client: object, args_string: str) -> None:
         "/unlockroom": unlockroom,
         "/forcecolor": forcecolor,
         "/anticmd": anticmd,
-        "/uwuify": uwuify
+        "/uwuify": uwuify,
+        "/bulk": bulk
     }
 
     server_commands = ("/whisper", "/reply", "/me", "/stats")
@@ -0,0 +1,208 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import threading
+import contextlib
+
+from hcclient.client.base import BaseClient
+from hcclient.client.records import Message
+
+
+class UnixSocket:
+    """
+    Listening unix socket for headless input/output
+    Lines written are sent to every connected peer,
+    lines received from any peer are queued as input
+    """
+    def __init__(self, path: str) -> None:
+        """
+        Binds the socket and starts accepting peers
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen()
+
+        self.peers = []
+        self.peers_lock = threading.Lock()
+        self.lines = queue.Queue()
+
+        threading.Thread(target=self.accept_thread, daemon=True).start()
+
+    def accept_thread(self) -> None:
+        """
+        Accepts peers and starts a reader for each
+        """
+        while True:
+            peer, _ = self.server.accept()
+            with self.peers_lock:
+                self.peers.append(peer)
+
+            threading.Thread(target=self.reader_thread, args=(peer,), daemon=True).start()
+
+    def reader_thread(self, peer: socket.socket) -> None:
+        """
+        Queues lines received from a peer until it disconnects
+        """
+        with contextlib.suppress(OSError):
+            for line in peer.makefile("r", encoding="utf8", errors="replace"):
+                self.lines.put(line.rstrip("\n"))
+
+        self.drop(peer)
+
+    def drop(self, peer: socket.socket) -> None:
+        """
+        Closes and forgets a peer
+        """
+        with self.peers_lock:
+            if peer in self.peers:
+                self.peers.remove(peer)
+
+        peer.close()
+
+    def write(self, text: str) -> None:
+        """
+        Sends text to every connected peer
+        """
+        data = text.encode("utf8")
+        with self.peers_lock:
+            peers = tuple(self.peers)
+
+        for peer in peers:
+            try:
+                peer.sendall(data)
+
+            except OSError:
+                self.drop(peer)
+
+    def flush(self) -> None:
+        """
+        Nothing to flush, writes are sent immediately
+        """
+
+    def isatty(self) -> bool:
+        """
+        Sockets are never terminals
+        """
+        return False
+
+    def __iter__(self) -> object:
+        """
+        Yields queued input lines forever
+        """
+        while True:
+            yield self.lines.get()
+
+
+class HeadlessClient(BaseClient):
+    """
+    Client without a prompt or notifications, for bots and loggers
+    running without a terminal
+    Writes rendered lines or JSON lines to stdout, a file or a unix socket,
+    and reads input from stdin or a unix socket
+    """
+    ansi_pattern = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+
+    def __init__(self, args: dict, output_format: str = "text", output: str = "-", input_source: str = "-") -> None:
+        """
+        Initializes the client and opens the output and input
+        """
+        super().__init__(args)
+
+        self.output_format = output_format
+        if self.output_format == "jsonl":
+            self.args["no_parse"] = True
+
+        self.sockets = {}
+        self.output = self.open(output, "output")
+        self.input = self.open(input_source, "input")
+        self.output_lock = threading.Lock()
+
+    def open(self, target: str, direction: str) -> object:
+        """
+        Opens an output or input target,
+        '-' for stdout/stdin, 'unix:PATH' for a unix socket or a file path for output
+        """
+        if target == "-":
+            return sys.stdout if direction == "output" else sys.stdin
+
+        if target.startswith("unix:"):
+            if not hasattr(socket, "AF_UNIX"):
+                sys.exit(f"{sys.argv[0]}: error: unix sockets are not supported on this platform")
+
+            if target not in self.sockets:
+                self.sockets[target] = UnixSocket(target[5:])
+
+            return self.sockets[target]
+
+        if direction == "input":
+            sys.exit(f"{sys.argv[0]}: error: headless input must be '-' or 'unix:PATH'")
+
+        return open(target, "a", encoding="utf8", buffering=1)
+
+    def write(self, line: str) -> None:
+        """
+        Writes a line to the output
+        """
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def print_msg(self, message: str, hist: bool = True, record: Message | None = None) -> None:
+        """
+        Writes a message to the output, escape sequences are stripped
+        if the output isn't a terminal
+        Messages aren't kept in the stdout history
+        """
+        message = self.hook_bus.emit("on_print", message)
+        if message is False:
+            return
+
+        if self.output_format == "jsonl":
+            self.write(json.dumps({"cmd": "client", "text": self.ansi_pattern.sub("", message).strip("\n"), "time": int(time.time() * 1000)}))
+
+        else:
+            self.write(message if self.output.isatty() else self.ansi_pattern.sub("", message))
+
+    def dump_packet(self, packet: dict, packet_time: str) -> None:
+        """
+        Writes a received packet to the output as a JSON line
+        """
+        self.write(json.dumps(packet) if self.output_format == "jsonl" else f"{packet_time}|{json.dumps(packet)}")
+
+    def manage_complete_list(self) -> None:
+        """
+        There is no prompt, nothing to complete
+        """
+
+    def update_complete_list(self, joined: list, left: list) -> None:
+        """
+        There is no prompt, nothing to complete
+        """
+
+    def input_manager(self) -> None:
+        """
+        Handles input lines until the client exits
+        Keeps running after stdin is closed, so the client can be used
+        with /dev/null as stdin under a service manager
+        """
+        try:
+            for line in self.input:
+                self.send_input(line.rstrip("\n"))
+
+            threading.Event().wait()
+
+        except (KeyboardInterrupt, SystemExit):
+            self.close(thread=False)
+
+        except Exception as e:
+            self.close(error=e, thread=False)
@@ -0,0 +1,117 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+
+
+class Highlighter:
+    """
+    Compiles highlight rules into regexes
+    Literal keywords are merged into a trie, so the cost of matching
+    a message doesn't grow with the number of keywords
+    Regex rules are compiled on their own, combining them would break
+    inline flags, named groups and backreferences that are valid in a single rule
+    """
+    ansi_pattern = re.compile(r"(\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~]))")
+
+    def __init__(self) -> None:
+        """
+        Sets up an empty matcher, call compile() to build it
+        """
+        self.rules = None
+        self.patterns = []
+
+    def compile(self, nick: str, rules: list) -> None:
+        """
+        Rebuilds the matcher from the nick and the highlight rules,
+        does nothing if neither changed since the last build
+        Rules starting with 're:' are regexes, everything else is a keyword
+        Raises re.error if a regex rule doesn't compile, keeping the previous matcher
+        """
+        key = (nick, tuple(rules))
+        if key == self.rules:
+            return
+
+        keywords = [f"@{nick}"] + [rule for rule in rules if not rule.startswith("re:")]
+        regexes = [re.compile(rule[3:], re.IGNORECASE) for rule in rules if rule.startswith("re:")]
+
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword.lower():
+                node = node.setdefault(char, {})
+
+            node[""] = {}
+
+        literals = self.trie_regex(trie)
+        self.patterns = [re.compile(rf"(?<!\w){literals}(?!\w)", re.IGNORECASE)] + regexes
+        self.rules = key
+
+    def trie_regex(self, node: dict) -> str:
+        """
+        Converts a trie of keywords into a regex with shared prefixes
+        """
+        branches = [re.escape(char) + self.trie_regex(child) for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+
+        regex = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{regex})?" if "" in node else regex
+
+    def search(self, text: str) -> bool:
+        """
+        Returns True if the text matches any highlight rule
+        """
+        return any(pattern.search(text) is not None for pattern in self.patterns)
+
+    def emphasize(self, text: str) -> str:
+        """
+        Renders matching parts of already formatted text in reverse video
+        Rules are matched on the text without its escape sequences, so they
+        can't match inside one, and the spans are mapped back to the formatted text
+        Reverse video is reopened after escape sequences inside a span, since they may reset it
+        """
+        parts = self.ansi_pattern.split(text)
+        plain = "".join(parts[::2])
+        spans = []
+        for start, end in sorted(match.span() for pattern in self.patterns for match in pattern.finditer(plain) if match.end() > match.start()):
+            if spans and start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], end))  # overlapping matches of different rules are merged
+
+            else:
+                spans.append((start, end))
+
+        if not spans:
+            return text
+
+        starts = [start for start, _ in spans]
+        ends = [end for _, end in spans]
+        pieces = []
+        offset = 0
+        inside = False
+
+        for number, part in enumerate(parts):
+            if number % 2:
+                pieces.append(part + ("\033[7m" if inside else ""))
+                continue
+
+            # a span opens in the part its first character is in, and closes in the part its last character is in
+            end = offset + len(part)
+            position = 0
+            while True:
+                if ends and offset < ends[0] <= end and (not starts or ends[0] <= starts[0]):
+                    boundary, sequence, inside = ends.pop(0), "\033[27m", False
+
+                elif starts and offset <= starts[0] < end:
+                    boundary, sequence, inside = starts.pop(0), "\033[7m", True
+
+                else:
+                    break
+
+                pieces.append(part[position:boundary - offset] + sequence)
+                position = boundary - offset
+
+            pieces.append(part[position:])
+            offset = end
+
+        return "".join(pieces)
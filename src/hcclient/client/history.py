@@ -0,0 +1,126 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import time
+import bisect
+import threading
+import collections
+
+from hcclient.client.records import Message
+
+
+class History:
+    """
+    Bounded store of Message records addressed by sequence numbers that stay valid
+    when old entries are dropped, old entries are dropped in chunks so appending stays cheap
+    Records hold the raw message fields and are rendered only when displayed,
+    so the output always matches the current configuration
+    """
+    cache_size = 500
+
+    def __init__(self, max_entries: int, render: object = None) -> None:
+        """
+        Sets up an empty store, render turns a record into a printable line
+        and defaults to returning the record's text
+        """
+        self.max_entries = max_entries
+        self.render = render or (lambda record: record.text)
+        self.entries = []
+        self.offset = 0
+        self.lock = threading.Lock()
+        self.rendered = collections.OrderedDict()
+        self.on_append = None
+
+    @staticmethod
+    def text_record(text: str, nick: str | None = None) -> Message:
+        """
+        Returns a record for a line that was already rendered
+        """
+        return Message("text", time.time(), text, nick)
+
+    def append(self, record: Message) -> None:
+        """
+        Adds a record, dropping the oldest ones once the store is a quarter over its size
+        on_append is called with the record if set, e.g. to persist it
+        """
+        with self.lock:
+            self.entries.append(record)
+            if len(self.entries) > self.max_entries + self.max_entries // 4:
+                drop = len(self.entries) - self.max_entries
+                del self.entries[:drop]
+                self.offset += drop
+
+        if self.on_append is not None:
+            self.on_append(record)
+
+    @property
+    def first(self) -> int:
+        """
+        Sequence number of the oldest entry
+        """
+        return self.offset
+
+    @property
+    def end(self) -> int:
+        """
+        Sequence number the next entry will get
+        """
+        return self.offset + len(self.entries)
+
+    def get(self, seq: int) -> Message | None:
+        """
+        Returns a record, or None if it was dropped
+        """
+        with self.lock:
+            index = seq - self.offset
+            return self.entries[index] if 0 <= index < len(self.entries) else None
+
+    def range(self, start: int, end: int) -> list:
+        """
+        Returns the records with sequence numbers from start up to end
+        """
+        with self.lock:
+            return self.entries[max(start - self.offset, 0):max(end - self.offset, 0)]
+
+    def text(self, seq: int) -> str | None:
+        """
+        Returns a record rendered as a line, or None if it was dropped
+        Recently rendered lines are cached
+        """
+        with self.lock:
+            if seq in self.rendered:
+                self.rendered.move_to_end(seq)
+                return self.rendered[seq]
+
+        record = self.get(seq)
+        if record is None:
+            return None
+
+        text = self.render(record)
+        with self.lock:
+            self.rendered[seq] = text
+            if len(self.rendered) > self.cache_size:
+                self.rendered.popitem(last=False)
+
+        return text
+
+    def tail_text(self, count: int) -> list:
+        """
+        Returns the newest records rendered as lines
+        """
+        lines = (self.text(seq) for seq in range(max(self.end - count, self.first), self.end))
+        return [line for line in lines if line is not None]
+
+    def invalidate(self) -> None:
+        """
+        Drops the cached lines, called when the configuration changes
+        """
+        with self.lock:
+            self.rendered.clear()
+
+    def find_time(self, timestamp: float) -> int:
+        """
+        Returns the sequence number of the first entry at or after a time
+        """
+        with self.lock:
+            return self.offset + bisect.bisect_left(self.entries, timestamp, key=lambda record: record.time)
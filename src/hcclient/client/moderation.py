@@ -0,0 +1,244 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import time
+import threading
+
+import termcolor
+
+
+class BulkModerator:
+    """
+    Runs a moderation command on online users selected by regex over their nick,
+    trip and hash, at a controlled pace in a background thread
+    Server responses are matched back to each target: an info naming the target,
+    or the target leaving after a ban or kick, is a success, a warning naming the
+    target is a failure
+    Other warnings can't be attributed, such as rate limit notices, they're listed
+    in the summary and their targets are left to time out
+    """
+    nick_actions = ("ban", "kick", "dumb", "speak", "overflow", "uwuify")
+    trip_actions = ("authtrip", "deauthtrip")
+    removing_actions = ("ban", "kick")
+    fields = ("nick", "trip", "hash")
+    word_pattern = re.compile(r"[^\s,:#]+")
+    response_timeout = 5  # seconds to wait for responses after the last command is sent
+    preview_size = 20
+
+    def __init__(self, client: object) -> None:
+        """
+        Binds the moderator to a client, nothing is selected
+        """
+        self.client = client
+        self.lock = threading.Condition()
+        self.action = None
+        self.targets = []
+        self.pending = {}
+        self.results = {}
+        self.warnings = []
+        self.running = False
+        self.cancelled = False
+
+    def select(self, action: str, selectors: list) -> tuple:
+        """
+        Selects the targets of an action from the online users matching every
+        field:regex selector, unmatched fields default to matching anything
+        Returns the targets and the number of users excluded for being yourself,
+        a mod or an admin, raises ValueError for an invalid action or selector
+        """
+        if action not in self.nick_actions + self.trip_actions:
+            raise ValueError(f"Unknown action '{action}', expected one of: {', '.join(self.nick_actions + self.trip_actions)}")
+
+        if not selectors:
+            raise ValueError("At least one nick:, trip: or hash: selector is required")
+
+        patterns = []
+        for selector in selectors:
+            field, separator, pattern = selector.partition(":")
+            if not separator or field not in self.fields:
+                raise ValueError(f"Invalid selector '{selector}', expected nick:, trip: or hash: followed by a regex")
+
+            try:
+                patterns.append((field, re.compile(pattern)))
+
+            except re.error as e:
+                raise ValueError(f"Invalid regex '{pattern}': {e}")
+
+        with self.lock:
+            if self.running:
+                raise ValueError(f"A bulk {self.action} is running, run `/bulk cancel` to stop it")
+
+            targets = []
+            excluded = 0
+            for nick, details in list(self.client.protocol.details.items()):
+                values = {"nick": nick, "trip": details.trip or "", "hash": details.hash or ""}
+                if not all(pattern.search(values[field]) for field, pattern in patterns):
+                    continue
+
+                if nick == self.client.nick or details.utype in ("Mod", "Admin"):
+                    excluded += 1
+                    continue
+
+                target = nick if action in self.nick_actions else details.trip
+                if target and target not in targets:
+                    targets.append(target)
+
+            self.action = action
+            self.targets = targets
+
+        return targets, excluded
+
+    def preview(self) -> str:
+        """
+        Returns a description of the current selection
+        """
+        if not self.targets:
+            return "No users selected"
+
+        shown = ", ".join(self.targets[:self.preview_size])
+        more = f" and {len(self.targets) - self.preview_size} more" if len(self.targets) > self.preview_size else ""
+        kind = "users" if self.action in self.nick_actions else "trips"
+        return f"Selected {len(self.targets)} {kind} to {self.action}: {shown}{more}"
+
+    def start(self) -> bool:
+        """
+        Starts running the action on the selection, returns False if nothing is selected
+        """
+        with self.lock:
+            if self.running or not self.targets:
+                return False
+
+            self.running = True
+            self.cancelled = False
+            self.pending.clear()
+            self.results.clear()
+            self.warnings.clear()
+
+        threading.Thread(target=self.dispatch_thread, daemon=True).start()
+        return True
+
+    def cancel(self) -> bool:
+        """
+        Stops a running action, or discards the selection
+        Returns False if there was nothing to cancel
+        """
+        with self.lock:
+            if self.running:
+                self.cancelled = True
+                self.lock.notify_all()
+                return True
+
+            cancelled = bool(self.targets)
+            self.targets = []
+            return cancelled
+
+    def status(self) -> str:
+        """
+        Returns the progress of a running action
+        """
+        with self.lock:
+            if not self.running:
+                return "No bulk action is running"
+
+            done = len(self.results)
+            succeeded = sum(1 for success, _ in self.results.values() if success)
+            return f"Bulk {self.action}: {done}/{len(self.targets)} answered, {succeeded} succeeded, {len(self.pending)} waiting for a response"
+
+    def dispatch_thread(self) -> None:
+        """
+        Sends the commands at the configured pace, waits for the responses and prints a summary
+        """
+        start = time.perf_counter()
+        interval = 1 / self.client.args["bulk_rate"]
+        key = "nick" if self.action in self.nick_actions else "trip"
+
+        for index, target in enumerate(self.targets):
+            with self.lock:
+                due = start + index * interval
+                while not self.cancelled and time.perf_counter() < due:
+                    self.lock.wait(due - time.perf_counter())
+
+                if self.cancelled or not self.client.ws.connected:
+                    break
+
+                self.pending[target] = time.perf_counter()
+
+            self.client.send({"cmd": self.action, key: target})
+
+        with self.lock:
+            deadline = time.perf_counter() + self.response_timeout
+            while self.pending and not self.cancelled and time.perf_counter() < deadline:
+                self.lock.wait(deadline - time.perf_counter())
+
+            for target in self.pending:
+                self.results[target] = (None, "no response")
+
+            self.pending.clear()
+            summary = self.summary(time.perf_counter() - start)
+            self.running = False
+            self.targets = []
+
+        self.client.print_msg("{}|{}| {}".format(termcolor.colored(self.client.formatted_datetime(), self.client.args["timestamp_color"]),
+                                                 termcolor.colored("CLIENT", self.client.args["client_color"]),
+                                                 termcolor.colored(summary, self.client.args["client_color"])))
+
+    def summary(self, elapsed: float) -> str:
+        """
+        Returns the results of the finished action, failures are grouped by the server's warning
+        """
+        succeeded = [target for target, (success, _) in self.results.items() if success]
+        failed = {}
+        for target, (success, detail) in self.results.items():
+            if success is False:
+                failed.setdefault(detail, []).append(target)
+
+        unanswered = [target for target, (success, _) in self.results.items() if success is None]
+        unsent = len(self.targets) - len(self.results)
+
+        lines = [f"Bulk {self.action} {'cancelled' if self.cancelled else 'finished'} in {elapsed:.1f}s: {len(succeeded)} succeeded, "
+                 f"{sum(map(len, failed.values()))} failed, {len(unanswered)} without a response" + (f", {unsent} not sent" if unsent else "")]
+        for detail, targets in failed.items():
+            lines.append(f"Failed ({detail}): {', '.join(targets)}")
+
+        if unanswered:
+            lines.append(f"Without a response: {', '.join(unanswered)}")
+
+        if self.warnings:
+            lines.append(f"Warnings not naming a target: {'; '.join(dict.fromkeys(self.warnings))}")
+
+        return "\n".join(lines)
+
+    def observe(self, packet: dict) -> None:
+        """
+        Matches a received packet to the targets waiting for a response,
+        called by the receive thread for every packet
+        """
+        if not self.pending:
+            return
+
+        with self.lock:
+            match packet.get("cmd"):
+                case "warn":
+                    named = [word for word in self.word_pattern.findall(packet.get("text", "")) if word in self.pending]
+                    for target in named:
+                        self.resolve(target, False, packet["text"])
+
+                    if not named:
+                        self.warnings.append(packet.get("text", ""))
+
+                case "info" if packet.get("type") != "whisper":
+                    for word in self.word_pattern.findall(packet.get("text", "")):
+                        if word in self.pending:
+                            self.resolve(word, True, packet["text"])
+
+                case "onlineRemove" if self.action in self.removing_actions and packet.get("nick") in self.pending:
+                    self.resolve(packet["nick"], True, "left")
+
+    def resolve(self, target: str, success: bool, detail: str) -> None:
+        """
+        Records the result for a target, the lock must be held
+        """
+        self.pending.pop(target)
+        self.results[target] = (success, detail)
+        self.lock.notify_all()
@@ -0,0 +1,104 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import os
+import time
+import queue
+import shutil
+import subprocess
+
+import notifypy
+
+
+class Notifier:
+    """
+    Sends desktop/android notifications from a single long-lived thread,
+    rate limiting them and coalescing bursts into one summary
+    """
+    interval = 5  # minimum seconds between two notifications
+
+    def __init__(self, config_dir: str) -> None:
+        """
+        Detects the notification backend once and sets up the queue,
+        the notifypy backend is only built when the first notification is sent
+        """
+        self.termux = shutil.which("termux-notification")
+        self.tone = os.path.join(config_dir, "tone.wav") if os.path.isfile(os.path.join(config_dir, "tone.wav")) else None
+        self.notification = None
+
+        self.queue = queue.Queue()
+        self.last_sent = 0
+
+    def push(self, message: str, title: str, sender: str | None, kind: str) -> None:
+        """
+        Queues a notification, never blocks
+        """
+        self.queue.put((message, title, sender, kind))
+
+    def notify_thread(self) -> None:
+        """
+        Thread that waits out the rate limit, collecting everything
+        queued in the meantime, and sends it as a single notification
+        """
+        while True:
+            batch = [self.queue.get()]
+
+            while (remaining := self.last_sent + self.interval - time.monotonic()) > 0:
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+
+                except queue.Empty:
+                    break
+
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                self.send(*self.summarize(batch))
+
+            except Exception:
+                pass
+
+            self.last_sent = time.monotonic()
+
+    def summarize(self, batch: list) -> tuple:
+        """
+        Returns the message and title for a batch of notifications,
+        e.g. '14 mentions from 3 users, 1 whisper from 1 user'
+        Notifications without a sender, like those sent by hooks, aren't counted as a user
+        """
+        if len(batch) == 1:
+            return batch[0][:2]
+
+        kinds = {}
+        for _, _, sender, kind in batch:
+            kinds.setdefault(kind, []).append(sender)
+
+        parts = []
+        for kind, senders in kinds.items():
+            users = len(set(senders) - {None})
+            parts.append(f"{len(senders)} {kind}{'s' if len(senders) > 1 else ''}" + (f" from {users} user{'s' if users > 1 else ''}" if users else ""))
+
+        return ", ".join(parts), batch[0][1]
+
+    def send(self, message: str, title: str) -> None:
+        """
+        Sends a notification with the detected backend
+        """
+        if self.termux:
+            subprocess.Popen([
+                self.termux,
+                "-t", title,
+                "-c", message
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).wait()
+
+        else:
+            if self.notification is None:
+                self.notification = notifypy.Notify()
+
+            self.notification.title = title
+            self.notification.message = message
+            if self.tone:
+                self.notification.audio = self.tone
+
+            self.notification.send(block=False)
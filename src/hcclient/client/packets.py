@@ -0,0 +1,107 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+def is_str(value: object) -> bool:
+    """
+    Checks if a value is a string
+    """
+    return isinstance(value, str)
+
+
+def is_optional_str(value: object) -> bool:
+    """
+    Checks if a value is a string or null
+    """
+    return value is None or isinstance(value, str)
+
+
+def is_int(value: object) -> bool:
+    """
+    Checks if a value is an integer, booleans aren't
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_optional_number(value: object) -> bool:
+    """
+    Checks if a value is a number or null
+    """
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+def is_user(value: object) -> bool:
+    """
+    Checks if a value is a user as listed in onlineSet
+    """
+    return isinstance(value, dict) and validate_fields(value, user_fields, {}) is None
+
+
+def is_user_list(value: object) -> bool:
+    """
+    Checks if a value is a non-empty list of users
+    """
+    return isinstance(value, list) and len(value) > 0 and all(map(is_user, value))
+
+
+def is_str_list(value: object) -> bool:
+    """
+    Checks if a value is a list of strings
+    """
+    return isinstance(value, list) and all(map(is_str, value))
+
+
+user_fields = {"nick": is_str, "level": is_int, "channel": is_str, "trip": is_optional_str, "hash": is_optional_str}
+
+# cmd: (required fields, optional fields), whispers are info packets checked as their own kind
+packet_schema = {
+    "onlineSet": ({"nicks": is_str_list, "users": is_user_list}, {}),
+    "onlineAdd": ({"nick": is_str, "level": is_int, "trip": is_optional_str, "hash": is_optional_str}, {}),
+    "onlineRemove": ({"nick": is_str}, {}),
+    "chat": ({"nick": is_str, "text": is_str, "level": is_int}, {"trip": is_optional_str, "customId": is_str, "userid": is_int}),
+    "updateMessage": ({"userid": is_int, "customId": is_str, "text": is_str, "mode": lambda value: value in ("overwrite", "append", "prepend", "complete")}, {}),
+    "info": ({"text": is_str}, {}),
+    "whisper": ({"from": is_str, "text": is_str}, {"trip": is_optional_str}),
+    "emote": ({"nick": is_str, "text": is_str}, {"trip": is_optional_str}),
+    "warn": ({"text": is_str}, {}),
+    "captcha": ({"channel": is_str, "text": is_str}, {})
+}
+
+
+def validate_fields(packet: dict, required: dict, optional: dict) -> str | None:
+    """
+    Checks a packet's fields against their validators
+    Returns a description of the first problem, or None if there is none
+    """
+    for field, validator in required.items():
+        if field not in packet:
+            return f"missing '{field}'"
+
+        if not validator(packet[field]):
+            return f"invalid '{field}': {str(packet[field])[:50]!r}"
+
+    for field, validator in optional.items():
+        if field in packet and not validator(packet[field]):
+            return f"invalid '{field}': {str(packet[field])[:50]!r}"
+
+    return None
+
+
+def validate_packet(packet: object) -> str | None:
+    """
+    Checks a received packet against the schema of its cmd, unknown cmds pass
+    Returns a description of the first problem, or None if the packet is valid
+    """
+    if not isinstance(packet, dict):
+        return "not a JSON object"
+
+    if not is_str(packet.get("cmd")):
+        return "missing 'cmd'"
+
+    if not is_optional_number(packet.get("time")):
+        return f"invalid 'time': {str(packet['time'])[:50]!r}"
+
+    kind = "whisper" if packet["cmd"] == "info" and packet.get("type") == "whisper" else packet["cmd"]
+    if kind not in packet_schema:
+        return None
+
+    return validate_fields(packet, *packet_schema[kind])
@@ -0,0 +1,172 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import time
+import threading
+
+from hcclient.client.records import Message, UpdatableMessage, UserDetails, intern
+
+
+class ChannelState:
+    """
+    Protocol state of a joined channel: online users, ignored users and pending
+    updatable messages, shared by the terminal clients and the Session API
+    Packets must have passed packets.validate_packet(), how they are
+    shown is left to the caller
+    Ignore lists are the {"trips": [...], "hashes": [...]} dicts from the config
+    """
+    updatable_lifetime = 3 * 60  # stricter than the official web client, which expires messages after 6 minutes
+
+    def __init__(self) -> None:
+        """
+        Sets up an empty channel
+        """
+        self.users = []
+        self.details = {}
+        self.ignored_users = []
+        self.updatables = {}
+        self.updatables_lock = threading.Lock()
+
+    @staticmethod
+    def level_to_utype(level: int) -> str:
+        """
+        Converts a user level to a user type
+        """
+        match level:
+            case 9999999:
+                return "Admin"
+
+            case 999999:
+                return "Mod"
+
+            case _:
+                return "User"
+
+    @staticmethod
+    def updatable_key(userid: int, custom_id: str) -> int:
+        """
+        Returns the key of an updatable message
+        """
+        return abs(hash(str(userid) + custom_id)) % 100000000
+
+    def set_users(self, packet: dict, ignored: dict) -> tuple[list, list]:
+        """
+        Replaces the user list from an onlineSet packet
+        Returns the nicks that joined and left since the last one, which differ after a rejoin
+        """
+        previous = set(self.users)
+        current = [intern(nick) for nick in packet["nicks"]]
+        remaining = set(current)
+        joined = [nick for nick in current if nick not in previous]
+        left = [nick for nick in self.users if nick not in remaining]
+        self.users[:] = current
+
+        for nick in left:
+            self.remove_user(nick)
+
+        for user in packet["users"]:
+            self.add_user(user, ignored)
+
+        return joined, left
+
+    def add_user(self, user: dict, ignored: dict) -> bool:
+        """
+        Stores or updates a user's details from an onlineSet/onlineAdd entry,
+        and ignores the user if their trip or hash is ignored
+        Returns True if the user wasn't online yet
+        """
+        nick = intern(user["nick"])
+        details = UserDetails(user["trip"], self.level_to_utype(user["level"]), user["hash"])
+        self.details[nick] = details
+
+        if (details.trip in ignored["trips"] or details.hash in ignored["hashes"]) and nick not in self.ignored_users:
+            self.ignored_users.append(nick)
+
+        if nick in self.users:
+            return False
+
+        self.users.append(nick)
+        return True
+
+    def remove_user(self, nick: str) -> bool:
+        """
+        Drops a user's details and ignore state
+        Returns True if the user was online
+        """
+        self.details.pop(nick, None)
+        if nick in self.ignored_users:
+            self.ignored_users.remove(nick)
+
+        if nick not in self.users:
+            return False
+
+        self.users.remove(nick)
+        return True
+
+    def ignore(self, nick: str, ignored: dict) -> None:
+        """
+        Ignores an online user and adds their trip and hash to the ignore lists,
+        raises KeyError if the user isn't online
+        """
+        details = self.details[nick]
+        if nick not in self.ignored_users:
+            self.ignored_users.append(nick)
+
+        if details.trip is not None and details.trip not in ignored["trips"]:
+            ignored["trips"].append(details.trip)
+
+        if details.hash not in ignored["hashes"]:
+            ignored["hashes"].append(details.hash)
+
+    def is_ignored(self, packet: dict) -> bool:
+        """
+        Checks if a chat, emote or whisper packet is from an ignored user
+        """
+        return packet.get("from", packet.get("nick")) in self.ignored_users
+
+    def track_updatable(self, packet: dict, record: Message) -> None:
+        """
+        Keeps a chat packet with a customId until it's completed or expires
+        """
+        with self.updatables_lock:
+            self.updatables[self.updatable_key(packet["userid"], packet["customId"])] = UpdatableMessage(packet["customId"], packet["userid"], time.time(), record)
+
+    def update_message(self, packet: dict) -> UpdatableMessage | None:
+        """
+        Applies an updateMessage packet to its message
+        Returns the message if the update completed it, it is no longer tracked then
+        """
+        key = self.updatable_key(packet["userid"], packet["customId"])
+        with self.updatables_lock:
+            message = self.updatables.get(key)
+            if message is None:
+                return None
+
+            match packet["mode"]:
+                case "overwrite":
+                    message.text = packet["text"]
+
+                case "append":
+                    message.text += packet["text"]
+
+                case "prepend":
+                    message.text = packet["text"] + message.text
+
+                case "complete":
+                    return self.updatables.pop(key)
+
+        return None
+
+    def expire_updatables(self) -> list:
+        """
+        Stops tracking updatable messages older than updatable_lifetime and returns them
+        """
+        expired = []
+        with self.updatables_lock:
+            for key, message in self.updatables.items():
+                if time.time() - message.sent <= self.updatable_lifetime:
+                    break
+
+                expired.append(key)
+
+            return [self.updatables.pop(key) for key in expired]
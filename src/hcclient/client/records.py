@@ -0,0 +1,94 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import sys
+
+
+def intern(value: str | None) -> str | None:
+    """
+    Interns a string, so the nicks, trips and hashes repeated across
+    thousands of records share a single object
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class UserDetails:
+    """
+    Details of an online user
+    Can still be read like the dict it replaces, with the "Trip", "Type" and "Hash" keys
+    """
+    __slots__ = ("trip", "utype", "hash")
+    key_map = {"Trip": "trip", "Type": "utype", "Hash": "hash"}
+
+    def __init__(self, trip: str | None, utype: str, user_hash: str | None) -> None:
+        """
+        Stores the details, empty trips are stored as None
+        """
+        self.trip = intern(trip or None)
+        self.utype = utype
+        self.hash = intern(user_hash)
+
+    def __getitem__(self, key: str) -> str | None:
+        """
+        Returns a detail by its display name
+        """
+        return getattr(self, self.key_map[key])
+
+    def items(self) -> list:
+        """
+        Returns the details as (display name, value) pairs
+        """
+        return [(key, getattr(self, attribute)) for key, attribute in self.key_map.items()]
+
+
+class Message:
+    """
+    Raw fields of a printed line, rendered only when displayed
+    kind is one of chat, whisper, emote, server, warn or text, text records
+    hold a line that was already rendered
+    """
+    __slots__ = ("kind", "time", "text", "nick", "trip", "level", "own", "highlighted", "status", "unique_id")
+
+    def __init__(self, kind: str, timestamp: float, text: str, nick: str | None = None, trip: str | None = None, level: int | None = None,
+                 own: bool = False, highlighted: bool = False, status: str | None = None, unique_id: str | None = None) -> None:
+        """
+        Stores the fields, interning the ones shared between records
+        """
+        self.kind = kind
+        self.time = timestamp
+        self.text = text
+        self.nick = intern(nick)
+        self.trip = intern(trip)
+        self.level = level
+        self.own = own
+        self.highlighted = highlighted
+        self.status = status
+        self.unique_id = unique_id
+
+
+class UpdatableMessage:
+    """
+    An updatable message that hasn't been completed or expired yet
+    """
+    __slots__ = ("custom_id", "userid", "text", "sent", "nick", "trip", "level", "own", "highlighted", "unique_id")
+
+    def __init__(self, custom_id: str, userid: int, sent: float, record: Message) -> None:
+        """
+        Takes the fields shared with the record printed when the message was received
+        """
+        self.custom_id = custom_id
+        self.userid = userid
+        self.text = record.text
+        self.sent = sent
+        self.nick = record.nick
+        self.trip = record.trip
+        self.level = record.level
+        self.own = record.own
+        self.highlighted = record.highlighted
+        self.unique_id = record.unique_id
+
+    def record(self, status: str, timestamp: float) -> Message:
+        """
+        Returns a record of the message in its current state
+        """
+        return Message("chat", timestamp, self.text, self.nick, self.trip, self.level, self.own, self.highlighted, status, self.unique_id)
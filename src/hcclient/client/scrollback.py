@@ -0,0 +1,380 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import bisect
+import datetime
+import collections
+
+import prompt_toolkit
+from prompt_toolkit.filters import Condition, has_focus
+from prompt_toolkit.layout.controls import UIControl, UIContent
+from prompt_toolkit.formatted_text import ANSI, to_formatted_text
+
+from hcclient.client.history import History
+from hcclient.client.records import Message
+
+
+class ScrollbackControl(UIControl):
+    """
+    Renders only the entries that fit on screen
+    """
+    def __init__(self, viewer: object) -> None:
+        """
+        Binds the control to its viewer
+        """
+        self.viewer = viewer
+
+    def create_content(self, width: int, height: int) -> UIContent:
+        """
+        Returns exactly one screen of rows
+        """
+        rows = self.viewer.visible_rows(width, height)
+        return UIContent(get_line=lambda index: rows[index] if index < len(rows) else [], line_count=height, show_cursor=False)
+
+    def is_focusable(self) -> bool:
+        """
+        Focusable, so key bindings apply
+        """
+        return True
+
+
+class ScrollbackViewer:
+    """
+    Full-screen view of a History that stays smooth with hundreds of
+    thousands of entries, only visible entries are parsed and wrapped
+    Supports searching, jumping to a time and filtering by nick, and keeps
+    following new entries while scrolled to the bottom
+    """
+    ansi_pattern = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+    cache_size = 2000
+
+    def __init__(self, history: History, title: str = "Scrollback", nick_filter: str | None = None, follow: bool = True) -> None:
+        """
+        Builds the layout, call run() to show it
+        Starts at the newest entry if following, otherwise at the oldest
+        """
+        self.history = history
+        self.title = title
+        self.top = history.first
+        self.page_size = 20
+        self.message = ""
+
+        self.nick_filter = None
+        self.view = None
+        self.view_end = history.first
+        self.set_filter(nick_filter)
+        self.follow = follow
+
+        self.search_pattern = None
+        self.mode = None
+        self.rows_cache = collections.OrderedDict()
+
+        self.input = prompt_toolkit.buffer.Buffer(multiline=False, accept_handler=self.accept_input)
+        input_window = prompt_toolkit.layout.Window(prompt_toolkit.layout.controls.BufferControl(self.input), height=1,
+                                                    get_line_prefix=lambda *_: self.mode_prompt())
+        self.main_window = prompt_toolkit.layout.Window(ScrollbackControl(self))
+
+        layout = prompt_toolkit.layout.Layout(prompt_toolkit.layout.HSplit([
+            self.main_window,
+            prompt_toolkit.layout.ConditionalContainer(input_window, filter=Condition(lambda: self.mode is not None)),
+            prompt_toolkit.layout.Window(prompt_toolkit.layout.controls.FormattedTextControl(self.status_text), height=1, style="reverse")
+        ]), focused_element=self.main_window)
+
+        self.app = prompt_toolkit.Application(layout=layout, key_bindings=self.create_bindings(), full_screen=True, mouse_support=False)
+
+    def run(self) -> None:
+        """
+        Shows the viewer until it's closed
+        """
+        self.app.run()
+
+    def refresh(self) -> None:
+        """
+        Redraws the viewer, safe to call from any thread
+        """
+        self.app.invalidate()
+
+    def set_filter(self, nick: str | None) -> None:
+        """
+        Shows only entries from a nick, or all entries if None
+        """
+        self.nick_filter = nick.lstrip("@") if nick else None
+        self.view = None if self.nick_filter is None else []
+        self.view_end = self.history.first
+        self.update_view()
+        self.follow = True
+
+    def update_view(self) -> None:
+        """
+        Adds new entries matching the nick filter to the filtered view
+        """
+        if self.view is None:
+            return
+
+        end = self.history.end
+        seq = max(self.view_end, self.history.first)
+        for entry in self.history.range(seq, end):
+            if entry.nick == self.nick_filter:
+                self.view.append(seq)
+
+            seq += 1
+
+        self.view_end = end
+
+    def bounds(self) -> tuple:
+        """
+        Returns the first and end positions of the current view
+        """
+        if self.view is None:
+            return self.history.first, self.history.end
+
+        return 0, len(self.view)
+
+    def entry_at(self, position: int) -> tuple:
+        """
+        Returns the sequence number and entry at a position in the current view
+        """
+        seq = position if self.view is None else self.view[position]
+        return seq, self.history.get(seq)
+
+    def position_of(self, seq: int) -> int:
+        """
+        Returns the position of the first entry in the view at or after a sequence number
+        """
+        return seq if self.view is None else bisect.bisect_left(self.view, seq)
+
+    def rows(self, seq: int, entry: Message | None, width: int) -> list:
+        """
+        Returns an entry rendered and split into screen rows, cached per width
+        """
+        key = (seq, width)
+        if key in self.rows_cache:
+            self.rows_cache.move_to_end(key)
+            return self.rows_cache[key]
+
+        rows = [[]]
+        column = 0
+        for style, text, *_ in to_formatted_text(ANSI((self.history.text(seq) or "") if entry else "")):
+            for char in text:
+                if char == "\n" or column >= width:
+                    rows.append([])
+                    column = 0
+                    if char == "\n":
+                        continue
+
+                if rows[-1] and rows[-1][-1][0] == style:
+                    rows[-1][-1] = (style, rows[-1][-1][1] + char)
+
+                else:
+                    rows[-1].append((style, char))
+
+                column += prompt_toolkit.utils.get_cwidth(char)
+
+        self.rows_cache[key] = rows
+        if len(self.rows_cache) > self.cache_size:
+            self.rows_cache.popitem(last=False)
+
+        return rows
+
+    def visible_rows(self, width: int, height: int) -> list:
+        """
+        Returns the rows on screen, starting at the top entry
+        or ending at the newest one when following
+        """
+        self.update_view()
+        self.page_size = max(height - 1, 1)
+        first, end = self.bounds()
+        rows = []
+
+        if self.follow:
+            position = end - 1
+            while position >= first and len(rows) < height:
+                rows[:0] = self.rows(*self.entry_at(position), width)
+                position -= 1
+
+            self.top = position + 1
+            return rows[-height:]
+
+        self.top = min(max(self.top, first), max(end - 1, first))
+        position = self.top
+        while position < end and len(rows) < height:
+            rows.extend(self.rows(*self.entry_at(position), width))
+            position += 1
+
+        if position >= end and len(rows) <= height:
+            self.follow = True
+
+        return rows[:height]
+
+    def scroll(self, entries: int) -> None:
+        """
+        Scrolls by a number of entries, scrolling past the end follows new entries
+        """
+        first, end = self.bounds()
+        if self.follow:
+            if entries >= 0:
+                return
+
+            self.follow = False
+
+        self.top = max(first, self.top + entries)
+        if self.top >= end:
+            self.follow = True
+
+    def search(self, backwards: bool) -> None:
+        """
+        Moves to the next entry containing the search pattern
+        """
+        if not self.search_pattern:
+            return
+
+        pattern = self.search_pattern.lower()
+        first, end = self.bounds()
+        position = self.top + (-1 if backwards else 1)
+
+        while first <= position < end:
+            _, entry = self.entry_at(position)
+            if entry is not None and pattern in self.searchable(entry):
+                self.top = position
+                self.follow = False
+                self.message = f"Match at {datetime.datetime.fromtimestamp(entry.time).strftime('%H:%M:%S')}"
+                return
+
+            position += -1 if backwards else 1
+
+        self.message = f"Pattern not found: {self.search_pattern}"
+
+    def searchable(self, entry: Message) -> str:
+        """
+        Returns the lowercase text of an entry to search in, without rendering it
+        """
+        if entry.kind == "text":
+            return self.ansi_pattern.sub("", entry.text).lower()
+
+        return f"{entry.nick or ''} {entry.text}".lower()
+
+    def jump_to_time(self, value: str) -> None:
+        """
+        Moves to the first entry at or after a time,
+        given as HH:MM, HH:MM:SS or YYYY-MM-DD HH:MM
+        """
+        now = datetime.datetime.now()
+        for time_format in ("%H:%M", "%H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+            try:
+                target = datetime.datetime.strptime(value.strip(), time_format)
+                break
+
+            except ValueError:
+                continue
+
+        else:
+            self.message = f"Invalid time: {value}"
+            return
+
+        if target.year == 1900:
+            target = target.replace(year=now.year, month=now.month, day=now.day)
+            if target > now:
+                target -= datetime.timedelta(days=1)
+
+        self.top = self.position_of(self.history.find_time(target.timestamp()))
+        self.follow = False
+        self.message = f"Jumped to {target.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    def accept_input(self, buffer: prompt_toolkit.buffer.Buffer) -> bool:
+        """
+        Applies the search pattern, time or nick typed into the input line
+        """
+        match self.mode:
+            case "search" | "search_backwards":
+                self.search_pattern = buffer.text or self.search_pattern
+                self.search(self.mode == "search_backwards")
+
+            case "time":
+                self.jump_to_time(buffer.text)
+
+            case "nick":
+                self.set_filter(buffer.text)
+                self.message = f"Showing messages from {self.nick_filter}" if self.nick_filter else "Showing all messages"
+
+        self.close_input()
+        return False
+
+    def open_input(self, mode: str) -> None:
+        """
+        Shows the input line for a mode
+        """
+        self.mode = mode
+        self.input.reset()
+        self.app.layout.focus(self.input)
+
+    def close_input(self) -> None:
+        """
+        Hides the input line
+        """
+        self.mode = None
+        self.app.layout.focus(self.main_window)
+
+    def mode_prompt(self) -> str:
+        """
+        Returns the input line's prompt
+        """
+        return {"search": "/", "search_backwards": "?", "time": "time: ", "nick": "nick (empty for all): "}.get(self.mode, "")
+
+    def status_text(self) -> str:
+        """
+        Returns the status bar
+        """
+        first, end = self.bounds()
+        position = f"{max(self.top - first + 1, 0)}/{end - first}"
+        state = "following" if self.follow else position
+        nick_filter = f" | nick: {self.nick_filter}" if self.nick_filter else ""
+        message = f" | {self.message}" if self.message else ""
+        return f" {self.title} | {state}{nick_filter}{message} | q quit, / ? n N search, t time, f nick, g G top/bottom"
+
+    def create_bindings(self) -> prompt_toolkit.key_binding.KeyBindings:
+        """
+        Returns the viewer's key bindings
+        """
+        bindings = prompt_toolkit.key_binding.KeyBindings()
+        viewing = ~has_focus(self.input)
+
+        def add(*keys: str, handler: object, condition: object = viewing) -> None:
+            for key in keys:
+                bindings.add(key, filter=condition)(lambda event, handler=handler: handler())
+
+        add("q", "escape", "c-c", handler=self.app_exit)
+        add("up", "k", handler=lambda: self.scroll(-1))
+        add("down", "j", handler=lambda: self.scroll(1))
+        add("pageup", "b", handler=lambda: self.scroll(-self.page_size))
+        add("pagedown", "space", handler=lambda: self.scroll(self.page_size))
+        add("home", "g", handler=self.scroll_top)
+        add("end", "G", handler=self.scroll_bottom)
+        add("/", handler=lambda: self.open_input("search"))
+        add("?", handler=lambda: self.open_input("search_backwards"))
+        add("n", handler=lambda: self.search(False))
+        add("N", handler=lambda: self.search(True))
+        add("t", handler=lambda: self.open_input("time"))
+        add("f", handler=lambda: self.open_input("nick"))
+        add("escape", "c-c", handler=self.close_input, condition=has_focus(self.input))
+
+        return bindings
+
+    def scroll_top(self) -> None:
+        """
+        Moves to the oldest entry
+        """
+        self.top = self.bounds()[0]
+        self.follow = False
+
+    def scroll_bottom(self) -> None:
+        """
+        Moves to the newest entry and follows new ones
+        """
+        self.follow = True
+
+    def app_exit(self) -> None:
+        """
+        Closes the viewer
+        """
+        self.app.exit()
@@ -0,0 +1,338 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import json
+import time
+import asyncio
+import contextlib
+import collections
+import urllib.parse
+
+from hcclient.utils import wsframes
+from hcclient.client.records import Message
+from hcclient.client.packets import validate_packet
+from hcclient.client.protocol import ChannelState
+from hcclient.client.transport import connection_cache, proxy_connect
+
+
+class Session:
+    """
+    Embeddable hack.chat session with an asyncio API and no terminal dependencies
+    Tracks the protocol state with the same ChannelState and packet validation as the
+    terminal clients, and exposes the server commands, a single event loop can run hundreds of them
+
+        async with Session("channel", "bot") as session:
+            await session.join()
+            async for packet in session:
+                if packet["cmd"] == "chat" and packet["text"] == "!ping":
+                    await session.send_chat("pong")
+    """
+    ping_interval = 60
+
+    def __init__(self, channel: str, nick: str, password: str = "", address: str = "wss://hack.chat/chat-ws",
+                 proxy: str | None = None, ssl_no_verify: bool = False, ignored: dict | None = None, queue_size: int = 1000,
+                 connect_timeout: float = 10, compression: bool = True) -> None:
+        """
+        Sets up the session, nothing is connected until connect() or join()
+        proxy uses the client's TYPE:HOST:PORT format
+        """
+        self.channel = channel
+        self.nick = nick
+        self.password = password
+        self.address = address
+        self.proxy = proxy
+        self.ssl_no_verify = ssl_no_verify
+        self.connect_timeout = connect_timeout
+        self.compression = compression
+
+        self.state = ChannelState()
+        self.ignored = ignored if ignored is not None else {"trips": [], "hashes": []}
+        self.dropped = collections.Counter()
+        self.deflate = wsframes.PerMessageDeflate()
+
+        self.packets = asyncio.Queue(maxsize=queue_size)
+        self.reader = None
+        self.writer = None
+        self.tasks = []
+        self.joined = None
+
+    @property
+    def users(self) -> dict:
+        """
+        Details of the online users, by nick
+        """
+        return self.state.details
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the websocket is open
+        """
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def __aenter__(self) -> object:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    def __aiter__(self) -> object:
+        return self
+
+    async def __anext__(self) -> dict:
+        """
+        Returns the next received packet, ignored users' messages are skipped
+        """
+        packet = await self.packets.get()
+        if packet is None:
+            raise StopAsyncIteration
+
+        return packet
+
+    async def open_connection(self, host: str, port: int, secure: bool) -> tuple:
+        """
+        Opens a TCP/TLS stream to the server, through the proxy if specified
+        """
+        context = connection_cache.context(self.ssl_no_verify) if secure else None
+        if self.proxy:
+            sock = await asyncio.to_thread(proxy_connect, self.proxy, host, port, self.connect_timeout)
+            sock.setblocking(False)
+            return await asyncio.open_connection(sock=sock, ssl=context, server_hostname=host if secure else None)
+
+        return await asyncio.open_connection(host, port, ssl=context)
+
+    async def connect(self) -> None:
+        """
+        Opens the websocket and starts receiving packets,
+        raises TimeoutError if it takes longer than connect_timeout
+        """
+        await asyncio.wait_for(self.handshake(), self.connect_timeout)
+        self.tasks = [asyncio.create_task(self.recv_loop()), asyncio.create_task(self.ping_loop())]
+
+    async def handshake(self) -> None:
+        """
+        Opens the stream and does the websocket handshake, offering compression if enabled
+        """
+        url = urllib.parse.urlsplit(self.address)
+        secure = url.scheme == "wss"
+        port = url.port or (443 if secure else 80)
+        key = wsframes.new_key()
+        headers = {"Origin": f"{'https' if secure else 'http'}://{url.hostname}"}
+        if self.compression:
+            headers["Sec-WebSocket-Extensions"] = wsframes.PerMessageDeflate.offer
+
+        self.reader, self.writer = await self.open_connection(url.hostname, port, secure)
+        self.writer.write(wsframes.handshake_request(url.hostname, port, (url.path or "/") + (f"?{url.query}" if url.query else ""), key, secure, headers))
+        response = wsframes.check_handshake(await self.reader.readuntil(b"\r\n\r\n"), key)
+        self.deflate = wsframes.PerMessageDeflate(response.get("sec-websocket-extensions", ""))
+
+    async def join(self, timeout: float = 30) -> None:
+        """
+        Joins the channel, connecting first if needed
+        Returns once the user list was received, raises ConnectionError
+        if the server sent a warning instead
+        """
+        if not self.connected:
+            await self.connect()
+
+        self.joined = asyncio.get_running_loop().create_future()
+        await self.send({"cmd": "join", "channel": self.channel, "nick": f"{self.nick}#{self.password}"})
+        await asyncio.wait_for(self.joined, timeout)
+
+    async def close(self) -> None:
+        """
+        Closes the websocket and ends packet iteration
+        """
+        for task in self.tasks:
+            task.cancel()
+
+        if self.connected:
+            with contextlib.suppress(Exception):
+                self.writer.write(wsframes.encode_frame(wsframes.OPCODE_CLOSE, b"\x03\xe8", mask=True))
+                self.writer.close()
+                await self.writer.wait_closed()
+
+        self.writer = None
+        self.finish()
+
+    def finish(self) -> None:
+        """
+        Wakes up iterators so they can stop
+        """
+        with contextlib.suppress(asyncio.QueueEmpty):
+            while self.packets.full():
+                self.packets.get_nowait()
+
+        self.packets.put_nowait(None)
+
+    async def send(self, packet: dict) -> None:
+        """
+        Sends a packet to the server
+        """
+        if not self.connected:
+            raise ConnectionError("Not connected to server")
+
+        payload = json.dumps(packet).encode()
+        if self.deflate.worth_compressing(payload):
+            self.writer.write(wsframes.encode_frame(wsframes.OPCODE_TEXT, self.deflate.compress(payload), mask=True, rsv1=True))
+
+        else:
+            self.writer.write(wsframes.encode_frame(wsframes.OPCODE_TEXT, payload, mask=True))
+
+        await self.writer.drain()
+
+    async def send_chat(self, text: str, custom_id: str | None = None) -> None:
+        """
+        Sends a chat message, updatable if a custom id is given
+        """
+        await self.send({"cmd": "chat", "text": text} if custom_id is None else {"cmd": "chat", "text": text, "customId": custom_id})
+
+    async def update_message(self, custom_id: str, text: str, mode: str = "overwrite") -> None:
+        """
+        Updates a message sent with a custom id
+        mode is 'overwrite', 'append', 'prepend' or 'complete'
+        """
+        await self.send({"cmd": "updateMessage", "customId": custom_id, "text": text, "mode": mode})
+
+    async def send_emote(self, text: str) -> None:
+        """
+        Sends an emote, like /me
+        """
+        await self.send({"cmd": "emote", "text": text})
+
+    async def whisper(self, nick: str, text: str) -> None:
+        """
+        Whispers to a user
+        """
+        await self.send({"cmd": "whisper", "nick": nick, "text": text})
+
+    async def change_nick(self, nick: str) -> None:
+        """
+        Changes the nickname
+        """
+        await self.send({"cmd": "changenick", "nick": nick})
+        self.nick = nick
+
+    async def command(self, cmd: str, **fields: object) -> None:
+        """
+        Sends any other server command, e.g. command("kick", nick="spammer")
+        """
+        await self.send({"cmd": cmd, **fields})
+
+    def ignore(self, nick: str) -> None:
+        """
+        Ignores a user's trip and hash, raises KeyError if the user isn't online
+        """
+        self.state.ignore(nick, self.ignored)
+
+    def handle_packet(self, packet: dict) -> bool:
+        """
+        Applies a validated packet to the protocol state
+        Returns False if the packet should be hidden, because it's from an ignored user
+        """
+        match packet["cmd"]:
+            case "onlineSet":
+                self.state.set_users(packet, self.ignored)
+                if self.joined is not None and not self.joined.done():
+                    self.joined.set_result(None)
+
+            case "onlineAdd":
+                self.state.add_user(packet, self.ignored)
+
+            case "onlineRemove":
+                self.state.remove_user(packet["nick"])
+
+            case "chat" | "emote" | "info" if self.state.is_ignored(packet):
+                return False
+
+            case "chat" if "customId" in packet:
+                self.state.track_updatable(packet, Message("chat", packet["time"] / 1000 if packet.get("time") else time.time(), packet["text"], packet["nick"], packet.get("trip"), packet["level"]))
+
+            case "updateMessage":
+                self.state.update_message(packet)
+
+            case "warn":
+                if self.joined is not None and not self.joined.done():
+                    self.joined.set_exception(ConnectionError(packet["text"]))
+
+        return True
+
+    def receive(self, payload: bytes) -> None:
+        """
+        Parses, validates and handles a received message,
+        malformed packets are counted in dropped by cmd instead of ending the session
+        """
+        try:
+            packet = json.loads(payload)
+
+        except ValueError:
+            self.dropped["unknown"] += 1
+            return
+
+        cmd = packet.get("cmd") if isinstance(packet, dict) and isinstance(packet.get("cmd"), str) else "unknown"
+        if validate_packet(packet) is not None:
+            self.dropped[cmd] += 1
+            return
+
+        try:
+            visible = self.handle_packet(packet)
+
+        except Exception:
+            self.dropped[cmd] += 1
+            return
+
+        if visible:
+            self.queue_packet(packet)
+
+    def queue_packet(self, packet: dict) -> None:
+        """
+        Queues a packet for iteration, dropping the oldest one if nobody keeps up
+        """
+        if self.packets.full():
+            self.packets.get_nowait()
+
+        self.packets.put_nowait(packet)
+
+    async def recv_loop(self) -> None:
+        """
+        Task that reads frames, answers pings and handles packets
+        """
+        decoder = wsframes.FrameDecoder()
+
+        try:
+            while True:
+                data = await self.reader.read(65536)
+                if not data:
+                    break
+
+                for opcode, payload, compressed in decoder.feed(data):
+                    match opcode:
+                        case wsframes.OPCODE_TEXT | wsframes.OPCODE_BINARY:
+                            self.receive(self.deflate.decompress(payload) if compressed else payload)
+
+                        case wsframes.OPCODE_PING:
+                            self.writer.write(wsframes.encode_frame(wsframes.OPCODE_PONG, payload, mask=True))
+
+                        case wsframes.OPCODE_CLOSE:
+                            return
+
+        except (OSError, ValueError, wsframes.ProtocolError):
+            pass
+
+        finally:
+            if self.joined is not None and not self.joined.done():
+                self.joined.set_exception(ConnectionError("Disconnected from server"))
+
+            if self.writer is not None:
+                self.writer.close()
+
+            self.finish()
+
+    async def ping_loop(self) -> None:
+        """
+        Task that sends a ping packet every 60 seconds as a keepalive
+        """
+        while self.connected:
+            await asyncio.sleep(self.ping_interval)
+            with contextlib.suppress(ConnectionError, OSError):
+                await self.send({"cmd": "ping"})
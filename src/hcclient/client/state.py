@@ -0,0 +1,181 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import os
+import re
+import json
+import mmap
+import hashlib
+import threading
+
+from hcclient.client.records import Message
+
+
+def state_path(address: str, channel: str) -> str:
+    """
+    Returns the path of the session state log for a channel on a server
+    """
+    safe_channel = re.sub(r"[^\w.-]", "_", channel)
+    name = f"{safe_channel}-{hashlib.sha1(f'{address} {channel}'.encode()).hexdigest()[:8]}.state"
+    if os.name == "nt":
+        return os.path.join(os.getenv("LOCALAPPDATA") or os.getenv("APPDATA"), "hcclient", "state", name)
+
+    return os.path.join(os.getenv("XDG_STATE_HOME") or os.path.join(os.getenv("HOME"), ".local", "state"), "hcclient", name)
+
+
+class SessionState:
+    """
+    Append-only log of a channel's session state: scrollback, prompt input history,
+    ignores and aliases, written as it changes so a restart can bring it back
+    Every change is a line holding the frame kind and the value as JSON, which stays
+    readable across Python versions, loading maps the log and decodes only the
+    frames that are kept, so large logs restore quickly
+    The log is rewritten with just the kept frames once it's mostly stale
+    Ignores and aliases are stored with the config file's mtime and only restored
+    while it's unchanged, so edits to the config file and /save take precedence
+    """
+    message_frame, input_frame, ignored_frame, aliases_frame = range(4)
+    max_inputs = 1000
+
+    def __init__(self, path: str) -> None:
+        """
+        Sets up the log, call load() before appending
+        """
+        self.path = path
+        self.fd = None
+        self.lock = threading.Lock()
+
+    def load(self, max_messages: int, config_mtime: float | None) -> tuple:
+        """
+        Reads the kept state and opens the log for appending
+        Returns the messages, input lines, ignores and aliases, the last two
+        are None if they weren't changed since the config file was last modified
+        """
+        frames = {kind: [] for kind in (self.message_frame, self.input_frame, self.ignored_frame, self.aliases_frame)}
+        state = ([], [], None, None)
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, "rb") as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    offset = total = 0
+                    while (end := data.find(b"\n", offset)) != -1:
+                        kind = data[offset:offset + 2]
+                        if kind[1:] != b" " or not kind[:1].isdigit():
+                            break  # a log written in another format is discarded from here
+
+                        frames.setdefault(kind[0] - 48, []).append((offset + 2, end))
+                        offset = end + 1
+                        total += 1
+
+                    kept = {
+                        self.message_frame: frames[self.message_frame][-max_messages:],
+                        self.input_frame: frames[self.input_frame][-self.max_inputs:],
+                        self.ignored_frame: frames[self.ignored_frame][-1:],
+                        self.aliases_frame: frames[self.aliases_frame][-1:]
+                    }
+                    state = self.decode(data, kept, config_mtime)
+
+                    kept_count = sum(len(spans) for spans in kept.values())
+                    compacted = self.compact(data, kept) if total > kept_count * 2 + 1000 else None
+                    size = len(data)
+
+                # the map is closed first, mapped files can't be replaced or truncated on Windows
+                if compacted is not None:
+                    with open(os.open(self.path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as compacted_file:
+                        compacted_file.write(compacted)
+
+                    os.replace(self.path + ".tmp", self.path)
+
+                elif offset < size:
+                    os.truncate(self.path, offset)  # drops a frame cut short by a crash, or an unreadable log
+
+            self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+        except (OSError, ValueError):
+            self.fd = None
+
+        return state
+
+    def decode(self, data: mmap.mmap, kept: dict, config_mtime: float | None) -> tuple:
+        """
+        Decodes the kept frames, skipping any that are corrupt
+        and settings stored against another version of the config file
+        """
+        def values(kind: int) -> list:
+            decoded = []
+            for start, end in kept[kind]:
+                try:
+                    decoded.append(json.loads(data[start:end]))
+
+                except ValueError:
+                    continue
+
+            return decoded
+
+        messages = []
+        for fields in values(self.message_frame):
+            try:
+                messages.append(Message(*fields))
+
+            except TypeError:
+                continue
+
+        def setting(kind: int) -> dict | None:
+            for value in values(kind):
+                if isinstance(value, list) and len(value) == 2 and value[0] == config_mtime:
+                    return value[1]
+
+            return None
+
+        return messages, values(self.input_frame), setting(self.ignored_frame), setting(self.aliases_frame)
+
+    def compact(self, data: mmap.mmap, kept: dict) -> bytes:
+        """
+        Returns the log with only the kept frames, in their original order
+        """
+        return b"".join(data[start - 2:end + 1] for start, end in sorted(span for spans in kept.values() for span in spans))
+
+    def append(self, kind: int, value: object) -> None:
+        """
+        Appends a frame, with a single write so concurrent appends don't interleave
+        """
+        if self.fd is None:
+            return
+
+        line = f"{kind} {json.dumps(value, separators=(',', ':'))}\n".encode()
+        with self.lock:
+            try:
+                os.write(self.fd, line)
+
+            except OSError:
+                self.fd = None
+
+    def add_message(self, record: Message) -> None:
+        """
+        Stores a history record
+        """
+        self.append(self.message_frame, tuple(getattr(record, field) for field in Message.__slots__))
+
+    def add_input(self, line: str) -> None:
+        """
+        Stores a line entered at the prompt
+        """
+        self.append(self.input_frame, line)
+
+    def set_settings(self, ignored: dict, aliases: dict, config_mtime: float | None) -> None:
+        """
+        Stores the current ignores and aliases, along with the mtime
+        of the config file they're changes to
+        """
+        self.append(self.ignored_frame, [config_mtime, ignored])
+        self.append(self.aliases_frame, [config_mtime, aliases])
+
+    def close(self) -> None:
+        """
+        Closes the log
+        """
+        with self.lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
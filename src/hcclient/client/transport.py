@@ -0,0 +1,671 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import ssl
+import time
+import queue
+import socket
+import struct
+import threading
+import contextlib
+import urllib.parse
+
+import websocket
+import python_socks.sync
+
+from hcclient.utils import wsframes
+
+
+def format_bytes(size: int) -> str:
+    """
+    Formats a byte count for humans
+    """
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+        size /= 1024
+
+    return f"{size:.1f} GiB"
+
+
+class ConnectionCache:
+    """
+    TLS contexts and sessions, and resolved addresses, shared between connections,
+    so reconnects can resume the TLS session instead of doing a full handshake
+    and skip the DNS lookup while the cached addresses are fresh
+    """
+    def __init__(self) -> None:
+        """
+        Starts empty
+        """
+        self.contexts = {}
+        self.sessions = {}
+        self.addresses = {}
+        self.lock = threading.Lock()
+
+    def context(self, ssl_no_verify: bool) -> ssl.SSLContext:
+        """
+        Returns the TLS context for a verification mode, sessions can only be resumed with the context that created them
+        """
+        with self.lock:
+            if ssl_no_verify not in self.contexts:
+                context = ssl.create_default_context()
+                if ssl_no_verify:
+                    context.check_hostname = False
+                    context.verify_mode = ssl.CERT_NONE
+
+                self.contexts[ssl_no_verify] = context
+
+            return self.contexts[ssl_no_verify]
+
+    def session(self, key: tuple) -> ssl.SSLSession | None:
+        """
+        Returns the last TLS session for a host, port and verification mode
+        """
+        with self.lock:
+            return self.sessions.get(key)
+
+    def save_session(self, key: tuple, session: ssl.SSLSession | None) -> None:
+        """
+        Stores a TLS session for resumption, TLS 1.3 tickets arrive after the handshake
+        so this is called when the connection closes
+        """
+        if session is not None:
+            with self.lock:
+                self.sessions[key] = session
+
+    def resolve(self, host: str, port: int, ttl: float) -> tuple[list, bool]:
+        """
+        Returns the addresses for a host and whether they came from the cache,
+        results are cached for ttl seconds, 0 disables caching
+        """
+        with self.lock:
+            cached = self.addresses.get((host, port))
+            if ttl and cached is not None and time.monotonic() - cached[0] < ttl:
+                return cached[1], True
+
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        if ttl:
+            with self.lock:
+                self.addresses[(host, port)] = (time.monotonic(), addresses)
+
+        return addresses, False
+
+    def forget(self, host: str, port: int) -> None:
+        """
+        Drops a host's cached addresses, called when none of them could be connected to
+        """
+        with self.lock:
+            self.addresses.pop((host, port), None)
+
+
+connection_cache = ConnectionCache()
+
+
+def proxy_connect(proxy: str, host: str, port: int, timeout: float | None = None) -> socket.socket:
+    """
+    Opens a TCP socket through a proxy in the TYPE:HOST:PORT format,
+    socks4a and socks5h resolve the host on the proxy
+    """
+    proxy_type, proxy_host, proxy_port = proxy.split(":")
+    rdns = proxy_type.lower() in ("socks4a", "socks5h")
+    proxy_type = {"socks4a": "socks4", "socks5h": "socks5"}.get(proxy_type.lower(), proxy_type.lower())
+    return python_socks.sync.Proxy.from_url(f"{proxy_type}://{proxy_host}:{proxy_port}", rdns=rdns).connect(host, port, timeout=timeout or 30)
+
+
+class Transport:
+    """
+    Connection layer used by the client, sends and receives text messages
+    Counts payload bytes and bytes on the wire for the current connection,
+    which differ when compression is negotiated, and measures the round
+    trip time with websocket pings
+    """
+    name = "none"
+    max_pings = 16  # unanswered pings kept for matching pongs
+
+    def __init__(self, ssl_no_verify: bool = False, proxy: str | bool = False, dns_ttl: float = 0) -> None:
+        """
+        Stores the connection options, nothing is connected until connect()
+        """
+        self.ssl_no_verify = ssl_no_verify
+        self.proxy = proxy
+        self.dns_ttl = dns_ttl
+        self.address = None
+        self.connect_time = None
+        self.dns_cached = False
+        self.tls_key = None
+        self.tls_time = None
+        self.tls_version = None
+        self.tls_resumed = False
+        self.compression = None
+        self.stats = {"sent": 0, "sent_wire": 0, "received": 0, "received_wire": 0}
+
+        self.last_received = time.monotonic()
+        self.recv_started = 0
+        self.receiving = False  # whether recv() is blocked waiting for data
+        self.pings = {}
+        self.ping_count = 0
+        self.pongs = 0
+        self.rtt = None
+        self.rtt_avg = None
+        self.rtt_min = None
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the connection is open
+        """
+        raise NotImplementedError
+
+    def connect(self, address: str, timeout: float | None = None) -> None:
+        """
+        Opens a connection to a websocket address, timeout applies
+        to each step of connecting, the handshake included
+        """
+        raise NotImplementedError
+
+    def open_socket(self, host: str, port: int, secure: bool, timeout: float | None = None) -> socket.socket:
+        """
+        Opens a TCP socket, through the proxy if specified, and wraps it in TLS for wss
+        Without a proxy, resolved addresses are cached for dns_ttl seconds,
+        and TLS sessions are resumed when possible
+        The timeout stays set, so it applies to the TLS and websocket handshakes too
+        """
+        if self.proxy:
+            sock = proxy_connect(self.proxy, host, port, timeout)
+
+        else:
+            addresses, self.dns_cached = connection_cache.resolve(host, port, self.dns_ttl)
+            try:
+                sock = self.connect_any(addresses, timeout)
+
+            except OSError:
+                connection_cache.forget(host, port)
+                raise
+
+        sock.settimeout(timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        if secure:
+            started = time.perf_counter()
+            self.tls_key = (host, port, self.ssl_no_verify)
+            sock = connection_cache.context(self.ssl_no_verify).wrap_socket(sock, server_hostname=host, session=connection_cache.session(self.tls_key))
+            self.tls_time = time.perf_counter() - started
+            self.tls_version = sock.version()
+            self.tls_resumed = sock.session_reused
+
+        return sock
+
+    def connect_any(self, addresses: list, timeout: float | None) -> socket.socket:
+        """
+        Connects to the first reachable address, raises the last error if none are
+        """
+        error = None
+        for family, socket_type, proto, _, sockaddr in addresses:
+            sock = socket.socket(family, socket_type, proto)
+            try:
+                sock.settimeout(timeout or 30)
+                sock.connect(sockaddr)
+                return sock
+
+            except OSError as e:
+                error = e
+                sock.close()
+
+        raise error or ConnectionError("No addresses to connect to")
+
+    def save_session(self, sock: socket.socket | None) -> None:
+        """
+        Keeps the connection's TLS session so the next connection can resume it
+        """
+        if self.tls_key is not None and isinstance(sock, ssl.SSLSocket):
+            with contextlib.suppress(Exception):
+                connection_cache.save_session(self.tls_key, sock.session)
+
+    def connect_summary(self) -> str:
+        """
+        Returns how long connecting took, and whether DNS and TLS were cached
+        """
+        summary = f"in {self.connect_time * 1000:.0f}ms" if self.connect_time is not None else ""
+        if self.proxy:
+            summary += f" through proxy {self.proxy}"
+
+        elif self.dns_cached:
+            summary += ", cached DNS"
+
+        if self.tls_time is not None:
+            summary += f", {self.tls_version} handshake {self.tls_time * 1000:.0f}ms ({'session resumed' if self.tls_resumed else 'full handshake'})"
+
+        return summary
+
+    def send(self, text: str) -> None:
+        """
+        Sends a text message
+        """
+        raise NotImplementedError
+
+    def recv(self) -> str:
+        """
+        Blocks until a text message is received and returns it,
+        raises ConnectionError if the connection is lost
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Closes the connection, unblocking recv()
+        """
+        raise NotImplementedError
+
+    def send_ping(self, payload: bytes) -> None:
+        """
+        Sends a websocket ping frame
+        """
+        raise NotImplementedError
+
+    def ping(self) -> None:
+        """
+        Sends a websocket ping, its pong is timed by pong_received()
+        """
+        self.ping_count += 1
+        payload = struct.pack("!I", self.ping_count)
+        self.pings[payload] = time.perf_counter()
+
+        if len(self.pings) > self.max_pings:
+            with contextlib.suppress(StopIteration, RuntimeError, KeyError):
+                self.pings.pop(next(iter(self.pings)))
+
+        self.send_ping(payload)
+
+    def pong_received(self, payload: bytes) -> None:
+        """
+        Updates the round trip time from a received pong
+        """
+        self.last_received = time.monotonic()
+
+        sent = self.pings.pop(payload, None)
+        if sent is None:
+            return
+
+        self.rtt = time.perf_counter() - sent
+        self.rtt_min = self.rtt if self.rtt_min is None else min(self.rtt_min, self.rtt)
+        self.rtt_avg = self.rtt if self.rtt_avg is None else self.rtt_avg * 0.8 + self.rtt * 0.2
+        self.pongs += 1
+
+    def silence(self) -> float:
+        """
+        Returns the seconds recv() has been waiting without receiving anything,
+        0 while it isn't waiting, so time spent handling messages between recv() calls doesn't count
+        """
+        if not self.receiving:
+            return 0
+
+        return time.monotonic() - max(self.last_received, self.recv_started)
+
+    def report(self) -> str:
+        """
+        Returns the transport, compression, byte counters and round trip time
+        """
+        stats = self.stats
+        lines = [f"Transport: {self.name}, compression: {self.compression or 'none'}"]
+        if self.connect_time is not None:
+            lines.append(f"Connected {self.connect_summary()}")
+
+        for direction, payload, wire in (("Sent", stats["sent"], stats["sent_wire"]), ("Received", stats["received"], stats["received_wire"])):
+            ratio = f" ({wire / payload:.0%} of payload)" if payload else ""
+            lines.append(f"{direction}: {format_bytes(wire)} on the wire, {format_bytes(payload)} payload{ratio}")
+
+        if self.rtt is not None:
+            lines.append(f"Round trip: {self.rtt * 1000:.1f}ms, avg {self.rtt_avg * 1000:.1f}ms, min {self.rtt_min * 1000:.1f}ms ({self.pongs}/{self.ping_count} pongs)")
+
+        else:
+            lines.append(f"Round trip: no pongs yet ({self.ping_count} pings sent)")
+
+        lines.append(f"Last received: {time.monotonic() - self.last_received:.1f}s ago")
+        return "\n".join(lines)
+
+
+class WebSocketClientTransport(Transport):
+    """
+    Transport backed by websocket-client, without compression
+    """
+    name = "websocket-client"
+
+    def __init__(self, ssl_no_verify: bool = False, proxy: str | bool = False, dns_ttl: float = 0) -> None:
+        """
+        Creates the websocket-client socket
+        """
+        super().__init__(ssl_no_verify, proxy, dns_ttl)
+        self.ws = websocket.WebSocket()
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the connection is open
+        """
+        return self.ws.connected
+
+    def connect(self, address: str, timeout: float | None = None) -> None:
+        """
+        Opens a connection to a websocket address
+        The socket is opened by open_socket(), so TLS sessions are resumed,
+        websocket-client only does the websocket handshake
+        """
+        self.address = address
+        url = urllib.parse.urlsplit(address)
+        secure = url.scheme == "wss"
+        port = url.port or (443 if secure else 80)
+
+        self.ws.connect(address, socket=self.open_socket(url.hostname, port, secure, timeout), timeout=timeout)
+        self.ws.settimeout(None)
+        self.last_received = time.monotonic()
+
+    def send(self, text: str) -> None:
+        """
+        Sends a text message
+        """
+        self.stats["sent"] += len(text.encode())
+        self.stats["sent_wire"] += self.ws.send(text)
+
+    def send_ping(self, payload: bytes) -> None:
+        """
+        Sends a websocket ping frame
+        """
+        self.stats["sent_wire"] += self.ws.ping(payload)
+
+    def recv(self) -> str:
+        """
+        Blocks until a text message is received and returns it
+        Control frames are requested too, so pongs can be timed
+        """
+        self.recv_started = time.monotonic()
+        self.receiving = True
+        try:
+            while True:
+                opcode, data = self.ws.recv_data(control_frame=True)
+                self.last_received = time.monotonic()
+
+                match opcode:
+                    case websocket.ABNF.OPCODE_PONG:
+                        self.pong_received(data)
+
+                    case websocket.ABNF.OPCODE_CLOSE:
+                        raise ConnectionError("Connection closed by server")
+
+                    case websocket.ABNF.OPCODE_TEXT | websocket.ABNF.OPCODE_BINARY:
+                        size = len(data)
+                        self.stats["received"] += size
+                        self.stats["received_wire"] += size + (2 if size < 126 else 4 if size < 65536 else 10)
+                        return data.decode() if isinstance(data, bytes) else data
+
+        finally:
+            self.receiving = False
+
+    def close(self) -> None:
+        """
+        Closes the connection
+        Doesn't wait for the server's close frame like WebSocket.close() does,
+        that would block forever on a stale connection while recv() holds the frame buffer
+        """
+        self.save_session(self.ws.sock)
+        with contextlib.suppress(Exception):
+            self.ws.send_close()
+
+        with contextlib.suppress(Exception):
+            self.ws.sock.shutdown(socket.SHUT_RDWR)
+
+        self.ws.shutdown()
+
+
+class DeflateTransport(Transport):
+    """
+    Websocket transport over a plain socket that negotiates
+    permessage-deflate (RFC 7692), falling back to uncompressed
+    messages if the server doesn't accept it
+    """
+    name = "hcclient"
+    recv_size = 65536
+
+    def __init__(self, ssl_no_verify: bool = False, proxy: str | bool = False, dns_ttl: float = 0) -> None:
+        """
+        Sets up the socket state
+        """
+        super().__init__(ssl_no_verify, proxy, dns_ttl)
+        self.sock = None
+        self.open = False
+        self.decoder = wsframes.FrameDecoder()
+        self.pending = []
+        self.send_lock = threading.Lock()
+        self.deflate = wsframes.PerMessageDeflate()
+
+    @property
+    def connected(self) -> bool:
+        """
+        Whether the connection is open
+        """
+        return self.open
+
+    def connect(self, address: str, timeout: float | None = None) -> None:
+        """
+        Opens a connection to a websocket address
+        """
+        self.address = address
+        url = urllib.parse.urlsplit(address)
+        secure = url.scheme == "wss"
+        port = url.port or (443 if secure else 80)
+        key = wsframes.new_key()
+
+        self.sock = self.open_socket(url.hostname, port, secure, timeout)
+        self.sock.sendall(wsframes.handshake_request(url.hostname, port, (url.path or "/") + (f"?{url.query}" if url.query else ""), key, secure,
+                                                     {"Origin": f"{'https' if secure else 'http'}://{url.hostname}",
+                                                      "Sec-WebSocket-Extensions": wsframes.PerMessageDeflate.offer}))
+
+        response = b""
+        while b"\r\n\r\n" not in response:
+            data = self.sock.recv(self.recv_size)
+            if not data:
+                raise ConnectionError("Connection closed during handshake")
+
+            response += data
+            if len(response) > 65536:
+                raise wsframes.ProtocolError("Handshake response too big")
+
+        head, _, rest = response.partition(b"\r\n\r\n")
+        headers = wsframes.check_handshake(head + b"\r\n\r\n", key)
+        self.deflate = wsframes.PerMessageDeflate(headers.get("sec-websocket-extensions", ""), self.decoder.max_size)
+        self.compression = self.deflate.extension
+
+        self.decoder = wsframes.FrameDecoder()
+        self.pending = self.decoder.feed(rest)
+        self.stats["received_wire"] += len(rest)
+        self.sock.settimeout(None)
+        self.last_received = time.monotonic()
+        self.open = True
+
+    def send_frame(self, opcode: int, payload: bytes, rsv1: bool = False) -> None:
+        """
+        Sends a single masked frame
+        """
+        frame = wsframes.encode_frame(opcode, payload, mask=True, rsv1=rsv1)
+        with self.send_lock:
+            self.sock.sendall(frame)
+            self.stats["sent_wire"] += len(frame)
+
+    def send_ping(self, payload: bytes) -> None:
+        """
+        Sends a websocket ping frame
+        """
+        self.send_frame(wsframes.OPCODE_PING, payload)
+
+    def send(self, text: str) -> None:
+        """
+        Sends a text message
+        """
+        if not self.open:
+            raise ConnectionError("Connection is already closed")
+
+        payload = text.encode()
+        self.stats["sent"] += len(payload)
+
+        if not self.deflate.worth_compressing(payload):
+            self.send_frame(wsframes.OPCODE_TEXT, payload)
+            return
+
+        with self.send_lock:
+            frame = wsframes.encode_frame(wsframes.OPCODE_TEXT, self.deflate.compress(payload), mask=True, rsv1=True)
+            self.sock.sendall(frame)
+            self.stats["sent_wire"] += len(frame)
+
+    def recv(self) -> str:
+        """
+        Blocks until a text message is received and returns it
+        """
+        self.recv_started = time.monotonic()
+        self.receiving = True
+        try:
+            while True:
+                while self.pending:
+                    opcode, payload, compressed = self.pending.pop(0)
+                    text = self.handle_message(opcode, payload, compressed)
+                    if text is not None:
+                        return text
+
+                if not self.open:
+                    raise ConnectionError("Connection to remote host was lost.")
+
+                try:
+                    data = self.sock.recv(self.recv_size)
+
+                except OSError as e:
+                    self.open = False
+                    raise ConnectionError("Connection to remote host was lost.") from e
+
+                if not data:
+                    self.open = False
+                    raise ConnectionError("Connection to remote host was lost.")
+
+                self.stats["received_wire"] += len(data)
+                self.last_received = time.monotonic()
+                self.pending = self.decoder.feed(data)
+
+        finally:
+            self.receiving = False
+
+    def handle_message(self, opcode: int, payload: bytes, compressed: bool) -> str | None:
+        """
+        Handles a received message, returns its text if it's a text message
+        """
+        match opcode:
+            case wsframes.OPCODE_TEXT | wsframes.OPCODE_BINARY:
+                if compressed:
+                    payload = self.deflate.decompress(payload)
+
+                self.stats["received"] += len(payload)
+                return payload.decode()
+
+            case wsframes.OPCODE_PING:
+                self.send_frame(wsframes.OPCODE_PONG, payload)
+
+            case wsframes.OPCODE_PONG:
+                self.pong_received(payload)
+
+            case wsframes.OPCODE_CLOSE:
+                if self.open:
+                    self.open = False
+                    with self.send_lock:
+                        self.sock.sendall(wsframes.encode_frame(wsframes.OPCODE_CLOSE, payload[:2], mask=True))
+
+                raise ConnectionError("Connection closed by server")
+
+        return None
+
+    def close(self) -> None:
+        """
+        Closes the connection
+        """
+        if self.sock is None:
+            return
+
+        self.save_session(self.sock)
+        if self.open:
+            self.open = False
+            try:
+                with self.send_lock:
+                    self.sock.sendall(wsframes.encode_frame(wsframes.OPCODE_CLOSE, b"\x03\xe8", mask=True))
+
+                self.sock.shutdown(socket.SHUT_RDWR)
+
+            except OSError:
+                pass
+
+        self.sock.close()
+
+
+def create_transport(args: dict) -> Transport:
+    """
+    Creates the transport for a connection from the client's config
+    """
+    if args["no_compression"]:
+        return WebSocketClientTransport(args["ssl_no_verify"], args["proxy"], args["dns_cache_ttl"])
+
+    return DeflateTransport(args["ssl_no_verify"], args["proxy"], args["dns_cache_ttl"])
+
+
+def split_list(value: str | bool) -> list:
+    """
+    Splits a comma separated option into its items
+    """
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+def connect_first(args: dict, timeout: float, stagger: float = 0.25) -> Transport:
+    """
+    Races connections to every combination of the configured websocket addresses and proxies,
+    which are comma separated lists, and returns the first transport that completes its handshake
+    Attempts start one after another like happy eyeballs (RFC 8305), the next one starts when
+    the previous fails or after the stagger delay, so a dead endpoint doesn't hold up the rest
+    Raises ConnectionError with every attempt's error if none succeed
+    """
+    candidates = [(address, proxy) for address in split_list(args["websocket_address"]) for proxy in split_list(args["proxy"]) or [False]]
+    results = queue.Queue()
+    start = time.perf_counter()
+
+    def attempt(address: str, proxy: str | bool) -> None:
+        transport = create_transport({**args, "proxy": proxy})
+        try:
+            transport.connect(address, timeout)
+            transport.connect_time = time.perf_counter() - start
+            results.put((transport, None))
+
+        except Exception as e:
+            transport.close()
+            results.put((None, f"{address}{f' through {proxy}' if proxy else ''}: {e or type(e).__name__}"))
+
+    def close_losers(remaining: int) -> None:
+        for _ in range(remaining):
+            transport, _ = results.get()
+            if transport is not None:
+                transport.close()
+
+    started = finished = 0
+    errors = []
+    while finished < len(candidates):
+        if started < len(candidates):
+            threading.Thread(target=attempt, args=candidates[started], daemon=True).start()
+            started += 1
+
+        try:
+            transport, error = results.get(timeout=stagger if started < len(candidates) else None)
+
+        except queue.Empty:
+            continue
+
+        finished += 1
+        if transport is not None:
+            threading.Thread(target=close_losers, args=(started - finished,), daemon=True).start()
+            return transport
+
+        errors.append(error)
+
+    raise ConnectionError(("All connection attempts failed: " + "; ".join(errors)) if errors else "No websocket address configured")
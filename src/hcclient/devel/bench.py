@@ -0,0 +1,95 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import sys
+import time
+import socket
+import argparse
+import subprocess
+
+from hcclient.devel.server import ProtocolServer
+from hcclient.devel.scenarios import scenarios
+
+
+def free_port() -> int:
+    """
+    Returns a port nothing is listening on
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(scenario: str, count: int, rate: float, size: int, repeat: int, client_args: list, tls: tuple = ()) -> list:
+    """
+    Runs the server and a headless client as subprocesses and times each run
+    of a scenario, from the client joining to the client printing the done marker
+    Dropped clients are told to /reconnect, so 'disconnect' measures reconnect time
+    tls is a certificate and key to serve wss:// with, the client doesn't verify it
+    """
+    port = free_port()
+    tls_args = ["--tls-cert", tls[0], "--tls-key", tls[1]] if tls else []
+    server = subprocess.Popen([sys.executable, "-m", "hcclient.devel.server", "--port", str(port), "--scenario", scenario,
+                               "--count", str(count), "--rate", str(rate), "--size", str(size), "--repeat", str(repeat), *tls_args],
+                              stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+
+    client = subprocess.Popen([sys.executable, "-c", "from hcclient.cli.cli import main; main()", "--headless", "--no-config", "--no-hooks",
+                               "-c", "bench", "-n", "bencher", "-w", f"{'wss' if tls else 'ws'}://127.0.0.1:{port}", *(["--ssl-no-verify"] if tls else []),
+                               *client_args],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+    timings = []
+    start = None
+    lines = 0
+
+    try:
+        for line in client.stdout:
+            lines += 1
+            if start is None and ("Connected to channel" in line or "Disconnected from server" in line):
+                start = time.perf_counter()
+
+            if "Disconnected from server" in line:
+                client.stdin.write("/reconnect\n")
+                client.stdin.flush()
+
+            if ProtocolServer.done_marker in line:
+                timings.append((time.perf_counter() - start, lines))
+                start = time.perf_counter()
+                lines = 0
+                if len(timings) == repeat:
+                    break
+
+    finally:
+        client.kill()
+        server.kill()
+
+    return timings
+
+
+def main() -> None:
+    """
+    Entry point for python -m hcclient.devel.bench
+    """
+    parser = argparse.ArgumentParser(description="End-to-end client benchmarks against the local server",
+                                     epilog="Arguments after -- are passed to the client, e.g. -- --no-markdown")
+    parser.add_argument("scenario", choices=scenarios.keys(), help="scenario to run")
+    parser.add_argument("--count", type=int, default=1000, help="number of messages, users or updates the scenario produces")
+    parser.add_argument("--rate", type=float, default=0, help="packets per second the scenario sends, 0 for as fast as possible")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="size of pastes in bytes, defaults to 65536")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, defaults to 3")
+    parser.add_argument("--tls", nargs=2, metavar=("CERT", "KEY"), default=(), help="serve wss:// with a certificate and key")
+    args, client_args = parser.parse_known_args()
+    client_args = [arg for arg in client_args if arg != "--"]
+
+    timings = run(args.scenario, args.count, args.rate, args.size, args.repeat, client_args, tuple(args.tls))
+    for number, (elapsed, lines) in enumerate(timings, 1):
+        print(f"run {number}: {elapsed:.3f}s, {lines} lines, {lines / elapsed:.0f} lines/s")
+
+    if timings:
+        best = min(elapsed for elapsed, _ in timings)
+        print(f"best: {best:.3f}s, {args.count / best:.0f} {args.scenario} units/s")
+
+
+if __name__ == "__main__":
+    main()
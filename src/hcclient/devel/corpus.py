@@ -0,0 +1,55 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import json
+import hashlib
+
+
+# bump when any message changes, so results measured on different corpora aren't compared
+corpus_version = 1
+
+python_code = '''def handler(items, transform=None):
+    """Applies transform to every item that isn't None"""
+    results = []
+    for index, item in enumerate(items):
+        if item is None:
+            continue
+
+        results.append(transform(item, index) if transform else item)  # comment
+
+    return {"count": len(results), "results": results}
+'''
+
+shell_code = '''#!/bin/sh
+set -e
+for file in *.log; do
+    grep -c "error" "$file" | awk '{ total += $1 } END { print total }'
+done
+'''
+
+corpus = {
+    "plain": "hey, did anyone get the build working on arm64? mine keeps failing at the linking step",
+    "short": "lol",
+    "emphasis": "this is *really* **important**, please ~~ignore~~ read *all* of it: **do not** push to _main_ without a **review**",
+    "inline_code": "use `git rebase -i HEAD~3` then `git push --force-with-lease`, not `git push -f`, and check `git log --oneline`",
+    "fence_labeled": f"here's the fix:\n```python\n{python_code}```\nworks for me",
+    "fence_unlabeled": f"try this:\n```\n{shell_code}```",
+    "fence_many": "\n".join(f"step {i}:\n```python\nresult_{i} = handler(items[{i}:])\n```" for i in range(8)),
+    "links": "docs are at https://hack.chat/docs and https://github.com/AnnikaV9/hcclient, the [wiki](https://example.com/wiki) "
+             "has more, also see wss://hack.chat/chat-ws and ![diagram](https://example.com/diagram.png)",
+    "link_heavy": " ".join(f"https://example.com/page/{i}?ref=chat" for i in range(40)),
+    "latex_inline": "the area is $\\pi r^2$ and the volume is $\\frac{4}{3} \\pi r^3$, so the ratio is $\\frac{3}{r}$",
+    "latex_block": "solve this:\n$$\\int_0^1 x^2 \\, dx$$\nand then\n$$\\sum_{n=1}^{10} n^2$$",
+    "mixed": "**update:** the `deploy` script now reads https://example.com/config, see:\n```yaml\nenv: production\nreplicas: 3\n```\n"
+             "*thanks* to everyone, ratio is $\\frac{1}{2}$",
+    "long_paste_text": "\n\n".join(f"paragraph {i}: lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore "
+                                   f"et dolore magna aliqua, ut enim ad minim veniam, quis nostrud exercitation ullamco laboris" for i in range(150)),
+    "long_paste_code": "```python\n" + python_code * 150 + "```"
+}
+
+
+def corpus_digest() -> str:
+    """
+    Returns a hash of the corpus contents, to detect edits made without bumping the version
+    """
+    return hashlib.sha256(json.dumps(corpus, sort_keys=True).encode()).hexdigest()[:16]
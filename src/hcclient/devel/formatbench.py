@@ -0,0 +1,203 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+
+from hcclient.render.formatter import TextFormatter
+from hcclient.render.latex import LatexWorker
+from hcclient.utils.config import default_config
+from hcclient.devel.corpus import corpus, corpus_version, corpus_digest
+
+
+# bump when what a case measures changes, so results measured differently aren't compared
+bench_version = 2
+
+
+def flag_combos(latex: bool) -> list:
+    """
+    Returns the (name, latex, linkify) combinations to measure,
+    LaTeX is only measured when its optional dependencies are installed
+    """
+    combos = [("linkify", False, True), ("plain", False, False)]
+    if latex:
+        combos += [("latex+linkify", True, True), ("latex", True, False)]
+
+    return combos
+
+
+def wait_for_latex(worker: LatexWorker) -> None:
+    """
+    Starts the LaTeX worker and waits until it has imported sympy,
+    equations are left unsimplified until then and would time nothing
+    """
+    worker.start()
+    deadline = time.monotonic() + worker.startup_timeout
+    while not worker.ready:
+        if time.monotonic() > deadline or worker.proc.poll() is not None:
+            sys.exit(f"{sys.argv[0]}: error: the LaTeX worker didn't start within {worker.startup_timeout}s")
+
+        time.sleep(0.05)
+
+
+def calibrate(call: object, round_time: float) -> int:
+    """
+    Returns the number of calls that take about round_time seconds,
+    the first call also warms up pygments lexers and the LaTeX worker
+    """
+    start = time.perf_counter()
+    call()
+    return max(1, int(round_time / max(time.perf_counter() - start, 1e-7)))
+
+
+def run(cases: list, combos: list, repeat: int, round_time: float) -> dict:
+    """
+    Times every case under every flag combination
+    Rounds of all cases are interleaved and gc is disabled while timing, so a burst
+    of load on the machine spreads over many cases instead of skewing a single one
+    The language guess and LaTeX caches are cleared before every call, so each call
+    costs what a new message does instead of timing cache hits
+    Returns {combo: {case: {"best": seconds, "median": seconds}}}
+    """
+    formatter = TextFormatter()
+    if any(latex for _, latex, _ in combos):
+        wait_for_latex(formatter.latex_worker)
+
+    calls = []
+    for combo, latex, linkify in combos:
+        for case in cases:
+            def call(text: str = corpus[case], latex: bool = latex, linkify: bool = linkify) -> None:
+                formatter.guesser.cache.clear()
+                formatter.latex_worker.cache.clear()
+                formatter.markdown(text, default_config["highlight_theme"], default_config["client_color"],
+                                   default_config["message_color"], latex, linkify, default_config["backticks_bg"])
+
+            calls.append((combo, case, call, calibrate(call, round_time)))
+
+    rounds = {(combo, case): [] for combo, case, _, _ in calls}
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            for combo, case, call, number in calls:
+                start = time.perf_counter()
+                for _ in range(number):
+                    call()
+
+                rounds[combo, case].append((time.perf_counter() - start) / number)
+
+    finally:
+        gc.enable()
+
+    results = {}
+    for (combo, case), timings in rounds.items():
+        results.setdefault(combo, {})[case] = {"best": min(timings), "median": statistics.median(timings)}
+
+    return results
+
+
+def report(results: dict) -> None:
+    """
+    Prints per-case latency and the throughput of each flag combination over the whole corpus
+    """
+    for combo, timings in results.items():
+        print(f"\n{combo}")
+        print(f"{'case':<20} {'bytes':>8} {'best µs':>10} {'median µs':>10} {'msgs/s':>10}")
+        for case, timing in timings.items():
+            print(f"{case:<20} {len(corpus[case].encode()):>8} {timing['best'] * 1e6:>10.1f} {timing['median'] * 1e6:>10.1f} {1 / timing['median']:>10.0f}")
+
+        elapsed = sum(timing["median"] for timing in timings.values())
+        size = sum(len(corpus[case].encode()) for case in timings)
+        print(f"{'total':<20} {size:>8} {'':>10} {elapsed * 1e6:>10.1f} {len(timings) / elapsed:>10.0f}  ({size / elapsed / 1024:.0f} KiB/s)")
+
+
+def compare(results: dict, baseline: dict, threshold: float, normalize: bool) -> list:
+    """
+    Prints the change of each case's best time against a saved baseline
+    With normalize, changes are relative to the median change of all cases, which
+    factors out a machine that is uniformly slower than when the baseline was saved
+    Returns the (combo, case, percent) of cases slower by more than threshold percent
+    """
+    ratios = {}
+    for combo, timings in results.items():
+        for case, timing in timings.items():
+            before = baseline["results"].get(combo, {}).get(case)
+            ratios[combo, case] = timing["best"] / before["best"] if before is not None else None
+
+    known = [ratio for ratio in ratios.values() if ratio is not None]
+    drift = statistics.median(known) if known else 1
+    print(f"\nmedian change over all cases: {(drift - 1) * 100:+.1f}%{', factored out' if normalize else ''}")
+
+    regressions = []
+    print(f"{'combo':<15} {'case':<20} {'baseline µs':>12} {'now µs':>10} {'change':>8}")
+    for (combo, case), ratio in ratios.items():
+        now = results[combo][case]["best"]
+        if ratio is None:
+            print(f"{combo:<15} {case:<20} {'-':>12} {now * 1e6:>10.1f} {'new':>8}")
+            continue
+
+        change = (ratio / (drift if normalize else 1) - 1) * 100
+        regressed = change > threshold
+        print(f"{combo:<15} {case:<20} {now / ratio * 1e6:>12.1f} {now * 1e6:>10.1f} {change:>+7.1f}%{' REGRESSED' if regressed else ''}")
+        if regressed:
+            regressions.append((combo, case, change))
+
+    return regressions
+
+
+def main() -> None:
+    """
+    Entry point for python -m hcclient.devel.formatbench
+    """
+    parser = argparse.ArgumentParser(description="Markdown formatter benchmarks over a versioned message corpus",
+                                     epilog="Save a baseline with --save, then check a change against it with --compare")
+    parser.add_argument("--cases", nargs="+", choices=corpus.keys(), default=list(corpus.keys()), help="corpus cases to run, defaults to all")
+    parser.add_argument("--repeat", type=int, default=7, help="number of timed rounds per case, defaults to 7")
+    parser.add_argument("--round-time", type=float, default=0.05, help="approximate seconds per round, defaults to 0.05")
+    parser.add_argument("--save", metavar="FILE", help="write the results to a JSON file, to compare against later")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved with --save, exits with 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=10, help="percent a case may slow down before --compare fails, defaults to 10")
+    parser.add_argument("--normalize", action="store_true", help="compare each case relative to the median change, for noisy shared machines")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+        if (baseline.get("corpus_version"), baseline.get("corpus_digest")) != (corpus_version, corpus_digest()):
+            parser.error(f"{args.compare} was measured on corpus version {baseline.get('corpus_version')} ({baseline.get('corpus_digest')}), "
+                         f"this is version {corpus_version} ({corpus_digest()}), save a new baseline")
+
+        if baseline.get("bench_version") != bench_version:
+            parser.error(f"{args.compare} was measured by benchmark version {baseline.get('bench_version', 1)}, this is version {bench_version}, save a new baseline")
+
+    latex = LatexWorker.available()
+    if not latex:
+        print("latex2sympy2 isn't installed, skipping the LaTeX combinations")
+
+    results = run(args.cases, flag_combos(latex), args.repeat, args.round_time)
+    report(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf8") as results_file:
+            json.dump({"corpus_version": corpus_version, "corpus_digest": corpus_digest(), "bench_version": bench_version, "python": platform.python_version(),
+                       "results": results}, results_file, indent=2)
+
+        print(f"\nSaved results to {args.save}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold, args.normalize)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:g}%")
+            sys.exit(1)
+
+        print(f"\nNo case regressed by more than {args.threshold:g}%")
+
+
+if __name__ == "__main__":
+    main()
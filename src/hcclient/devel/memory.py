@@ -0,0 +1,154 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+from hcclient.client.records import Message, UpdatableMessage, UserDetails
+
+
+def chat_packets(count: int, users: int) -> list:
+    """
+    Returns chat packets as the server sends them, from a channel with a number of users
+    Packets are kept as JSON, so every parsed nick and trip is a new string like on the wire
+    """
+    nicks = [(f"user{i}", f"{random.getrandbits(30):06x}"[:6] if i % 3 else "", random.choice((100, 100, 100, 999999))) for i in range(users)]
+    packets = []
+    for i in range(count):
+        nick, trip, level = nicks[i % users]
+        packets.append(json.dumps({"cmd": "chat", "nick": nick, "trip": trip, "level": level, "userid": i % users, "channel": "bench",
+                                   "text": f"message {i} with some **markdown** and a link https://example.com/{i}", "time": int(time.time() * 1000)}))
+
+    return packets
+
+
+def user_packets(count: int) -> list:
+    """
+    Returns the users of an onlineSet packet, as JSON
+    """
+    return [json.dumps({"nick": f"user{i}", "trip": f"{random.getrandbits(30):06x}"[:6] if i % 3 else "", "level": 100,
+                        "hash": f"{random.getrandbits(64):016x}"[:15], "channel": "bench"}) for i in range(count)]
+
+
+def measure(build: object, packets: list) -> int:
+    """
+    Returns the bytes still allocated after building the stored objects from the packets
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    stored = build(packets)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del stored
+    return after - before
+
+
+def history_dicts(packets: list) -> list:
+    """
+    Scrollback stored as dicts of raw fields
+    """
+    stored = []
+    for line in packets:
+        packet = json.loads(line)
+        stored.append({"kind": "chat", "time": packet["time"] / 1000, "nick": packet["nick"], "trip": packet["trip"], "level": packet["level"],
+                       "text": packet["text"], "own": False, "highlighted": False, "status": None, "unique_id": None})
+
+    return stored
+
+
+def history_records(packets: list) -> list:
+    """
+    Scrollback stored as Message records
+    """
+    stored = []
+    for line in packets:
+        packet = json.loads(line)
+        stored.append(Message("chat", packet["time"] / 1000, packet["text"], packet["nick"], packet["trip"], packet["level"]))
+
+    return stored
+
+
+def updatable_dicts(packets: list) -> dict:
+    """
+    Updatable messages stored as dicts
+    """
+    stored = {}
+    for index, line in enumerate(packets):
+        packet = json.loads(line)
+        stored[index] = {"customId": str(index), "userid": packet["userid"], "text": packet["text"], "sent": time.time(), "trip": packet["trip"],
+                         "nick": packet["nick"], "level": packet["level"], "own": False, "unique_id": f"{index % 100000:05}"}
+
+    return stored
+
+
+def updatable_records(packets: list) -> dict:
+    """
+    Updatable messages stored as UpdatableMessage records
+    """
+    stored = {}
+    for index, line in enumerate(packets):
+        packet = json.loads(line)
+        record = Message("chat", packet["time"] / 1000, packet["text"], packet["nick"], packet["trip"], packet["level"], unique_id=f"{index % 100000:05}")
+        stored[index] = UpdatableMessage(str(index), packet["userid"], time.time(), record)
+
+    return stored
+
+
+def user_dicts(packets: list) -> dict:
+    """
+    Online users stored as dicts
+    """
+    stored = {}
+    for line in packets:
+        user = json.loads(line)
+        stored[user["nick"]] = {"Trip": user["trip"] or None, "Type": "User", "Hash": user["hash"]}
+
+    return stored
+
+
+def user_records(packets: list) -> dict:
+    """
+    Online users stored as UserDetails records
+    """
+    stored = {}
+    for line in packets:
+        user = json.loads(line)
+        stored[user["nick"]] = UserDetails(user["trip"], "User", user["hash"])
+
+    return stored
+
+
+def main() -> None:
+    """
+    Entry point for python -m hcclient.devel.memory
+    """
+    parser = argparse.ArgumentParser(description="Memory used per stored message, updatable message and user, as dicts and as records")
+    parser.add_argument("--messages", type=int, default=100000, help="number of scrollback messages, defaults to 100000")
+    parser.add_argument("--users", type=int, default=50, help="number of users sending them, defaults to 50")
+    parser.add_argument("--updatables", type=int, default=10000, help="number of pending updatable messages, defaults to 10000")
+    parser.add_argument("--online", type=int, default=5000, help="number of online users, defaults to 5000")
+    args = parser.parse_args()
+
+    random.seed(0)
+    messages = chat_packets(args.messages, args.users)
+    cases = (
+        (f"scrollback message ({args.messages} from {args.users} users)", messages, args.messages, history_dicts, history_records),
+        (f"updatable message ({args.updatables})", messages[:args.updatables], args.updatables, updatable_dicts, updatable_records),
+        (f"online user ({args.online})", user_packets(args.online), args.online, user_dicts, user_records)
+    )
+
+    print(f"{'bytes per':<50} {'dict':>8} {'record':>8} {'saved':>7}")
+    for name, packets, count, before, after in cases:
+        before_size = measure(before, packets) / count
+        after_size = measure(after, packets) / count
+        print(f"{name:<50} {before_size:>8.0f} {after_size:>8.0f} {1 - after_size / before_size:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
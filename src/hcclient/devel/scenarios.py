@@ -0,0 +1,205 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import json
+import time
+import random
+import asyncio
+
+
+async def pace(server: object, channel: str, sent: int, rate: float, start: float) -> None:
+    """
+    Waits until the next packet is due, and for the clients' buffers
+    to drain every 100 packets, so floods measure the client instead of memory
+    """
+    if rate:
+        delay = start + sent / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    if sent % 100 == 0:
+        for user in server.users(channel):
+            if user.writer is not None and not user.writer.is_closing():
+                try:
+                    await user.writer.drain()
+
+                except (ConnectionError, OSError):
+                    pass
+
+        await asyncio.sleep(0)
+
+
+async def flood(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    A handful of bots sending short chat messages
+    """
+    bots = [server.add_bot(channel, f"flooder{i}") for i in range(5)]
+    start = time.perf_counter()
+
+    for i in range(count):
+        server.chat(bots[i % len(bots)], f"message {i} with some **markdown**, `code` and a link https://example.com/{i}")
+        await pace(server, channel, i + 1, rate, start)
+
+    for bot in bots:
+        server.part(bot)
+
+    return f"{count} messages"
+
+
+async def raid(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Many users joining, each saying something and leaving
+    """
+    start = time.perf_counter()
+
+    for i in range(count):
+        bot = server.add_bot(channel, f"raider{i}", random.choice(("", "password")))
+        server.chat(bot, "hi")
+        await pace(server, channel, i * 3 + 2, rate, start)
+
+    for i, bot in enumerate([user for user in server.users(channel) if user.writer is None]):
+        server.part(bot)
+        await pace(server, channel, i + 1, rate, start)
+
+    return f"{count} joins and leaves"
+
+
+async def paste(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Huge code blocks, the worst case for syntax highlighting
+    """
+    bot = server.add_bot(channel, "paster")
+    line = "    result = [transform(item, index) for index, item in enumerate(items) if item is not None]  # comment\n"
+    code = "```python\ndef handler(items):\n" + line * (size // len(line) + 1) + "```"
+    start = time.perf_counter()
+
+    for i in range(count):
+        server.chat(bot, code)
+        await pace(server, channel, i + 1, rate, start)
+
+    server.part(bot)
+    return f"{count} pastes of {len(code)} bytes"
+
+
+async def stream(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    An updatable message streamed in small appends, like a chatbot's reply
+    """
+    bot = server.add_bot(channel, "streamer")
+    server.chat(bot, "", "stream")
+    start = time.perf_counter()
+
+    for i in range(count):
+        server.update_message(bot, "stream", random.choice(("lorem ", "ipsum ", "`dolor` ", "**sit** ", "amet\n")), "append")
+        await pace(server, channel, i + 1, rate, start)
+
+    server.update_message(bot, "stream", "", "complete")
+    server.part(bot)
+    return f"{count} updates"
+
+
+async def whispers(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Bots whispering to the client
+    """
+    bots = [server.add_bot(channel, f"whisperer{i}") for i in range(5)]
+    client = await server.wait_for_client(channel)
+    start = time.perf_counter()
+
+    for i in range(count):
+        server.whisper(bots[i % len(bots)], client.nick, f"whisper {i}")
+        await pace(server, channel, i + 1, rate, start)
+
+    for bot in bots:
+        server.part(bot)
+
+    return f"{count} whispers"
+
+
+async def disconnect(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Drops every client without a close frame and waits for one to rejoin,
+    the elapsed time is the client's reconnect time
+    """
+    dropped = server.drop_clients(channel)
+    await asyncio.sleep(0)
+    await server.wait_for_client(channel)
+
+    return f"dropped {dropped} clients, rejoined"
+
+
+async def stall(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Silently stops answering every client and waits for one to rejoin,
+    the elapsed time is how long the client takes to notice a dead connection
+    """
+    stalled = server.stall_clients(channel)
+    await server.wait_for_client(channel)
+
+    return f"stalled {stalled} clients, rejoined"
+
+
+async def bots(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Idle bots joining and staying until they're banned or kicked,
+    the elapsed time is how long moderating them away takes
+    """
+    start = time.perf_counter()
+    joined = []
+    for i in range(count):
+        joined.append(server.add_bot(channel, f"bot{i}", random.choice(("", "botpass"))))
+        await pace(server, channel, i + 1, rate, start)
+
+    while any(bot.channel is not None for bot in joined):
+        await asyncio.sleep(0.05)
+
+    return f"{count} bots removed"
+
+
+async def malformed(server: object, channel: str, count: int, rate: float, size: int) -> str:
+    """
+    Packets with missing or mistyped fields, or that aren't JSON objects at all,
+    sent to the client between valid messages, which should keep the connection up
+    """
+    bot = server.add_bot(channel, "fuzzer")
+    client = await server.wait_for_client(channel)
+    bad_packets = (
+        {"cmd": "chat", "nick": "fuzzer", "text": "no level"},
+        {"cmd": "onlineSet", "nicks": [], "users": []},
+        {"cmd": "updateMessage", "userid": bot.userid, "customId": "x", "text": "", "mode": "explode"},
+        {"cmd": "info", "text": 42},
+        {"cmd": "info", "type": "whisper", "text": "no sender"},
+        {"cmd": "onlineAdd", "nick": None},
+        {"cmd": "chat", "nick": "fuzzer", "text": "bad time", "level": 100, "time": "yesterday"},
+        {"text": "no cmd"},
+        [1, 2, 3],
+        "{not json"
+    )
+    start = time.perf_counter()
+
+    for i in range(count):
+        packet = bad_packets[i % len(bad_packets)]
+        if isinstance(packet, dict):
+            client.send(dict(packet))
+
+        else:
+            client.send_payload((packet if isinstance(packet, str) else json.dumps(packet)).encode())
+
+        server.chat(bot, f"still here {i}")
+        await pace(server, channel, i + 1, rate, start)
+
+    server.part(bot)
+    return f"{count} malformed packets"
+
+
+scenarios = {
+    "flood": flood,
+    "raid": raid,
+    "paste": paste,
+    "stream": stream,
+    "whispers": whispers,
+    "disconnect": disconnect,
+    "stall": stall,
+    "bots": bots,
+    "malformed": malformed
+}
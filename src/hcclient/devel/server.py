@@ -0,0 +1,543 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import ssl
+import sys
+import json
+import zlib
+import time
+import base64
+import asyncio
+import hashlib
+import argparse
+import contextlib
+
+from hcclient.utils import wsframes
+from hcclient.devel.scenarios import scenarios
+
+
+class RateLimiter:
+    """
+    Per connection score that decays over time, like the one hack.chat uses
+    Every packet adds to the score, going over the threshold gets the packet rejected
+    """
+    def __init__(self, threshold: float, half_life: float = 30) -> None:
+        """
+        Starts with an empty score, a threshold of 0 disables limiting
+        """
+        self.threshold = threshold
+        self.half_life = half_life
+        self.score = 0.0
+        self.updated = time.monotonic()
+
+    def hit(self, weight: float = 1) -> bool:
+        """
+        Adds to the score and returns True if the packet is allowed
+        """
+        if not self.threshold:
+            return True
+
+        now = time.monotonic()
+        self.score = self.score * 0.5 ** ((now - self.updated) / self.half_life) + weight
+        self.updated = now
+
+        return self.score <= self.threshold
+
+
+class User:
+    """
+    A user in a channel, either a connected websocket or a scripted bot
+    """
+    next_userid = 1
+
+    def __init__(self, server: object, writer: asyncio.StreamWriter | None = None, address: str = "127.0.0.1") -> None:
+        """
+        Sets up a user that hasn't joined yet
+        """
+        self.server = server
+        self.writer = writer
+        self.address = address
+        self.nick = None
+        self.trip = ""
+        self.level = 100
+        self.channel = None
+        self.userid = User.next_userid
+        self.hash = base64.b64encode(hashlib.sha256(f"{address}{self.userid}".encode()).digest()).decode()[:15]
+        self.limiter = RateLimiter(server.rate_limit)
+        self.pending_join = None
+        self.compressor = None
+        self.decompressor = None
+        User.next_userid += 1
+
+    def details(self) -> dict:
+        """
+        Returns the user as it appears in onlineSet/onlineAdd
+        """
+        return {
+            "channel": self.channel,
+            "isBot": self.writer is None,
+            "nick": self.nick,
+            "trip": self.trip,
+            "hash": self.hash,
+            "level": self.level,
+            "userid": self.userid,
+            "color": False,
+            "isme": False,
+            "uType": "user"
+        }
+
+    def send(self, packet: dict) -> None:
+        """
+        Sends a packet, bots discard everything they receive
+        """
+        if self.writer is None or self.writer.is_closing():
+            return
+
+        packet.setdefault("time", int(time.time() * 1000))
+        self.send_payload(json.dumps(packet).encode())
+
+    def send_payload(self, payload: bytes) -> None:
+        """
+        Sends a text frame as is, which doesn't have to be valid JSON
+        """
+        if self.writer is None or self.writer.is_closing():
+            return
+
+        self.server.stats["payload_out"] += len(payload)
+
+        if self.compressor is not None:
+            data = wsframes.encode_frame(wsframes.OPCODE_TEXT, (self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH))[:-4], mask=False, rsv1=True)
+
+        else:
+            data = wsframes.encode_frame(wsframes.OPCODE_TEXT, payload, mask=False)
+
+        self.server.stats["packets_out"] += 1
+        self.server.stats["bytes_out"] += len(data)
+        self.writer.write(data)
+
+    def drop(self) -> None:
+        """
+        Closes the connection without a close frame, like a crashed server would
+        """
+        if self.writer is not None:
+            self.writer.transport.abort()
+
+
+class ProtocolServer:
+    """
+    Local stand-in for the hack.chat server, implementing the subset
+    of the protocol the client speaks, for end-to-end benchmarks without a network
+    Scripted bots can be added to channels and driven by scenarios
+    """
+    nick_pattern = re.compile(r"^[a-zA-Z0-9_]{1,24}$")
+    captcha_text = "  ___  _  _  ___ \n | _ \\| || |/ __|\n |  _/| __ | (__ \n |_|  |_||_|\\___|\n"
+    captcha_answer = "phc"
+    done_marker = "[bench] done:"
+    mod_level = 999999
+    mod_verbs = {"ban": "banned", "kick": "kicked", "dumb": "muzzled", "speak": "unmuzzled", "overflow": "overflowed", "uwuify": "uwuified"}
+
+    def __init__(self, rate_limit: float = 0, captcha_channels: tuple = (), compression: bool = True, mod_password: str = "") -> None:
+        """
+        Sets up empty channels, users joining with the mod password are moderators
+        """
+        self.rate_limit = rate_limit
+        self.mod_password = mod_password
+        self.compression = compression
+        self.captcha_channels = set(captcha_channels)
+        self.channels = {}
+        self.joined = asyncio.Condition()
+        self.stats = {"connections": 0, "joins": 0, "packets_in": 0, "packets_out": 0, "payload_out": 0, "bytes_out": 0, "rate_limited": 0}
+
+    async def start(self, host: str, port: int, ssl_context: ssl.SSLContext | None = None) -> asyncio.AbstractServer:
+        """
+        Starts listening for websocket connections, over TLS if a context is given
+        """
+        return await asyncio.start_server(self.handle_connection, host, port, ssl=ssl_context)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Performs the handshake and handles packets until the connection closes
+        """
+        try:
+            _, headers = wsframes.parse_headers(await reader.readuntil(b"\r\n\r\n"))
+            deflate = self.compression and "permessage-deflate" in headers.get("sec-websocket-extensions", "")
+            writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {wsframes.accept_key(headers.get('sec-websocket-key', ''))}\r\n"
+                          + ("Sec-WebSocket-Extensions: permessage-deflate\r\n" if deflate else "") + "\r\n").encode())
+
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+
+        self.stats["connections"] += 1
+        user = User(self, writer, writer.get_extra_info("peername", ("127.0.0.1",))[0])
+        if deflate:
+            user.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            user.decompressor = zlib.decompressobj(-15)
+
+        decoder = wsframes.FrameDecoder()
+
+        try:
+            while not writer.is_closing():
+                data = await reader.read(65536)
+                if not data:
+                    break
+
+                for opcode, payload, compressed in decoder.feed(data):
+                    if compressed and user.decompressor is not None:
+                        payload = user.decompressor.decompress(payload + b"\x00\x00\xff\xff")
+
+                    match opcode:
+                        case wsframes.OPCODE_TEXT:
+                            self.stats["packets_in"] += 1
+                            with contextlib.suppress(ValueError, TypeError, AttributeError):
+                                self.handle_packet(user, json.loads(payload))
+
+                        case wsframes.OPCODE_PING:
+                            writer.write(wsframes.encode_frame(wsframes.OPCODE_PONG, payload, mask=False))
+
+                        case wsframes.OPCODE_CLOSE:
+                            writer.write(wsframes.encode_frame(wsframes.OPCODE_CLOSE, payload[:2], mask=False))
+                            writer.close()
+
+                await writer.drain()
+
+        except (OSError, wsframes.ProtocolError):
+            pass
+
+        finally:
+            self.part(user)
+            writer.close()
+
+    def users(self, channel: str) -> list:
+        """
+        Returns the users in a channel
+        """
+        return self.channels.get(channel, [])
+
+    def broadcast(self, channel: str, packet: dict, exclude: object = None) -> None:
+        """
+        Sends a packet to everyone in a channel
+        """
+        packet.setdefault("time", int(time.time() * 1000))
+        for user in self.users(channel):
+            if user is not exclude:
+                user.send(dict(packet))
+
+    def warn(self, user: User, text: str) -> None:
+        """
+        Sends a warning to a single user
+        """
+        user.send({"cmd": "warn", "text": text})
+
+    def handle_packet(self, user: User, packet: dict) -> None:
+        """
+        Dispatches a received packet
+        """
+        if packet.get("cmd") == "ping":
+            return
+
+        if not user.limiter.hit(len(packet.get("text", "")) / 83 / 4 + 1 if isinstance(packet.get("text"), str) else 1):
+            self.stats["rate_limited"] += 1
+            self.warn(user, "You are being rate-limited or blocked.")
+            return
+
+        match packet.get("cmd"):
+            case "chat" if user.pending_join is not None:
+                self.solve_captcha(user, packet["text"])
+
+            case "join":
+                self.join(user, packet.get("channel", ""), packet.get("nick", ""), packet.get("pass", ""))
+
+            case "chat" if user.channel is not None:
+                self.chat(user, packet["text"], packet.get("customId"))
+
+            case "updateMessage" if user.channel is not None:
+                self.update_message(user, packet["customId"], packet["text"], packet.get("mode", "overwrite"))
+
+            case "emote" if user.channel is not None:
+                self.broadcast(user.channel, {"cmd": "emote", "nick": user.nick, "userid": user.userid, "text": f"@{user.nick} {packet['text']}", "trip": user.trip})
+
+            case "whisper" if user.channel is not None:
+                self.whisper(user, packet["nick"].lstrip("@"), packet["text"])
+
+            case "changenick" if user.channel is not None:
+                self.change_nick(user, packet["nick"])
+
+            case "ban" | "kick" | "dumb" | "speak" | "overflow" | "uwuify" if user.channel is not None and user.level >= self.mod_level:
+                self.moderate(user, packet["cmd"], str(packet.get("nick", "")))
+
+            case _ if user.channel is None:
+                self.warn(user, "You must join a channel first.")
+
+            case _:
+                self.warn(user, f"Unknown command: {packet.get('cmd')}")
+
+    def join(self, user: User, channel: str, nick: str, password: str = "") -> bool:
+        """
+        Adds a user to a channel, returns False if the join was refused
+        """
+        nick, _, nick_password = nick.partition("#")
+        password = password or nick_password
+
+        if user.channel is not None:
+            self.warn(user, "Joining more than one channel is not supported by this server.")
+            return False
+
+        if not channel:
+            self.warn(user, "Channel name is required.")
+            return False
+
+        if channel in self.captcha_channels and user.writer is not None and user.pending_join is None:
+            user.pending_join = (channel, nick, password)
+            user.send({"cmd": "captcha", "channel": channel, "text": self.captcha_text})
+            return False
+
+        if not self.nick_pattern.match(nick):
+            self.warn(user, "Nickname must consist of up to 24 letters, numbers, and underscores")
+            return False
+
+        if any(other.nick.lower() == nick.lower() for other in self.users(channel)):
+            self.warn(user, "Nickname taken")
+            return False
+
+        user.nick = nick
+        user.channel = channel
+        user.trip = base64.b64encode(hashlib.sha256(password.encode()).digest()).decode()[:6] if password else ""
+        user.level = self.mod_level if self.mod_password and password == self.mod_password else 100
+
+        self.broadcast(channel, {"cmd": "onlineAdd", **user.details()})
+        self.channels.setdefault(channel, []).append(user)
+        self.stats["joins"] += 1
+
+        users = [other.details() | {"isme": other is user} for other in self.users(channel)]
+        user.send({"cmd": "onlineSet", "nicks": [other["nick"] for other in users], "users": users})
+
+        if user.writer is not None:
+            asyncio.create_task(self.notify_joined())
+
+        return True
+
+    def solve_captcha(self, user: User, answer: str) -> None:
+        """
+        Completes a join held back by a captcha if the answer is right
+        """
+        if answer.strip().lower() != self.captcha_answer:
+            user.send({"cmd": "captcha", "channel": user.pending_join[0], "text": self.captcha_text})
+            return
+
+        channel, nick, password = user.pending_join
+        self.join(user, channel, nick, password)
+        user.pending_join = None
+
+    async def notify_joined(self) -> None:
+        """
+        Wakes up scenarios waiting for a client to join
+        """
+        async with self.joined:
+            self.joined.notify_all()
+
+    async def wait_for_client(self, channel: str) -> User:
+        """
+        Waits until a websocket client is in a channel and returns it
+        """
+        async with self.joined:
+            await self.joined.wait_for(lambda: any(user.writer is not None for user in self.users(channel)))
+
+        return next(user for user in self.users(channel) if user.writer is not None)
+
+    def part(self, user: User) -> None:
+        """
+        Removes a user from its channel
+        """
+        if user.channel is None:
+            return
+
+        self.channels[user.channel].remove(user)
+        self.broadcast(user.channel, {"cmd": "onlineRemove", "userid": user.userid, "nick": user.nick})
+        user.channel = None
+
+    def chat(self, user: User, text: str, custom_id: str | None = None) -> None:
+        """
+        Sends a chat message from a user, updatable if a custom id is given
+        """
+        packet = {"cmd": "chat", "nick": user.nick, "uType": "user", "userid": user.userid, "channel": user.channel,
+                  "text": text, "level": user.level, "trip": user.trip}
+        if custom_id is not None:
+            packet["customId"] = custom_id
+
+        self.broadcast(user.channel, packet)
+
+    def update_message(self, user: User, custom_id: str, text: str, mode: str = "overwrite") -> None:
+        """
+        Updates a message previously sent with a custom id
+        """
+        self.broadcast(user.channel, {"cmd": "updateMessage", "userid": user.userid, "channel": user.channel,
+                                      "customId": custom_id, "text": text, "mode": mode})
+
+    def whisper(self, user: User, nick: str, text: str) -> None:
+        """
+        Sends a whisper to a user in the same channel
+        """
+        target = next((other for other in self.users(user.channel) if other.nick == nick), None)
+        if target is None:
+            self.warn(user, "Could not find user in channel")
+            return
+
+        target.send({"cmd": "info", "type": "whisper", "from": user.nick, "to": target.userid, "trip": user.trip,
+                     "level": user.level, "text": f"{user.nick} whispered: {text}"})
+        user.send({"cmd": "info", "type": "whisper", "from": user.nick, "to": target.userid, "trip": user.trip,
+                   "level": user.level, "text": f"You whispered to @{target.nick}: {text}"})
+
+    def change_nick(self, user: User, nick: str) -> None:
+        """
+        Changes a user's nick, announced as a leave and join like the real server does
+        """
+        if not self.nick_pattern.match(nick) or any(other.nick.lower() == nick.lower() for other in self.users(user.channel)):
+            self.warn(user, "Nickname taken or invalid")
+            return
+
+        channel = user.channel
+        old_nick = user.nick
+        self.channels[channel].remove(user)
+        self.broadcast(channel, {"cmd": "onlineRemove", "userid": user.userid, "nick": old_nick})
+        user.nick = nick
+        self.broadcast(channel, {"cmd": "onlineAdd", **user.details()})
+        self.channels[channel].append(user)
+        self.broadcast(channel, {"cmd": "info", "text": f"{old_nick} is now {nick}"})
+
+    def moderate(self, user: User, cmd: str, nick: str) -> None:
+        """
+        Runs a moderation command from a mod on a user in the same channel,
+        answered with the same infos and warnings as the real server
+        Banned and kicked users are removed from the channel
+        """
+        target = next((other for other in self.users(user.channel) if other.nick == nick.lstrip("@")), None)
+        if target is None:
+            self.warn(user, "Could not find user in channel")
+            return
+
+        if target.level >= user.level:
+            self.warn(user, f"Cannot {cmd} other users of the same level, how rude")
+            return
+
+        channel = user.channel
+        mod_text = f"{user.nick}#{user.trip} {self.mod_verbs[cmd]} {target.nick} in {channel}, userhash: {target.hash}"
+        for other in self.users(channel):
+            if other.level >= self.mod_level:
+                other.send({"cmd": "info", "text": mod_text})
+
+            elif cmd in ("ban", "kick"):
+                other.send({"cmd": "info", "text": f"{'Banned' if cmd == 'ban' else 'Kicked'} {target.nick}"})
+
+        if cmd in ("ban", "kick"):
+            self.part(target)
+
+    def add_bot(self, channel: str, nick: str, password: str = "") -> User:
+        """
+        Adds a scripted user without a connection to a channel
+        """
+        bot = User(self)
+        self.join(bot, channel, nick, password)
+        return bot
+
+    def drop_clients(self, channel: str) -> int:
+        """
+        Abruptly disconnects every websocket client in a channel, returns how many were dropped
+        """
+        clients = [user for user in self.users(channel) if user.writer is not None]
+        for user in clients:
+            self.part(user)
+            user.drop()
+
+        return len(clients)
+
+    def stall_clients(self, channel: str) -> int:
+        """
+        Stops reading from and sending to every websocket client in a channel
+        without closing the connections, like a NAT rebinding would
+        Returns how many were stalled
+        """
+        clients = [user for user in self.users(channel) if user.writer is not None]
+        for user in clients:
+            self.part(user)
+            user.writer.transport.pause_reading()
+            user.writer = None
+
+        return len(clients)
+
+    def report(self) -> str:
+        """
+        Returns the traffic counters
+        """
+        return ", ".join(f"{name}: {value}" for name, value in self.stats.items())
+
+
+def log(message: str) -> None:
+    """
+    Logs a message to stderr
+    """
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """
+    Runs the server and the selected scenario
+    """
+    server = ProtocolServer(args.rate_limit, args.captcha, not args.no_compression, args.mod_password)
+    ssl_context = None
+    if args.tls_cert:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(args.tls_cert, args.tls_key)
+
+    listener = await server.start(args.host, args.port, ssl_context)
+    log(f"Listening on {'wss' if ssl_context else 'ws'}://{args.host}:{args.port}, scenario: {args.scenario or 'none'}")
+
+    async with listener:
+        try:
+            if args.scenario:
+                for run in range(args.repeat):
+                    log(f"Waiting for a client in '{args.channel}' (run {run + 1}/{args.repeat})")
+                    await server.wait_for_client(args.channel)
+                    start = time.perf_counter()
+                    result = await scenarios[args.scenario](server, args.channel, args.count, args.rate, args.size)
+                    log(f"{args.scenario}: {result} in {time.perf_counter() - start:.3f}s")
+                    server.broadcast(args.channel, {"cmd": "info", "text": f"{server.done_marker} {args.scenario} {run + 1}"})
+
+                log(server.report())
+
+            await listener.serve_forever()
+
+        except asyncio.CancelledError:
+            log(server.report())
+
+
+def main() -> None:
+    """
+    Entry point for python -m hcclient.devel.server
+    """
+    parser = argparse.ArgumentParser(description="Local stand-in hack.chat server for benchmarks",
+                                     epilog=f"Scenarios: {', '.join(scenarios)}")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, defaults to 127.0.0.1")
+    parser.add_argument("--port", type=int, default=6060, help="port to listen on, defaults to 6060")
+    parser.add_argument("--channel", default="bench", help="channel the scenario runs in, defaults to 'bench'")
+    parser.add_argument("--scenario", choices=scenarios.keys(), help="scenario to run once a client joins the channel")
+    parser.add_argument("--count", type=int, default=1000, help="number of messages, users or updates the scenario produces")
+    parser.add_argument("--rate", type=float, default=0, help="packets per second the scenario sends, 0 for as fast as possible")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="size of pastes in bytes, defaults to 65536")
+    parser.add_argument("--repeat", type=int, default=1, help="number of times to run the scenario, waiting for a client each time")
+    parser.add_argument("--rate-limit", type=float, default=0, help="rate limit score threshold, 0 disables rate limiting")
+    parser.add_argument("--no-compression", action="store_true", help="refuse permessage-deflate")
+    parser.add_argument("--tls-cert", metavar="FILE", help="certificate to serve wss:// with, e.g. a self-signed one")
+    parser.add_argument("--tls-key", metavar="FILE", help="private key of the certificate, if it isn't in the certificate file")
+    parser.add_argument("--mod-password", default="", help="password that makes users joining with it moderators")
+    parser.add_argument("--captcha", nargs="*", default=(), metavar="CHANNEL", help="channels that send a captcha instead of accepting joins")
+    args = parser.parse_args()
+
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
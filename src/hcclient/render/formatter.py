@@ -3,6 +3,8 @@
 
 import re
 import html
+import threading
+import functools
 
 import termcolor
 import linkify_it
@@ -13,17 +15,21 @@
 import pygments.formatters
 import mdit_py_plugins.texmath
 
+from hcclient.render.latex import LatexWorker
+from hcclient.render.guesser import LexerGuesser
+
 
 class TextFormatter:
     """
     Handles markdown parsing, code highlighting, LaTeX simplifying and linkifying
+    Safe to share between threads, per-message state is kept local to each call
     """
     def __init__(self) -> None:
         """
         Initializes the markdown parser and compiles regex patterns
         """
         self.parser = markdown_it.MarkdownIt("zero")
-        self.parser.enable(["emphasis", "escape", "strikethrough", "link", "image", "fence", "autolink", "backticks"])
+        self.parser.enable(["emphasis", "escape", "strikethrough", "link", "image", "fence", "autolink", "backticks", "linkify"])
         self.parser.use(mdit_py_plugins.texmath.texmath_plugin)
 
         self.linkify = (
@@ -33,7 +39,15 @@ def __init__(self) -> None:
             .add("wss:", "https:")
         )
 
-        self.latex2sympy = None  # client.py lazy loads this
+        # urls are found in a single scan of the plain text segments while parsing,
+        # code, existing links and escape sequences never reach the linkifier
+        self.parser.linkify = self.linkify
+        self.parser.add_render_rule("link_open", TextFormatter.render_link_open)
+        self.parser.add_render_rule("link_close", TextFormatter.render_link_close)
+        self.parser_lock = threading.Lock()  # the linkify option is set on the shared parser for each render
+
+        self.guesser = LexerGuesser()
+        self.latex_worker = LatexWorker()
 
         self.codeblock_pattern = re.compile(r"\s*<pre><code(?: class=\"(?P<lang>[^\s\n]+)\")?>(?P<code>.*?)</code></pre>", re.DOTALL)
         self.code_pattern = re.compile(r"<(?!pre>)(?:code>(?P<code>.*?)</code>)", re.DOTALL)
@@ -48,8 +62,10 @@ def markdown(self, text: str, highlight_theme: str, client_color: str, message_c
         """
         Formats text with markdown and calls the highlighter and LaTeX simplifier
         """
-        parsed = self.parser.render(text)
         message_color_open = "\033[%dm" % (termcolor.COLORS[message_color])
+        with self.parser_lock:
+            self.parser.options["linkify"] = linkify
+            parsed = self.parser.render(text, {"message_color_open": message_color_open})
 
         parsed = parsed.replace("<p>", "").replace("</p>\n", "\n").replace("</p>", "\n")
         parsed = parsed.replace("<em>", "\033[3m").replace("</em>", "\033[0m" + message_color_open)
@@ -64,21 +80,37 @@ def markdown(self, text: str, highlight_theme: str, client_color: str, message_c
         parsed = self.highlight_blocks(parsed, highlight_theme, client_color, message_color_open)
 
         if latex:
-            self.message_color_open = message_color_open
-            parsed = self.eq_pattern.sub(self.simplify_latex, parsed)
-            parsed = self.eqn_pattern.sub(self.simplify_latex, parsed)
+            simplify_latex = functools.partial(self.simplify_latex, message_color_open=message_color_open)
+            parsed = self.eq_pattern.sub(simplify_latex, parsed)
+            parsed = self.eqn_pattern.sub(simplify_latex, parsed)
 
         else:
             parsed = self.eq_pattern.sub("$\\g<equation>$", parsed)
             parsed = self.eqn_pattern.sub("$$\\g<equation>$$", parsed)
 
-        if linkify and self.linkify.test(parsed):
-            links = self.linkify.match(parsed)
-            for link in links:
-                parsed = parsed.replace(link.raw, f"\033[4m{link.raw}\033[0m" + message_color_open)
-
         return html.unescape(parsed.strip("\n"))
 
+    @staticmethod
+    def render_link_open(renderer: object, tokens: list, idx: int, options: dict, env: dict) -> str:
+        """
+        Renderer rule, renders the start of a linkified url as underlined text
+        Other links are left for the link pattern
+        """
+        if tokens[idx].markup == "linkify":
+            return "\033[4m"
+
+        return renderer.renderToken(tokens, idx, options, env)
+
+    @staticmethod
+    def render_link_close(renderer: object, tokens: list, idx: int, options: dict, env: dict) -> str:
+        """
+        Renderer rule, renders the end of a linkified url
+        """
+        if tokens[idx].markup == "linkify":
+            return "\033[0m" + env["message_color_open"]
+
+        return renderer.renderToken(tokens, idx, options, env)
+
     def highlight_blocks(self, text: str, highlight_theme: str, client_color: str, message_color_open: str) -> str:
         """
         Highlights code blocks with pygments
@@ -93,7 +125,7 @@ def highlight_blocks(self, text: str, highlight_theme: str, client_color: str, m
                 guess_tag = ""
 
             except pygments.util.ClassNotFound:
-                lexer = pygments.lexers.guess_lexer(code)
+                lexer = self.guesser.guess(code)
                 guess_tag = "(guessed) "
 
             highlighted = pygments.highlight(code, lexer, pygments.formatters.Terminal256Formatter(style=highlight_theme)).strip("\n")
@@ -105,18 +137,24 @@ def highlight_blocks(self, text: str, highlight_theme: str, client_color: str, m
 
         return text
 
-    def simplify_latex(self, match: re.Match) -> str:
+    def simplify_latex(self, match: re.Match, message_color_open: str) -> str:
         """
-        Simplifies LaTeX equations with latex2sympy2
+        Simplifies LaTeX equations with the latex2sympy2 worker process,
+        equations are left as they are while the worker is unavailable
         """
         equation = match.group("equation")
         block = "|" if match.group(0).startswith("<eq>") else "||"
 
         try:
-            sympy_expr = str(self.latex2sympy.latex2sympy(equation)).replace("**", "^")
-            replacement = f"\033[3m\033[1m{block}latex: {sympy_expr}{block}\033[0m" + self.message_color_open
+            sympy_expr = self.latex_worker.simplify(equation)
 
-        except Exception:
-            replacement = f"\033[3m\033[1m{block}latex-error: {equation}{block}\033[0m" + self.message_color_open
+        except TimeoutError:
+            return f"${equation}$" if block == "|" else f"$${equation}$$"
+
+        if sympy_expr is not None:
+            replacement = f"\033[3m\033[1m{block}latex: {sympy_expr}{block}\033[0m" + message_color_open
+
+        else:
+            replacement = f"\033[3m\033[1m{block}latex-error: {equation}{block}\033[0m" + message_color_open
 
         return replacement
@@ -0,0 +1,152 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import json
+import time
+import itertools
+import threading
+import collections
+
+import pygments.util
+import pygments.lexers
+import pygments.lexers.special
+
+
+class LexerGuesser:
+    """
+    Guesses the language of unlabeled code blocks with cheap heuristics
+    against a small set of likely languages, instead of running every
+    lexer pygments ships like pygments.lexers.guess_lexer() does
+    """
+    max_sample = 4096      # characters of a block that are inspected
+    max_lines = 200        # lines of a block that are inspected
+    time_budget = 0.01     # seconds allowed for a single guess
+    cache_size = 256       # number of guesses remembered
+    min_score = 2          # signature hits needed to accept a language
+    max_hits = 3           # matches counted per line-anchored signature, such as several import lines
+
+    # line-anchored patterns use [ \t]* instead of \s*, which would also match
+    # newlines and make every search quadratic in runs of blank lines
+
+    signatures = {
+        "python": (r"^[ \t]*def \w+\(.*\)\s*(?:->.*)?:[ \t]*$", r"^[ \t]*(?:from [\w.]+ )?import [\w., ]+$", r"^[ \t]*class \w+(?:\(.*\))?:[ \t]*$",
+                   r"\bself\.\w+", r"^[ \t]*(?:elif|except|with) .*:[ \t]*$", r"\b(?:None|True|False)\b", r"^[ \t]*@\w+"),
+        "javascript": (r"\b(?:const|let|var) \w+ =", r"\bfunction\s*\w*\s*\(", r"=>\s*[{(]", r"\bconsole\.\w+\(",
+                       r"\bdocument\.\w+", r"\brequire\(['\"]", r"===|!=="),
+        "typescript": (r"^[ \t]*(?:export )?interface \w+", r":\s*(?:string|number|boolean|any)\b", r"^[ \t]*type \w+ =", r"\bas (?:string|number|const)\b"),
+        "c": (r"^[ \t]*#include\s*<\w+\.h>", r"\bint main\s*\(", r"\bprintf\s*\(", r"\b(?:malloc|free|sizeof)\s*\(", r"\bstruct \w+\s*\{"),
+        "cpp": (r"^[ \t]*#include\s*<\w+>", r"\bstd::\w+", r"\bcout\s*<<", r"^[ \t]*using namespace \w+;", r"\btemplate\s*<", r"\bnullptr\b"),
+        "java": (r"\bpublic (?:static )?(?:class|void|final)\b", r"\bSystem\.out\.print", r"^[ \t]*import java\.", r"\bString\[\] args", r"@Override"),
+        "csharp": (r"^[ \t]*using System", r"\bnamespace \w+", r"\bConsole\.Write", r"\bpublic (?:async )?(?:Task|string|int)\b", r"\bvar \w+ = new\b"),
+        "go": (r"^[ \t]*package \w+[ \t]*$", r"^[ \t]*func (?:\(.*\) )?\w+\(", r"\bfmt\.\w+\(", r":= ", r"^[ \t]*import \($"),
+        "rust": (r"\bfn \w+\s*(?:<.*>)?\(", r"\blet mut\b", r"\bimpl(?:<.*>)? \w+", r"\b(?:println|vec|format)!\(", r"\bpub (?:fn|struct|enum)\b", r"&(?:mut )?self\b"),
+        "bash": (r"^[ \t]*(?:if|while) \[\[? .* \]\]?;?", r"^[ \t]*(?:fi|done|esac)[ \t]*$", r"\$\{?\w+\}?", r"^[ \t]*(?:echo|export|sudo|cd|apt|pip|git) ", r"^[ \t]*\w+\(\)\s*\{"),
+        "php": (r"<\?php", r"\$\w+\s*=", r"\becho\b", r"\bfunction \w+\(\$"),
+        "ruby": (r"^[ \t]*def \w+[?!]?(?:\(.*\))?[ \t]*$", r"^[ \t]*end[ \t]*$", r"\bputs\b", r"^[ \t]*require ['\"]", r"\.each do\b", r"@\w+ ="),
+        "lua": (r"\blocal \w+\s*=", r"^[ \t]*function [\w.:]+\(", r"^[ \t]*end[ \t]*$", r"\bthen\b", r"~="),
+        "sql": (r"(?i)\bselect\b.+\bfrom\b", r"(?i)\binsert into\b", r"(?i)\bcreate table\b", r"(?i)\bwhere\b", r"(?i)\b(?:update|delete from)\b"),
+        "css": (r"^[ \t]*[.#]?[\w-]+(?:\s*[,>]\s*[.#]?[\w-]+)*\s*\{[ \t]*$", r"^[ \t]*[\w-]+:\s*[^;]+;[ \t]*$", r"\b\d+(?:px|em|rem|%)\b", r"#[0-9a-fA-F]{3,6}\b"),
+        "html": (r"(?i)<!doctype html", r"(?i)<(?:html|head|body|div|span|script|a href)\b", r"(?i)</\w+>"),
+        "yaml": (r"^[ \t]*[\w-]+:[ \t]*$", r"^[ \t]*- [\w\"']", r"^[ \t]*[\w-]+: [^{;]+$", r"^---[ \t]*$"),
+        "diff": (r"^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@", r"^(?:---|\+\+\+) \S+", r"^[+-](?![+-])"),
+    }
+
+    interpreters = {
+        "python": "python", "python3": "python", "node": "javascript", "bash": "bash", "sh": "bash",
+        "zsh": "bash", "ruby": "ruby", "php": "php", "lua": "lua", "perl": "perl",
+    }
+
+    def __init__(self) -> None:
+        """
+        Compiles the signature patterns and sets up the cache,
+        which is shared by the receiving and UI threads
+        """
+        # keyword lines count every time they repeat, other signatures like $var are too generic for that
+        self.compiled = {lang: [(re.compile(pattern, re.MULTILINE), self.max_hits if pattern.startswith("^") else 1) for pattern in patterns]
+                         for lang, patterns in self.signatures.items()}
+        self.cache = collections.OrderedDict()
+        self.cache_lock = threading.Lock()
+
+    def guess(self, code: str) -> object:
+        """
+        Returns a lexer for the code, falling back to plain text
+        if no language could be decided
+        Guesses that ran out of time aren't cached, so the block is guessed again next time
+        """
+        # only a prefix of the code is inspected, one more character tells if it was cut
+        key = code[:self.max_sample + 1]
+        with self.cache_lock:
+            cached = key in self.cache
+            if cached:
+                self.cache.move_to_end(key)
+                name = self.cache[key]
+
+        if not cached:
+            try:
+                name = self.detect(code)
+
+            except TimeoutError:
+                return pygments.lexers.special.TextLexer()
+
+            with self.cache_lock:
+                self.cache[key] = name
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        if name is None:
+            return pygments.lexers.special.TextLexer()
+
+        try:
+            return pygments.lexers.get_lexer_by_name(name)
+
+        except pygments.util.ClassNotFound:
+            return pygments.lexers.special.TextLexer()
+
+    def detect(self, code: str) -> str | None:
+        """
+        Runs the heuristics on a sample of the code and returns
+        the name of the best scoring language, or None
+        Line-anchored signatures score once per matching line, up to max_hits
+        Raises TimeoutError if the time budget ran out
+        """
+        sample = code[:self.max_sample]
+        if len(code) > self.max_sample and "\n" in sample:
+            sample = sample[:sample.rindex("\n")]
+
+        if sample.count("\n") >= self.max_lines:
+            sample = "\n".join(sample.split("\n", self.max_lines)[:self.max_lines])
+
+        stripped = sample.lstrip()
+
+        if stripped.startswith("#!"):
+            interpreter = stripped[2:].partition("\n")[0].split()
+            if interpreter:
+                name = interpreter[-1].rsplit("/", 1)[-1]
+                name = self.interpreters.get(name, self.interpreters.get(name.rstrip("0123456789.")))
+                if name is not None:
+                    return name
+
+        if stripped[:1] in ("{", "[") and len(code) <= self.max_sample:
+            try:
+                json.loads(code)
+                return "json"
+
+            except ValueError:
+                pass
+
+        deadline = time.perf_counter() + self.time_budget
+        best_name, best_score = None, 0
+
+        for lang, patterns in self.compiled.items():
+            score = 0
+            for pattern, hits in patterns:
+                if time.perf_counter() > deadline:
+                    raise TimeoutError("Language guess exceeded the time budget")
+
+                score += sum(1 for _ in itertools.islice(pattern.finditer(sample), hits))
+
+            if score > best_score:
+                best_name, best_score = lang, score
+
+        return best_name if best_score >= self.min_score else None
@@ -0,0 +1,168 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import sys
+import json
+import time
+import queue
+import threading
+import subprocess
+import collections
+import importlib.util
+
+
+class LatexWorker:
+    """
+    Simplifies LaTeX equations with latex2sympy2 in a separate process,
+    so sympy is never imported by the client itself and a hostile
+    equation can't hang the receive thread
+    """
+    timeout = 2            # seconds allowed per equation
+    startup_timeout = 20   # seconds allowed for the worker to import sympy
+    restart_delay = 10     # seconds before a worker that failed or hung is started again
+    cache_size = 512       # number of results remembered
+
+    def __init__(self) -> None:
+        """
+        Sets up the result cache, the worker is started lazily
+        """
+        self.proc = None
+        self.ready = False
+        self.started = 0
+        self.retry_at = 0
+        self.responses = queue.Queue()
+        self.request_id = 0
+        self.lock = threading.RLock()
+        self.cache = collections.OrderedDict()
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Checks if the optional LaTeX dependencies are installed without importing them
+        """
+        return importlib.util.find_spec("latex2sympy2") is not None
+
+    def start(self) -> None:
+        """
+        Starts the worker process if it isn't already running
+        """
+        if self.proc is not None and self.proc.poll() is None:
+            return
+
+        self.proc = subprocess.Popen([sys.executable, "-m", "hcclient.render.latex"],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                     encoding="utf8", bufsize=1)
+        self.ready = False
+        self.started = time.monotonic()
+        self.responses = queue.Queue()
+        threading.Thread(target=self.reader_thread, args=(self.proc, self.responses), daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Kills the worker process, a new one will be started on the next request
+        """
+        with self.lock:
+            if self.proc is not None:
+                self.proc.kill()
+                self.proc = None
+
+    def reader_thread(self, proc: subprocess.Popen, responses: queue.Queue) -> None:
+        """
+        Reads responses from a worker process into its queue,
+        marking the worker ready once it has imported sympy
+        """
+        for line in proc.stdout:
+            response = json.loads(line)
+            if "ready" in response:
+                if proc is self.proc:
+                    self.ready = True
+
+                continue
+
+            responses.put(response)
+
+        responses.put(None)
+
+    def simplify(self, equation: str) -> str | None:
+        """
+        Returns the simplified equation, or None if latex2sympy2 can't parse it
+        Raises TimeoutError without waiting while the worker is starting, and if it
+        didn't answer in time, in which case it is restarted after restart_delay
+        Only answers from the worker are cached, so equations are retried later
+        """
+        with self.lock:
+            if equation in self.cache:
+                self.cache.move_to_end(equation)
+                return self.cache[equation]
+
+            if self.proc is None or self.proc.poll() is not None:
+                if time.monotonic() < self.retry_at:
+                    raise TimeoutError("LaTeX worker is restarting")
+
+                self.start()
+
+            if not self.ready:
+                if time.monotonic() - self.started > self.startup_timeout:
+                    self.fail()
+
+                raise TimeoutError("LaTeX worker is starting")
+
+            self.request_id += 1
+
+            try:
+                self.proc.stdin.write(json.dumps({"id": self.request_id, "equation": equation}) + "\n")
+                self.proc.stdin.flush()
+                result = self.wait_for(self.request_id)
+
+            except (OSError, queue.Empty):
+                self.fail()
+                raise TimeoutError(f"LaTeX worker didn't answer within {self.timeout}s")
+
+            self.cache[equation] = result
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+            return result
+
+    def fail(self) -> None:
+        """
+        Kills a worker that hung or exited, and holds off restarting it
+        """
+        self.stop()
+        self.retry_at = time.monotonic() + self.restart_delay
+
+    def wait_for(self, request_id: int) -> str | None:
+        """
+        Waits for the response to a request, raises queue.Empty on timeout
+        """
+        while True:
+            response = self.responses.get(timeout=self.timeout)
+            if response is None:
+                raise OSError("LaTeX worker exited")
+
+            if response["id"] == request_id:
+                return response["result"]
+
+
+def main() -> None:
+    """
+    Worker entry point, reads equations from stdin and writes results to stdout as JSON lines
+    """
+    import latex2sympy2
+
+    print(json.dumps({"ready": True}), flush=True)
+
+    for line in sys.stdin:
+        request = json.loads(line)
+
+        try:
+            result = str(latex2sympy2.latex2sympy(request["equation"])).replace("**", "^")
+
+        except Exception:
+            result = None
+
+        print(json.dumps({"id": request["id"], "result": result}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
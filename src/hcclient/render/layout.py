@@ -0,0 +1,196 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import re
+import threading
+import functools
+import unicodedata
+import collections
+
+
+@functools.lru_cache(maxsize=4096)
+def char_width(char: str) -> int:
+    """
+    Returns the number of terminal columns a character takes,
+    2 for East Asian wide characters, 0 for combining and control characters
+    """
+    if unicodedata.combining(char) or unicodedata.category(char) in ("Mn", "Me", "Cf", "Cc"):
+        return 0
+
+    return 2 if unicodedata.east_asian_width(char) in ("W", "F") else 1
+
+
+@functools.lru_cache(maxsize=1024)
+def apply_sgr(state: tuple, code: str) -> tuple:
+    """
+    Returns the (foreground, background, attributes) state after an SGR sequence
+    Colors are kept as their parameters, attributes as a sorted tuple of parameters
+    """
+    foreground, background, attributes = state
+    attributes = set(attributes)
+    params = code[2:-1].split(";") if len(code) > 3 else ["0"]
+    index = 0
+
+    while index < len(params):
+        param = int(params[index]) if params[index].isdigit() else 0
+        if param in (38, 48):
+            length = 3 if index + 1 < len(params) and params[index + 1] == "5" else 5
+            color = ";".join(params[index:index + length])
+            foreground, background = (color, background) if param == 38 else (foreground, color)
+            index += length
+            continue
+
+        if param == 0:
+            foreground, background, attributes = None, None, set()
+
+        elif 1 <= param <= 9:
+            attributes.add(param)
+
+        elif param == 22:
+            attributes -= {1, 2}
+
+        elif 23 <= param <= 29:
+            attributes.discard(param - 20)
+
+        elif 30 <= param <= 37 or 90 <= param <= 97:
+            foreground = str(param)
+
+        elif param == 39:
+            foreground = None
+
+        elif 40 <= param <= 47 or 100 <= param <= 107:
+            background = str(param)
+
+        elif param == 49:
+            background = None
+
+        index += 1
+
+    return foreground, background, tuple(sorted(attributes))
+
+
+def sgr_sequence(state: tuple) -> str:
+    """
+    Returns a sequence that restores an SGR state from a reset terminal
+    """
+    foreground, background, attributes = state
+    params = [str(attribute) for attribute in attributes] + [color for color in (foreground, background) if color is not None]
+    return f"\033[{';'.join(params)}m" if params else ""
+
+
+class LineLayout:
+    """
+    Wraps rendered lines to the terminal width, so wrapped rows hang under the
+    message text instead of running back under the timestamp|trip| [nick] prefix
+    Widths skip escape sequences and count wide characters as two columns
+    Layouts are cached per line and width, lines that fit are returned as is
+    """
+    escape_pattern = re.compile(r"(\x1B\[[0-?]*[ -/]*[@-~]|\x1B[@-Z\\-_])")
+    prefix_pattern = re.compile(r"[^|\n]*\|[^|\n]*\| (?:\[[^\]\n]{1,40}\] ){0,2}")
+    reset_state = (None, None, ())
+    min_text_width = 16
+    cache_size = 2000
+
+    def __init__(self) -> None:
+        """
+        Sets up an empty cache
+        """
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def width(self, text: str) -> int:
+        """
+        Returns the display width of a line without newlines, ignoring escape sequences
+        """
+        plain = self.escape_pattern.sub("", text)
+        return len(plain) if plain.isascii() and plain.isprintable() else sum(map(char_width, plain))
+
+    def indent(self, text: str, columns: int) -> int:
+        """
+        Returns the width of a line's prefix, which wrapped rows are indented by
+        Prefixes that would leave too little room for the text aren't indented under
+        """
+        match = self.prefix_pattern.match(self.escape_pattern.sub("", text))
+        indent = self.width(match.group()) if match else 0
+        return indent if columns - indent >= self.min_text_width else 0
+
+    def wrap(self, text: str, columns: int) -> str:
+        """
+        Returns a line wrapped to a number of columns, breaking at spaces where
+        possible, with rows after the first indented under the prefix
+        Styles are closed at the end of each row and reopened after the indent,
+        so backgrounds don't run into it
+        """
+        single = "\n" not in text
+        if columns < 2 or (single and len(text) * 2 <= columns):
+            return text
+
+        key = (text, columns)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        if single and self.width(text) <= columns:
+            return text
+
+        wrapped = self.layout(text, columns)
+        with self.lock:
+            self.cache[key] = wrapped
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return wrapped
+
+    def layout(self, text: str, columns: int) -> str:
+        """
+        Splits a line into rows, see wrap()
+        """
+        indent = self.indent(text, columns)
+        rows = []
+        row = []
+        column = 0
+        state = self.reset_state
+        space = None  # row length, column and state after the last space
+
+        def close_row(pieces: list, row_state: tuple) -> None:
+            rows.append("".join(pieces) + ("\033[0m" if row_state != self.reset_state else ""))
+
+        def open_row(row_state: tuple) -> list:
+            return [" " * indent, sgr_sequence(row_state)]
+
+        for part in self.escape_pattern.split(text):
+            if part.startswith("\x1b"):
+                row.append(part)
+                if part.endswith("m") and part.startswith("\x1b["):
+                    state = apply_sgr(state, part)
+
+                continue
+
+            for char in part:
+                if char == "\n":
+                    close_row(row, state)
+                    row, column, space = open_row(state), indent, None
+                    continue
+
+                width = char_width(char)
+                if column + width > columns and column > indent:
+                    if space is not None and space[1] > indent:
+                        length, space_column, space_state = space
+                        close_row(row[:length], space_state)
+                        row = open_row(space_state) + row[length:]
+                        column = indent + column - space_column
+
+                    else:
+                        close_row(row, state)
+                        row, column = open_row(state), indent
+
+                    space = None
+
+                row.append(char)
+                column += width
+                if char == " ":
+                    space = (len(row), column, state)
+
+        close_row(row, self.reset_state)
+        return "\n".join(rows)
@@ -1,15 +1,21 @@
 # Author:    AnnikaV9
 # License:   Unlicense
 
+import re
 import os
 import sys
 import json
+import hashlib
+import marshal
 import argparse
 
 import yaml
 import termcolor
+import pygments.util
 import pygments.styles
 
+from hcclient import meta
+
 
 default_config = {
     "trip_password": "",
@@ -17,19 +23,27 @@
     "no_parse": False,
     "clear": False,
     "is_mod": False,
+    "bulk_rate": 10,
     "no_unicode": False,
     "sheriff_badges": False,
     "highlight_theme": "monokai",
     "no_markdown": False,
     "no_linkify": False,
+    "no_wrap": False,
     "backticks_bg": 238,
     "latex": False,
     "no_notify": False,
     "prompt_string": "default",
     "timestamp_format": "%H:%M",
     "suggest_aggr": 1,
+    "hook_budget": 50,
+    "scrollback_lines": 10000,
+    "persist_state": False,
     "proxy": False,
     "ssl_no_verify": False,
+    "no_compression": False,
+    "connect_timeout": 10,
+    "dns_cache_ttl": 300,
     "config_file": None,
     "message_color": "white",
     "whisper_color": "green",
@@ -44,6 +58,7 @@
     "admin_nickname_color": "red",
     "ignored": {"trips": [], "hashes": []},
     "aliases": {},
+    "highlights": [],
 }
 
 
@@ -68,42 +83,152 @@ def generate_config(config: dict) -> None:
         sys.exit(f"{sys.argv[0]}: error: {e}")
 
 
-def load_config(filepath: str) -> dict:
+def cache_path() -> str:
+    """
+    Returns the path of the validated config cache
+    """
+    if os.name == "nt":
+        return os.path.join(os.getenv("LOCALAPPDATA") or os.getenv("APPDATA"), "hcclient", "config.cache")
+
+    return os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.getenv("HOME"), ".cache"), "hcclient", "config.cache")
+
+
+def schema_digest() -> str:
+    """
+    Returns a digest of the options and validators in config_schema,
+    so cached configs are validated again when the schema changes
+    """
+    digest = hashlib.sha256()
+    for option, validator in sorted(config_schema.items()):
+        digest.update(option.encode())
+        digest.update(marshal.dumps(validator.__code__))
+
+    return digest.hexdigest()[:16]
+
+
+def cache_key(filepath: str) -> dict:
+    """
+    Returns what a cached config is valid for: the file's mtime and size,
+    the client version and the config schema
+    """
+    stat = os.stat(filepath)
+    return {"mtime": stat.st_mtime_ns, "size": stat.st_size, "version": meta.vers, "schema": schema_digest()}
+
+
+def read_trip_password(filepath: str) -> str:
+    """
+    Reads just the trip_password option of a config file, which is kept out of the cache
+    Raises ValueError if it can't be read without parsing the whole file
+    """
+    with open(filepath, "r", encoding="utf8") as config_file:
+        if filepath.endswith(".json"):
+            return json.load(config_file)["trip_password"]
+
+        lines = config_file.readlines()
+
+    for number, line in enumerate(lines):
+        if line.startswith("trip_password:"):
+            # a value continued on the next line needs the full parser
+            if number + 1 < len(lines) and lines[number + 1][:1] in (" ", "\t"):
+                break
+
+            value = yaml.load(line, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))["trip_password"]
+            if isinstance(value, str):
+                return value
+
+            break
+
+    raise ValueError(f"{filepath}: unable to read trip_password")
+
+
+def load_cached_config(filepath: str) -> dict | None:
+    """
+    Returns the validated config for a file from the cache, or None if the file,
+    the client or the config schema changed since it was cached
+    The theme is checked again, since style plugins can be removed at any time
+    The trip password isn't cached, it's read from the file again
+    """
+    try:
+        key = cache_key(filepath)
+        with open(cache_path(), "rb") as cache_file:
+            cache = marshal.load(cache_file)
+
+        entry = cache[os.path.abspath(filepath)]
+        if all(entry[field] == value for field, value in key.items()) and validate_theme(entry["config"].get("highlight_theme", default_config["highlight_theme"])):
+            if entry["trip_password"]:
+                return entry["config"] | {"trip_password": read_trip_password(filepath)}
+
+            return entry["config"]
+
+    except (OSError, EOFError, ValueError, TypeError, KeyError, yaml.YAMLError):
+        pass
+
+    return None
+
+
+def cache_config(filepath: str, config: dict) -> None:
+    """
+    Stores a validated config in the cache, keyed by its path, see cache_key()
+    The trip password is left out, only whether the file sets one is stored
+    """
+    try:
+        try:
+            with open(cache_path(), "rb") as cache_file:
+                cache = marshal.load(cache_file)
+
+        except (OSError, EOFError, ValueError, TypeError):
+            cache = {}
+
+        cached = {option: value for option, value in config.items() if option != "trip_password"}
+        cache[os.path.abspath(filepath)] = cache_key(filepath) | {"config": cached, "trip_password": "trip_password" in config}
+
+        os.makedirs(os.path.dirname(cache_path()), exist_ok=True)
+        with open(os.open(cache_path() + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as cache_file:
+            marshal.dump(cache, cache_file)
+
+        os.replace(cache_path() + ".tmp", cache_path())
+
+    except (OSError, ValueError):
+        pass
+
+
+def load_config(filepath: str) -> tuple[dict, bool]:
     """
     Loads a config file from the specified path
+    Returns the config and whether it was already validated
     """
+    cached = load_cached_config(filepath)
+    if cached is not None:
+        return cached, True
+
     try:
         with open(filepath, "r", encoding="utf8") as config_file:
             if filepath.endswith(".json"):
                 config = json.load(config_file)
 
             else:
-                config = yaml.safe_load(config_file)
-
-            unknown_args = []
-            for option in config:
-                if option not in ("trip_password", "websocket_address", "no_parse",
-                                  "clear", "is_mod", "no_unicode", "no_markdown",
-                                  "highlight_theme", "no_notify", "prompt_string",
-                                  "timestamp_format", "message_color", "whisper_color",
-                                  "emote_color", "nickname_color", "self_nickname_color",
-                                  "warning_color", "server_color", "client_color",
-                                  "timestamp_color", "mod_nickname_color", "suggest_aggr",
-                                  "admin_nickname_color", "ignored", "aliases", "proxy", "latex",
-                                  "backticks_bg", "ssl_no_verify", "no_linkify", "sheriff_badges",
-                                  "no_highlight",  # deprecated
-                                  ):
-                    unknown_args.append(option)
+                config = yaml.load(config_file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+            unknown_args = [option for option in config if option not in config_schema and option != "no_highlight"]  # deprecated
 
             if len(unknown_args) > 0:
                 raise ValueError(f"{filepath}: unknown option(s): {', '.join(unknown_args)}")
 
-            return config
+            return config, False
 
     except Exception as e:
         sys.exit(f"{sys.argv[0]}: error: {e}")
 
 
+def validate_all(config: dict, options: object) -> None:
+    """
+    Validates the specified options of a config, exits on the first invalid one
+    """
+    for option in options:
+        if not validate_config(option, config[option]):
+            sys.exit(f"{sys.argv[0]}: error: invalid configuration value for option '{option}'")
+
+
 def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser) -> dict:
     """
     Initializes the configuration and returns a dictionary
@@ -118,6 +243,7 @@ def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser)
 
         config["aliases"] = {"example": "example"}
         config["ignored"] = {"trips": ["example"], "hashes": ["example"]}
+        config["highlights"] = ["example", "re:ex(ample)?s?"]
         generate_config(config)
         sys.exit(0)
 
@@ -126,7 +252,7 @@ def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser)
         sys.exit(f"{sys.argv[0]}: error: the following arguments are required: -c/--channel, -n/--nickname")
 
     if args.config_file:
-        file_config = load_config(args.config_file)
+        file_config, cached = load_config(args.config_file)
         for option, value in file_config.items():
             config[option] = value
 
@@ -137,9 +263,10 @@ def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser)
         config["nickname"] = args.nickname
         config["channel"] = args.channel
         config["config_file"] = args.config_file
-        for option, value in config.items():
-            if not validate_config(option, value):
-                sys.exit(f"{sys.argv[0]}: error: invalid configuration value for option '{option}'")
+        validate_all(config, [arg for arg in args_dict if arg in config] if cached else config)
+
+        if not cached:
+            cache_config(args.config_file, file_config)
 
     else:
         loaded_config = False
@@ -151,7 +278,7 @@ def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser)
             for config_file in file_options:
                 if os.path.isfile(os.path.join(def_config_dir, config_file)):
                     def_config_file = os.path.join(def_config_dir, config_file)
-                    file_config = load_config(def_config_file)
+                    file_config, cached = load_config(def_config_file)
                     for option, value in file_config.items():
                         config[option] = value
 
@@ -162,9 +289,10 @@ def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser)
                     config["nickname"] = args.nickname
                     config["channel"] = args.channel
                     config["config_file"] = def_config_file
-                    for option, value in config.items():
-                        if not validate_config(option, value):
-                            sys.exit(f"{sys.argv[0]}: error: invalid configuration value for option '{option}'")
+                    validate_all(config, [arg for arg in args_dict if arg in config] if cached else config)
+
+                    if not cached:
+                        cache_config(def_config_file, file_config)
 
                     loaded_config = True
                     break
@@ -176,67 +304,129 @@ def initialize_config(args: argparse.Namespace, parser: argparse.ArgumentParser)
 
             config["nickname"] = args.nickname
             config["channel"] = args.channel
-            for option, value in config.items():
-                if not validate_config(option, value):
-                    sys.exit(f"{sys.argv[0]}: error: invalid configuration value for option '{option}'")
+            validate_all(config, config)
 
     return config
 
 
-def validate_config(option: str, value: str) -> bool:
+def validate_aliases(value: dict) -> bool:
     """
-    Validates a configuration option and its value
-    Returns True if valid, False if not
+    Validates the aliases option
     """
-    passed = True
+    return isinstance(value, dict) and all(isinstance(alias, str) and isinstance(replacement, str) for alias, replacement in value.items())
 
-    if option in ("timestamp_color", "client_color", "server_color", "nickname_color",
-                  "self_nickname_color", "mod_nickname_color", "admin_nickname_color",
-                  "message_color", "emote_color", "whisper_color", "warning_color"):
-        passed = value in termcolor.COLORS
 
-    elif option in ("no_unicode", "no_notify", "no_parse", "clear", "is_mod", "no_markdown",
-                    "latex", "ssl_no_verify", "no_linkify", "sheriff_badges"):
-        passed = isinstance(value, bool)
+def validate_ignored(value: dict) -> bool:
+    """
+    Validates the ignored option
+    """
+    return isinstance(value, dict) and isinstance(value.get("trips"), list) and isinstance(value.get("hashes"), list)
 
-    elif option in ("websocket_address", "trip_password", "prompt_string", "timestamp_format"):
-        passed = isinstance(value, str)
 
-    elif option in ("aliases", "ignored"):
-        if not isinstance(value, dict):
-            passed = False
+def validate_highlights(value: list) -> bool:
+    """
+    Validates the highlights option, regex rules must compile
+    the same way the highlighter compiles them
+    """
+    if not isinstance(value, list):
+        return False
 
-        else:
-            match option:
-                case "aliases":
-                    for alias, replacement in value.items():
-                        if not isinstance(alias, str) or not isinstance(replacement, str):
-                            passed = False
+    for rule in value:
+        if not isinstance(rule, str) or rule in ("", "re:"):
+            return False
 
-                case "ignored":
-                    if "trips" not in value or "hashes" not in value:
-                        passed = False
+        if rule.startswith("re:"):
+            try:
+                re.compile(rule[3:], re.IGNORECASE)
 
-                    if not isinstance(value["trips"], list) or not isinstance(value["hashes"], list):
-                        passed = False
+            except re.error:
+                return False
 
-    elif option in ("suggest_aggr", "backticks_bg"):
-        if not isinstance(value, int):
-            passed = False
+    return True
 
-        else:
-            match option:
-                case "suggest_aggr":
-                    passed = value in range(4)
 
-                case "backticks_bg":
-                    passed = value in range(256)
+def validate_theme(value: str) -> bool:
+    """
+    Validates the highlight_theme option with a single style lookup,
+    instead of loading every style plugin with get_all_styles()
+    """
+    try:
+        pygments.styles.get_style_by_name(value)
+        return True
+
+    except (pygments.util.ClassNotFound, TypeError):
+        return False
+
+
+def is_color(value: str) -> bool:
+    """
+    Checks if a value is a valid termcolor color
+    """
+    return value in termcolor.COLORS
+
 
-    elif option == "proxy":
-        if value and not isinstance(value, str):
-            passed = False
+def is_bool(value: bool) -> bool:
+    """
+    Checks if a value is a boolean
+    """
+    return isinstance(value, bool)
 
-    elif option == "highlight_theme":
-        passed = value in pygments.styles.get_all_styles()
 
-    return passed
+def is_str(value: str) -> bool:
+    """
+    Checks if a value is a string
+    """
+    return isinstance(value, str)
+
+
+config_schema = {
+    "trip_password": is_str,
+    "websocket_address": is_str,
+    "no_parse": is_bool,
+    "clear": is_bool,
+    "is_mod": is_bool,
+    "bulk_rate": lambda value: isinstance(value, int) and value >= 1,
+    "no_unicode": is_bool,
+    "sheriff_badges": is_bool,
+    "highlight_theme": validate_theme,
+    "no_markdown": is_bool,
+    "no_linkify": is_bool,
+    "no_wrap": is_bool,
+    "backticks_bg": lambda value: isinstance(value, int) and value in range(256),
+    "latex": is_bool,
+    "no_notify": is_bool,
+    "prompt_string": is_str,
+    "timestamp_format": is_str,
+    "suggest_aggr": lambda value: isinstance(value, int) and value in range(4),
+    "hook_budget": lambda value: isinstance(value, int) and value >= 0,
+    "scrollback_lines": lambda value: isinstance(value, int) and value >= 100,
+    "persist_state": is_bool,
+    "proxy": lambda value: not value or isinstance(value, str),
+    "ssl_no_verify": is_bool,
+    "no_compression": is_bool,
+    "connect_timeout": lambda value: isinstance(value, int) and value >= 1,
+    "dns_cache_ttl": lambda value: isinstance(value, int) and value >= 0,
+    "message_color": is_color,
+    "whisper_color": is_color,
+    "emote_color": is_color,
+    "nickname_color": is_color,
+    "self_nickname_color": is_color,
+    "warning_color": is_color,
+    "server_color": is_color,
+    "client_color": is_color,
+    "timestamp_color": is_color,
+    "mod_nickname_color": is_color,
+    "admin_nickname_color": is_color,
+    "ignored": validate_ignored,
+    "aliases": validate_aliases,
+    "highlights": validate_highlights,
+}
+
+
+def validate_config(option: str, value: str) -> bool:
+    """
+    Validates a configuration option and its value against the schema
+    Returns True if valid, False if not
+    """
+    validator = config_schema.get(option)
+    return validator is None or validator(value)
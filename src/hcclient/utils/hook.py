@@ -3,8 +3,14 @@
 
 import os
 import sys
+import copy
+import time
+import queue
+import threading
+import contextlib
 import importlib.util
 
+import termcolor
 import packaging.version
 import packaging.specifiers
 
@@ -27,6 +33,9 @@ def check_hook(module: object) -> bool | str | Exception:
     if not module.HookInfo.name.isalnum():
         return False, "HookInfo.name not alphanumeric"
 
+    if not hasattr(module, "hook") and not any(hasattr(module, event) for event in HookBus.events):
+        return False, "Missing hook() function or event handlers"
+
     try:
         packaging.version.parse(module.HookInfo.version)
         if hasattr(module.HookInfo, "compat"):
@@ -35,6 +44,9 @@ def check_hook(module: object) -> bool | str | Exception:
     except (packaging.version.InvalidVersion, packaging.specifiers.InvalidSpecifier) as e:
         return False, e
 
+    if getattr(module.HookInfo, "overflow", "drop_newest") not in ("drop_newest", "drop_oldest"):
+        return False, "HookInfo.overflow must be 'drop_newest' or 'drop_oldest'"
+
     return True, ""
 
 
@@ -53,6 +65,216 @@ def check_compat(hook_info: object) -> bool:
     return True
 
 
+class HookStats:
+    """
+    Timing of a single hook for a single event
+    """
+    def __init__(self) -> None:
+        """
+        Initializes the counters
+        """
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.overruns = 0
+        self.strikes = 0
+        self.dropped = 0
+
+
+class HookWorker:
+    """
+    Runs the handlers of an asynchronous hook on a dedicated thread,
+    fed by a bounded queue
+    Overflow policy is either 'drop_newest' or 'drop_oldest'
+    Calls aren't held to the hook budget, only checked for hangs by the bus
+    """
+    hang_timeout = 10  # seconds a single call may take before the hook is considered hung
+
+    def __init__(self, bus: object, name: str, size: int, overflow: str) -> None:
+        """
+        Sets up the queue and starts the worker thread
+        """
+        self.bus = bus
+        self.name = name
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize=size)
+        self.busy_since = None
+
+        threading.Thread(target=self.worker_thread, daemon=True).start()
+
+    def submit(self, event: str, handler: object, value: object, extra: tuple) -> None:
+        """
+        Queues a handler call, applying the overflow policy if the queue is full
+        Never blocks the calling thread
+        """
+        item = (event, handler, copy.copy(value), extra)
+
+        try:
+            self.queue.put_nowait(item)
+
+        except queue.Full:
+            self.bus.stats[self.name][event].dropped += 1
+            if self.overflow == "drop_oldest":
+                with contextlib.suppress(queue.Empty, queue.Full):
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(item)
+
+    def worker_thread(self) -> None:
+        """
+        Calls queued handlers until the hook is disabled
+        """
+        while self.name not in self.bus.disabled:
+            event, handler, value, extra = self.queue.get()
+            self.busy_since = time.monotonic()
+            self.bus.call(self.name, event, handler, value, extra, budgeted=False)
+            self.busy_since = None
+
+    def hung(self) -> bool:
+        """
+        Checks if the current call has been running for longer than hang_timeout
+        """
+        busy_since = self.busy_since
+        return busy_since is not None and time.monotonic() - busy_since > self.hang_timeout
+
+
+class HookBus:
+    """
+    Dispatches client events to hook handlers, timing every call
+    Handlers are called as handler(client, value, *extra) and may return
+    a replacement value, None to leave it unchanged, or False to drop it
+    Hooks with HookInfo.asynchronous set run on their own worker thread,
+    their return values are ignored
+    A hook that goes over the time budget on several consecutive calls
+    or raises an exception is disabled, asynchronous hooks are exempt
+    from the budget and disabled if a call hangs instead
+    """
+    events = ("on_packet", "on_render", "on_print", "on_send", "on_command")
+    max_strikes = 3
+    watchdog_interval = 1  # seconds between checks for hung asynchronous hooks
+
+    def __init__(self, client: object) -> None:
+        """
+        Sets up empty handler lists for all events
+        """
+        self.client = client
+        self.handlers = {event: [] for event in self.events}
+        self.stats = {}
+        self.disabled = {}
+        self.workers = {}
+
+    def register(self, name: str, module: object) -> None:
+        """
+        Registers the event handlers defined by a hook module
+        """
+        worker = None
+        if getattr(module.HookInfo, "asynchronous", False):
+            worker = HookWorker(self, name, getattr(module.HookInfo, "queue_size", 1000), getattr(module.HookInfo, "overflow", "drop_newest"))
+            if not self.workers:
+                threading.Thread(target=self.watchdog_thread, daemon=True).start()
+
+            self.workers[name] = worker
+
+        self.stats[name] = {}
+        for event in self.events:
+            if callable(getattr(module, event, None)):
+                self.handlers[event].append((name, getattr(module, event), worker))
+                self.stats[name][event] = HookStats()
+
+    def emit(self, event: str, value: object, *extra: object) -> object:
+        """
+        Passes a value through all handlers of an event and returns the result
+        """
+        handlers = self.handlers[event]
+        if not handlers:
+            return value
+
+        for name, handler, worker in tuple(handlers):
+            if worker is not None:
+                worker.submit(event, handler, value, extra)
+                continue
+
+            result = self.call(name, event, handler, value, extra)
+
+            if result is False:
+                return False
+
+            if result is not None:
+                value = result
+
+        return value
+
+    def watchdog_thread(self) -> None:
+        """
+        Thread that disables asynchronous hooks stuck in a single call,
+        even if no further events are submitted to them
+        """
+        while True:
+            time.sleep(self.watchdog_interval)
+            for name, worker in tuple(self.workers.items()):
+                if name not in self.disabled and worker.hung():
+                    self.disable(name, f"hung for over {worker.hang_timeout} seconds")
+
+    def call(self, name: str, event: str, handler: object, value: object, extra: tuple, budgeted: bool = True) -> object:
+        """
+        Calls a single handler, recording its timing and enforcing the budget if budgeted
+        """
+        stats = self.stats[name][event]
+        start = time.perf_counter()
+
+        try:
+            result = handler(self.client, value, *extra)
+
+        except Exception as e:
+            self.disable(name, f"{type(e).__name__} in {event}: {e}")
+            return None
+
+        elapsed = time.perf_counter() - start
+        stats.calls += 1
+        stats.total += elapsed
+        stats.max = max(stats.max, elapsed)
+
+        budget = self.client.args["hook_budget"] / 1000 if budgeted else 0
+        if budget and elapsed > budget:
+            stats.overruns += 1
+            stats.strikes += 1
+            if stats.strikes >= self.max_strikes:
+                self.disable(name, f"{event} took {elapsed * 1000:.1f}ms, budget is {self.client.args['hook_budget']}ms")
+
+        else:
+            stats.strikes = 0
+
+        return result
+
+    def disable(self, name: str, reason: str) -> None:
+        """
+        Removes all handlers of a hook and reports why
+        """
+        if name in self.disabled:
+            return
+
+        self.disabled[name] = reason
+        for event in self.events:
+            self.handlers[event] = [entry for entry in self.handlers[event] if entry[0] != name]
+
+        self.client.print_msg("{}|{}| {}".format(termcolor.colored(self.client.formatted_datetime(), self.client.args["timestamp_color"]),
+                                                 termcolor.colored("CLIENT", self.client.args["client_color"]),
+                                                 termcolor.colored(f"Disabled hook '{name}': {reason}", self.client.args["client_color"])))
+
+    def report(self) -> str:
+        """
+        Returns the per-event timing of all registered hooks
+        """
+        lines = []
+        for name, events in self.stats.items():
+            lines.append(f"{name}: " + (f"disabled ({self.disabled[name]})" if name in self.disabled else "active"))
+            for event, stats in events.items():
+                average = stats.total / stats.calls * 1000 if stats.calls else 0
+                lines.append(f"  {event}: {stats.calls} calls, avg {average:.3f}ms, max {stats.max * 1000:.3f}ms, {stats.overruns} over budget"
+                             + (f", {stats.dropped} dropped" if stats.dropped else ""))
+
+        return "\n".join(lines) if lines else "No hooks with event handlers loaded"
+
+
 def load_hooks(client: object) -> object:
     """
     Loads hooks from the default hooks directory and returns the modified client
@@ -77,7 +299,10 @@ def load_hooks(client: object) -> object:
                     print(f"{sys.argv[0]}: warning: skipping hook '{module.HookInfo.name}' due to incompatible version (requires: {module.HookInfo.compat}, client: {meta.vers})")
                     continue
 
-                client = module.hook(client)
+                if hasattr(module, "hook"):
+                    client = module.hook(client)
+
+                client.hook_bus.register(module.HookInfo.name, module)
                 client.hooks.append(f"{module.HookInfo.name}[{module.HookInfo.version}]")
 
             except Exception as e:
@@ -0,0 +1,339 @@
+# Author:    AnnikaV9
+# License:   Unlicense
+
+import os
+import zlib
+import base64
+import struct
+import hashlib
+
+try:
+    from wsaccel.xormask import XorMaskerSimple
+
+except ImportError:
+    XorMaskerSimple = None
+
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONT = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+
+class ProtocolError(Exception):
+    """
+    Raised when the peer violates the websocket protocol
+    """
+
+
+def accept_key(key: str) -> str:
+    """
+    Returns the Sec-WebSocket-Accept value for a Sec-WebSocket-Key
+    """
+    return base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+
+
+def new_key() -> str:
+    """
+    Returns a random Sec-WebSocket-Key
+    """
+    return base64.b64encode(os.urandom(16)).decode()
+
+
+def handshake_request(host: str, port: int, path: str, key: str, secure: bool, headers: dict | None = None) -> bytes:
+    """
+    Returns the HTTP upgrade request that opens a websocket
+    """
+    default_port = 443 if secure else 80
+    lines = [
+        f"GET {path} HTTP/1.1",
+        f"Host: {host}" if port == default_port else f"Host: {host}:{port}",
+        "Upgrade: websocket",
+        "Connection: Upgrade",
+        f"Sec-WebSocket-Key: {key}",
+        "Sec-WebSocket-Version: 13",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def parse_headers(data: bytes) -> tuple[str, dict]:
+    """
+    Parses an HTTP request/response head into its first line and a dict of lowercased headers
+    """
+    first_line, *header_lines = data.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+
+    return first_line, headers
+
+
+def check_handshake(data: bytes, key: str) -> dict:
+    """
+    Validates the server's handshake response and returns its headers
+    """
+    status, headers = parse_headers(data)
+    if status.split(" ")[1:2] != ["101"]:
+        raise ProtocolError(f"Handshake failed: {status}")
+
+    if headers.get("sec-websocket-accept") != accept_key(key):
+        raise ProtocolError("Handshake failed: invalid Sec-WebSocket-Accept")
+
+    return headers
+
+
+def mask_payload(mask: bytes, payload: bytes) -> bytes:
+    """
+    XORs a payload with a 4 byte mask, using wsaccel if available
+    """
+    if XorMaskerSimple is not None:
+        return XorMaskerSimple(mask).process(payload)
+
+    length = len(payload)
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool, rsv1: bool = False) -> bytes:
+    """
+    Encodes a single final frame, clients must mask, servers must not
+    """
+    head = bytearray([0x80 | (0x40 if rsv1 else 0) | opcode])
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+
+    if length < 126:
+        head.append(mask_bit | length)
+
+    elif length < 65536:
+        head.append(mask_bit | 126)
+        head += struct.pack("!H", length)
+
+    else:
+        head.append(mask_bit | 127)
+        head += struct.pack("!Q", length)
+
+    if mask:
+        mask_key = os.urandom(4)
+        return bytes(head) + mask_key + mask_payload(mask_key, payload)
+
+    return bytes(head) + payload
+
+
+class FrameDecoder:
+    """
+    Incrementally decodes frames from received bytes and reassembles
+    fragmented messages
+    Messages are (opcode, payload, compressed) tuples, control frames
+    are returned as soon as they arrive
+    """
+    def __init__(self, max_size: int = 16 * 1024 * 1024) -> None:
+        """
+        Sets up an empty buffer
+        """
+        self.buffer = bytearray()
+        self.max_size = max_size
+        self.fragments = []
+        self.fragments_size = 0
+        self.fragments_opcode = None
+        self.fragments_compressed = False
+
+    def feed(self, data: bytes) -> list:
+        """
+        Adds received bytes and returns all messages completed by them
+        """
+        self.buffer += data
+        messages = []
+
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return messages
+
+            fin, rsv1, opcode, payload = frame
+
+            if opcode >= OPCODE_CLOSE:
+                if not fin or len(payload) > 125:
+                    raise ProtocolError("Invalid control frame")
+
+                messages.append((opcode, payload, False))
+                continue
+
+            if opcode == OPCODE_CONT:
+                if self.fragments_opcode is None:
+                    raise ProtocolError("Unexpected continuation frame")
+
+            else:
+                if self.fragments_opcode is not None:
+                    raise ProtocolError("Expected continuation frame")
+
+                self.fragments_opcode = opcode
+                self.fragments_compressed = rsv1
+
+            self.fragments.append(payload)
+            self.fragments_size += len(payload)
+            if self.fragments_size > self.max_size:
+                raise ProtocolError("Message too big")
+
+            if fin:
+                messages.append((self.fragments_opcode, b"".join(self.fragments), self.fragments_compressed))
+                self.fragments = []
+                self.fragments_size = 0
+                self.fragments_opcode = None
+
+    def next_frame(self) -> tuple | None:
+        """
+        Removes and returns the next complete frame from the buffer, or None
+        """
+        buffer = self.buffer
+        if len(buffer) < 2:
+            return None
+
+        fin = buffer[0] & 0x80 != 0
+        rsv1 = buffer[0] & 0x40 != 0
+        opcode = buffer[0] & 0x0F
+        masked = buffer[1] & 0x80 != 0
+        length = buffer[1] & 0x7F
+        offset = 2
+
+        if length == 126:
+            if len(buffer) < 4:
+                return None
+
+            length = struct.unpack_from("!H", buffer, 2)[0]
+            offset = 4
+
+        elif length == 127:
+            if len(buffer) < 10:
+                return None
+
+            length = struct.unpack_from("!Q", buffer, 2)[0]
+            offset = 10
+
+        if length > self.max_size:
+            raise ProtocolError("Frame too big")
+
+        mask_key = None
+        if masked:
+            mask_key = bytes(buffer[offset:offset + 4])
+            offset += 4
+
+        if len(buffer) < offset + length:
+            return None
+
+        payload = bytes(buffer[offset:offset + length])
+        del buffer[:offset + length]
+
+        if mask_key is not None:
+            payload = mask_payload(mask_key, payload)
+
+        return fin, rsv1, opcode, payload
+
+
+class PerMessageDeflate:
+    """
+    Compression state of a connection, from the permessage-deflate (RFC 7692)
+    parameters the server accepted, inactive if it accepted none
+    Compressing must happen in the order messages are sent, decompressing
+    in the order they are received
+    """
+    offer = "permessage-deflate; client_max_window_bits"
+    min_size = 64  # bytes below which a message is sent uncompressed, deflate would make it larger
+
+    def __init__(self, extensions: str = "", max_size: int = 16 * 1024 * 1024) -> None:
+        """
+        Parses the server's Sec-WebSocket-Extensions header,
+        raises ProtocolError for extensions or parameters that weren't offered
+        max_size limits decompressed messages like FrameDecoder limits compressed ones
+        """
+        self.extension = None
+        self.max_size = max_size
+        self.client_wbits = 15
+        self.server_wbits = 15
+        self.client_no_context_takeover = False
+        self.server_no_context_takeover = False
+        self.compressor = None
+        self.decompressor = None
+
+        for extension in filter(None, (extension.strip() for extension in extensions.split(","))):
+            name, *params = (param.strip() for param in extension.split(";"))
+            if name != "permessage-deflate":
+                raise ProtocolError(f"Unexpected extension: {name}")
+
+            for param in params:
+                param, _, value = param.partition("=")
+                value = value.strip('"')
+                match param:
+                    case "client_no_context_takeover":
+                        self.client_no_context_takeover = True
+
+                    case "server_no_context_takeover":
+                        self.server_no_context_takeover = True
+
+                    case "client_max_window_bits":
+                        self.client_wbits = int(value)
+
+                    case "server_max_window_bits":
+                        self.server_wbits = int(value)
+
+                    case _:
+                        raise ProtocolError(f"Unexpected permessage-deflate parameter: {param}")
+
+            self.extension = extension
+            self.compressor = self.new_compressor()
+            self.decompressor = zlib.decompressobj(-self.server_wbits)
+
+    @property
+    def active(self) -> bool:
+        """
+        Whether compression was negotiated
+        """
+        return self.extension is not None
+
+    def new_compressor(self) -> object:
+        """
+        Returns a raw deflate compressor, zlib doesn't support 8 bit windows so 9 is used
+        """
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -max(self.client_wbits, 9))
+
+    def worth_compressing(self, payload: bytes) -> bool:
+        """
+        Whether a message should be sent compressed, RFC 7692 lets each
+        message be sent either way, small ones are sent as they are
+        """
+        return self.active and len(payload) >= self.min_size
+
+    def compress(self, payload: bytes) -> bytes:
+        """
+        Returns the payload of a compressed message, to be sent with rsv1 set
+        """
+        compressed = self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.client_no_context_takeover:
+            self.compressor = self.new_compressor()
+
+        return compressed[:-4]
+
+    def decompress(self, payload: bytes) -> bytes:
+        """
+        Returns the payload of a received compressed message,
+        raises ProtocolError if it decompresses to more than max_size
+        """
+        if self.decompressor is None:
+            raise ProtocolError("Compressed message without negotiated compression")
+
+        payload = self.decompressor.decompress(payload + b"\x00\x00\xff\xff", self.max_size)
+        if self.decompressor.unconsumed_tail:
+            raise ProtocolError("Decompressed message too big")
+
+        if self.server_no_context_takeover:
+            self.decompressor = zlib.decompressobj(-self.server_wbits)
+
+        return payload